@@ -0,0 +1,150 @@
+import threading
+import time
+from functools import wraps
+from hashlib import sha1
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.response import Response
+
+from library_service.db import current_replica
+from library_service.metrics import BOOK_CACHE_LOOKUPS
+
+LIST_GENERATION_KEY = "books:generation:list"
+ALL_GENERATION_KEY = "books:generation:all"
+
+
+class CacheStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def as_dict(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": hits / total if total else None,
+        }
+
+
+stats = CacheStats()
+
+
+def get_cache():
+    return caches[settings.BOOK_RESPONSE_CACHE_ALIAS]
+
+
+def book_generation_key(pk):
+    return f"books:generation:book:{pk}"
+
+
+def _generations(cache, keys):
+    """
+    Generations are seeded with a timestamp rather than 0, so a generation
+    evicted from the cache can never come back matching stale entries.
+    """
+    values = cache.get_many(keys)
+    for key in keys:
+        if key not in values:
+            cache.add(key, time.time_ns(), timeout=None)
+            values[key] = cache.get(key)
+    return [values[key] for key in keys]
+
+
+def response_key(request, pk=None):
+    cache = get_cache()
+    if pk is None:
+        generations = _generations(cache, [LIST_GENERATION_KEY])
+    else:
+        generations = _generations(
+            cache, [ALL_GENERATION_KEY, book_generation_key(pk)]
+        )
+    representation = sha1(
+        f"{request.build_absolute_uri()}|"
+        f"{request.META.get('HTTP_ACCEPT', '')}".encode()
+    ).hexdigest()
+    generation = ".".join(map(str, generations))
+    return f"books:response:{generation}:{representation}"
+
+
+def invalidate(book_ids=None):
+    """Invalidate the list and either the given books or every book."""
+    cache = get_cache()
+    keys = [LIST_GENERATION_KEY]
+    if book_ids is None:
+        keys.append(ALL_GENERATION_KEY)
+    else:
+        keys.extend(book_generation_key(pk) for pk in book_ids)
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), timeout=None)
+
+
+def _lookup(view, request, kwargs):
+    lookup = view.lookup_url_kwarg or view.lookup_field
+    key = response_key(request, kwargs.get(lookup))
+    data = get_cache().get(key)
+    stats.record(hit=data is not None)
+    BOOK_CACHE_LOOKUPS.labels("hit" if data is not None else "miss").inc()
+    return key, data
+
+
+def _cacheable(response):
+    # A lagging replica would refill entries just invalidated by a write.
+    return response.status_code == status.HTTP_200_OK and not current_replica()
+
+
+def cached_response(view_method):
+    """
+    Serve successful GET responses of a viewset action from the cache.
+    Only responses read from the primary are stored.
+    """
+
+    if iscoroutinefunction(view_method):
+
+        @wraps(view_method)
+        async def async_wrapper(self, request, *args, **kwargs):
+            if not settings.BOOK_RESPONSE_CACHE or request.method != "GET":
+                return await view_method(self, request, *args, **kwargs)
+
+            key, data = await sync_to_async(_lookup)(self, request, kwargs)
+            if data is not None:
+                return Response(data)
+
+            response = await view_method(self, request, *args, **kwargs)
+            if _cacheable(response):
+                await get_cache().aset(key, response.data)
+            return response
+
+        return async_wrapper
+
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        if not settings.BOOK_RESPONSE_CACHE or request.method != "GET":
+            return view_method(self, request, *args, **kwargs)
+
+        key, data = _lookup(self, request, kwargs)
+        if data is not None:
+            return Response(data)
+
+        response = view_method(self, request, *args, **kwargs)
+        if _cacheable(response):
+            get_cache().set(key, response.data)
+        return response
+
+    return wrapper
@@ -0,0 +1,43 @@
+# Generated by Django 5.1.4 on 2026-10-18 04:00
+
+import book.search
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("book", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BookSearchIndex",
+            fields=[
+                (
+                    "book",
+                    models.OneToOneField(
+                        db_column="rowid",
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        primary_key=True,
+                        related_name="search_index",
+                        serialize=False,
+                        to="book.book",
+                    ),
+                ),
+                ("title", models.TextField()),
+                ("author", models.TextField()),
+                ("match", book.search.SearchMatchField(db_column="book_book_fts")),
+                ("rank", models.FloatField()),
+            ],
+            options={
+                "db_table": "book_book_fts",
+                "managed": False,
+            },
+        ),
+        migrations.RunPython(
+            book.search.install_search_index,
+            book.search.uninstall_search_index,
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.1.4 on 2026-10-18 04:05
+
+import book.search
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_books(apps, schema_editor):
+    # Keep the oldest copy of each (title, author) with the summed
+    # inventory, and move the other copies' borrowings onto it.
+    Book = apps.get_model("book", "Book")
+    Borrowing = apps.get_model("borrowing", "Borrowing")
+    duplicates = list(
+        Book.objects.values("title", "author")
+        .annotate(copies=Count("id"), keep=Min("id"), total=Sum("inventory"))
+        .filter(copies__gt=1)
+    )
+    for duplicate in duplicates:
+        merged = Book.objects.filter(
+            title=duplicate["title"], author=duplicate["author"]
+        ).exclude(pk=duplicate["keep"])
+        Borrowing.objects.filter(book__in=merged).update(
+            book_id=duplicate["keep"]
+        )
+        merged.delete()
+        Book.objects.filter(pk=duplicate["keep"]).update(
+            inventory=duplicate["total"]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("book", "0003_book_updated_at_catalog_version"),
+        ("borrowing", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_books, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="book",
+            constraint=models.UniqueConstraint(
+                fields=("title", "author"), name="unique_book_title_author"
+            ),
+        ),
+        migrations.RunPython(
+            book.search.install_search_triggers, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.4 on 2026-10-18 05:12
+
+import book.search
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("book", "0004_book_unique_title_author"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="book",
+            name="active_loans",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="book",
+            name="borrow_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name="book",
+            index=models.Index(
+                fields=["borrow_count", "id"], name="book_book_borrow__5b140e_idx"
+            ),
+        ),
+        migrations.RunPython(
+            book.search.install_search_triggers, migrations.RunPython.noop
+        ),
+    ]
@@ -1,4 +1,74 @@
+from datetime import datetime, timezone as dt_timezone
+from functools import reduce
+from operator import or_
+
 from django.db import models
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from book.search import FTS_TABLE, SearchMatchField
+from book.signals import notify_catalog_changed
+
+
+class BookQuerySet(models.QuerySet):
+    def adjust_inventory(self, deltas: dict) -> int:
+        """
+        Apply `{book_id: delta}` to inventory in a single UPDATE.
+
+        A negative delta lends copies out and a positive one takes them
+        back, so the same UPDATE keeps `active_loans` and `borrow_count`
+        in step. Rows whose inventory would drop below zero are left
+        untouched, so callers compare the returned row count with
+        `len(deltas)`.
+        """
+        deltas = {pk: delta for pk, delta in deltas.items() if delta}
+        if not deltas:
+            return 0
+
+        condition = reduce(
+            or_,
+            (
+                Q(pk=pk, inventory__gte=-delta) if delta < 0 else Q(pk=pk)
+                for pk, delta in deltas.items()
+            ),
+        )
+        updated = self.filter(condition).update(
+            inventory=Case(
+                *(
+                    When(pk=pk, then=F("inventory") + delta)
+                    for pk, delta in deltas.items()
+                ),
+                default=F("inventory"),
+                output_field=models.PositiveIntegerField(),
+            ),
+            # Loans made outside the API, e.g. by generate_data, are only
+            # counted by repair_loan_counters: never count below zero.
+            active_loans=Case(
+                *(
+                    When(
+                        pk=pk,
+                        then=Greatest(F("active_loans") - delta, Value(0)),
+                    )
+                    for pk, delta in deltas.items()
+                ),
+                default=F("active_loans"),
+                output_field=models.PositiveIntegerField(),
+            ),
+            borrow_count=Case(
+                *(
+                    When(pk=pk, then=F("borrow_count") - delta)
+                    for pk, delta in deltas.items()
+                    if delta < 0
+                ),
+                default=F("borrow_count"),
+                output_field=models.PositiveIntegerField(),
+            ),
+            updated_at=timezone.now(),
+        )
+        if updated:
+            notify_catalog_changed(self.model, deltas.keys())
+        return updated
 
 
 class Book(models.Model):
@@ -11,6 +81,97 @@ class Book(models.Model):
     cover = models.CharField(max_length=4, choices=COVER_CHOICES)
     inventory = models.PositiveIntegerField()
     daily_fee = models.DecimalField(max_digits=4, decimal_places=2)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Maintained by adjust_inventory; borrow_count includes archived loans.
+    active_loans = models.PositiveIntegerField(default=0, editable=False)
+    borrow_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = BookQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["title", "author"], name="unique_book_title_author"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["borrow_count", "id"]),
+        ]
 
     def __str__(self) -> str:
         return f"{self.title}, {self.author} ({self.inventory})"
+
+
+class CatalogVersion(models.Model):
+    """Single row counting writes to the catalog, used for HTTP caching."""
+
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    @classmethod
+    def current(cls):
+        """
+        The version on the database reads are routed to, which may be a
+        replica, so that it always describes the data served with it.
+        """
+        return cls.objects.filter(pk=1).first() or cls._initial()
+
+    @classmethod
+    async def acurrent(cls):
+        return await cls.objects.filter(pk=1).afirst() or cls._initial()
+
+    @classmethod
+    def _initial(cls):
+        # The catalog before its first write.
+        return cls(pk=1, updated_at=datetime.fromtimestamp(0, dt_timezone.utc))
+
+    @classmethod
+    def bump(cls):
+        changes = {"version": F("version") + 1, "updated_at": timezone.now()}
+        if not cls.objects.filter(pk=1).update(**changes):
+            cls.objects.get_or_create(pk=1)
+            cls.objects.filter(pk=1).update(**changes)
+
+
+class BookRelation(models.Model):
+    """
+    A book often borrowed by the readers of `book`, rebuilt in batches by
+    `build_recommendations`. `score` is the cosine similarity of the two
+    books' sets of borrowers.
+    """
+
+    book = models.ForeignKey(
+        Book, on_delete=models.CASCADE, related_name="relations"
+    )
+    related = models.ForeignKey(
+        Book, on_delete=models.CASCADE, related_name="+"
+    )
+    score = models.FloatField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["book", "-score"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.book_id} -> {self.related_id} ({self.score:.3f})"
+
+
+class BookSearchIndex(models.Model):
+    """Read-only view of the FTS5 table kept in sync by triggers."""
+
+    book = models.OneToOneField(
+        Book,
+        primary_key=True,
+        db_column="rowid",
+        on_delete=models.DO_NOTHING,
+        related_name="search_index",
+    )
+    title = models.TextField()
+    author = models.TextField()
+    match = SearchMatchField(db_column=FTS_TABLE)
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = FTS_TABLE
@@ -0,0 +1,143 @@
+import re
+from functools import reduce
+from operator import and_
+
+from django.db import connections, models
+from django.db.models import F, Lookup, Q
+
+FTS_TABLE = "book_book_fts"
+
+CREATE_TABLE_SQL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "title, author, content='book_book', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')"
+)
+CREATE_TRIGGERS_SQL = (
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON book_book
+    BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, author)
+        VALUES (new.id, new.title, new.author);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON book_book
+    BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, author)
+        VALUES ('delete', old.id, old.title, old.author);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au
+    AFTER UPDATE OF title, author ON book_book
+    BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, author)
+        VALUES ('delete', old.id, old.title, old.author);
+        INSERT INTO {FTS_TABLE}(rowid, title, author)
+        VALUES (new.id, new.title, new.author);
+    END
+    """,
+)
+REBUILD_SQL = f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"
+DROP_SQL = (
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+)
+
+TERM_RE = re.compile(r"\w+")
+
+
+class SearchMatchField(models.TextField):
+    """The hidden FTS5 column named after its table, used with MATCH."""
+
+
+@SearchMatchField.register_lookup
+class FullTextMatch(Lookup):
+    lookup_name = "fts"
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"{lhs} MATCH {rhs}", [*lhs_params, *rhs_params]
+
+
+_availability = {}
+
+
+def supports_fts(connection):
+    if connection.vendor != "sqlite":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA compile_options")
+        return ("ENABLE_FTS5",) in cursor.fetchall()
+
+
+def install_search_index(apps, schema_editor):
+    if not supports_fts(schema_editor.connection):
+        return
+    schema_editor.execute(CREATE_TABLE_SQL)
+    for statement in CREATE_TRIGGERS_SQL:
+        schema_editor.execute(statement)
+    schema_editor.execute(REBUILD_SQL)
+
+
+def install_search_triggers(apps, schema_editor):
+    """
+    Re-create the sync triggers after a migration rebuilt `book_book`.
+
+    SQLite alters most columns by copying the table, which drops its
+    triggers while leaving the external-content index intact.
+    """
+    connection = schema_editor.connection
+    if FTS_TABLE not in connection.introspection.table_names():
+        return
+    for statement in CREATE_TRIGGERS_SQL:
+        schema_editor.execute(statement)
+
+
+def uninstall_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for statement in DROP_SQL:
+        schema_editor.execute(statement)
+
+
+def search_index_available(using):
+    if using not in _availability:
+        connection = connections[using]
+        _availability[using] = (
+            connection.vendor == "sqlite"
+            and FTS_TABLE in connection.introspection.table_names()
+        )
+    return _availability[using]
+
+
+def search_books(queryset, text):
+    """
+    Filter books whose title or author contain words starting with every
+    term of `text`.
+
+    With the FTS5 index the result is annotated with `search_rank` (bm25,
+    lower is better); the portable fallback matches substrings unranked.
+    """
+    terms = TERM_RE.findall(text)
+    if not terms:
+        return queryset.none()
+
+    if search_index_available(queryset.db):
+        query = " ".join(f'"{term}"*' for term in terms)
+        return queryset.filter(search_index__match__fts=query).annotate(
+            search_rank=F("search_index__rank")
+        )
+
+    return queryset.filter(
+        reduce(
+            and_,
+            (
+                Q(title__icontains=term) | Q(author__icontains=term)
+                for term in terms
+            ),
+        )
+    )
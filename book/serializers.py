@@ -1,9 +1,24 @@
 from rest_framework import serializers
 
-from book.models import Book
+from book.models import Book, BookRelation
+from library_service.serializers import TimedSerializerMixin
 
 
-class BookSerializer(serializers.ModelSerializer):
+class BookSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Book
         fields = ("id", "title", "author", "cover", "inventory", "daily_fee")
+
+
+class BookImportSerializer(BookSerializer):
+    class Meta(BookSerializer.Meta):
+        # Imports upsert on (title, author), so duplicates are not errors.
+        validators = []
+
+
+class RelatedBookSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    book = BookSerializer(source="related")
+
+    class Meta:
+        model = BookRelation
+        fields = ("book", "score")
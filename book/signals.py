@@ -0,0 +1,36 @@
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from book import cache
+
+# Sent after commit whenever books change; `book_ids` is None when the
+# change may touch any book (bulk loads).
+catalog_changed = Signal()
+
+
+def notify_catalog_changed(sender, book_ids=None):
+    if book_ids is not None:
+        book_ids = list(book_ids)
+    transaction.on_commit(
+        lambda: catalog_changed.send(sender=sender, book_ids=book_ids)
+    )
+
+
+@receiver(post_save, sender="book.Book")
+@receiver(post_delete, sender="book.Book")
+def book_written(sender, instance, **kwargs):
+    notify_catalog_changed(sender, [instance.pk])
+
+
+@receiver(catalog_changed)
+def bump_catalog_version(sender, **kwargs):
+    apps.get_model("book", "CatalogVersion").bump()
+
+
+@receiver(catalog_changed)
+def invalidate_response_cache(sender, book_ids, **kwargs):
+    if settings.BOOK_RESPONSE_CACHE:
+        cache.invalidate(book_ids)
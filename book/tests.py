@@ -1,10 +1,29 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
+import time
+from base64 import b64encode
+from unittest import mock
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.core.management import CommandError, call_command
+from django.db import router
+from django.test import AsyncRequestFactory, TestCase, override_settings
 from rest_framework.test import APIClient
 from rest_framework import status
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 
-from book.models import Book
+from book.cache import get_cache, stats
+from book.models import Book, BookRelation, CatalogVersion
+from book.views import BookViewSet
+from library_service.db import (
+    PIN_COOKIE,
+    PIN_HEADER,
+    current_replica,
+    reading_from,
+)
 
 BOOK_LIST_URL = reverse("books:book-list")
 
@@ -25,6 +44,38 @@ class UnauthenticatedTests(TestCase):
         response = self.client.get(BOOK_LIST_URL)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def test_book_list_is_paginated_by_id(self):
+        for index in range(4):
+            Book.objects.create(
+                title=f"Book {index}",
+                author="Test Author",
+                cover="HARD",
+                inventory=1,
+                daily_fee=1,
+            )
+
+        response = self.client.get(BOOK_LIST_URL, {"page_size": 3})
+        first_page = [book["id"] for book in response.data["results"]]
+        response = self.client.get(response.data["next"])
+        second_page = [book["id"] for book in response.data["results"]]
+
+        self.assertEqual(
+            first_page + second_page,
+            list(Book.objects.order_by("id").values_list("id", flat=True)),
+        )
+        self.assertIsNone(response.data["next"])
+
+    def test_cursor_values_must_suit_the_ordering(self):
+        for position in (["abc"], [None], [[1]]):
+            with self.subTest(position=position):
+                cursor = b64encode(json.dumps({"p": position}).encode())
+                response = self.client.get(
+                    BOOK_LIST_URL, {"cursor": cursor.decode()}
+                )
+                self.assertEqual(
+                    response.status_code, status.HTTP_404_NOT_FOUND
+                )
+
     def test_cannot_create_book(self):
         data = {
             "title": "Title",
@@ -123,7 +174,597 @@ class AdminUserTests(TestCase):
         response = self.client.patch(self.book_url, data=data)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def test_title_and_author_are_unique(self):
+        data = {
+            "title": "Test Book",
+            "author": "Test Author",
+            "cover": "HARD",
+            "inventory": 1,
+            "daily_fee": 1,
+        }
+        response = self.client.post(BOOK_LIST_URL, data=data)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("non_field_errors", response.data)
+
+        other = Book.objects.create(
+            title="Other",
+            author="Test Author",
+            cover="SOFT",
+            inventory=1,
+            daily_fee=1,
+        )
+        response = self.client.put(f"{BOOK_LIST_URL}{other.id}/", data=data)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_admin_can_delete_book(self):
         response = self.client.delete(self.book_url)
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
 
+
+
+class BookSearchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.books = {
+            title: Book.objects.create(
+                title=title,
+                author=author,
+                cover=cover,
+                inventory=1,
+                daily_fee=1,
+            )
+            for title, author, cover in (
+                ("The Lord of the Rings", "J. R. R. Tolkien", "HARD"),
+                ("The Hobbit", "J. R. R. Tolkien", "SOFT"),
+                ("Lord Jim", "Joseph Conrad", "SOFT"),
+                ("Dune", "Frank Herbert", "HARD"),
+            )
+        }
+
+    def search(self, **params):
+        response = self.client.get(BOOK_LIST_URL, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [book["title"] for book in response.data["results"]]
+
+    def test_search_matches_word_prefixes_in_title_and_author(self):
+        self.assertEqual(
+            sorted(self.search(search="tolk")),
+            ["The Hobbit", "The Lord of the Rings"],
+        )
+        self.assertEqual(
+            self.search(search="lord ring"), ["The Lord of the Rings"]
+        )
+        self.assertEqual(self.search(search="!!!"), [])
+
+    def test_search_combines_with_cover_filter(self):
+        self.assertEqual(
+            self.search(search="lord", cover="soft"), ["Lord Jim"]
+        )
+
+    def test_search_paginates_over_all_matches(self):
+        titles = []
+        response = self.client.get(
+            BOOK_LIST_URL, {"search": "the", "page_size": 1}
+        )
+        while True:
+            titles.extend(book["title"] for book in response.data["results"])
+            if not response.data["next"]:
+                break
+            response = self.client.get(response.data["next"])
+
+        self.assertEqual(
+            sorted(titles), ["The Hobbit", "The Lord of the Rings"]
+        )
+
+    def test_index_follows_updates_and_deletes(self):
+        dune = self.books["Dune"]
+        dune.title = "Children of Dune"
+        dune.save()
+        self.books["Lord Jim"].delete()
+
+        self.assertEqual(self.search(search="child"), ["Children of Dune"])
+        self.assertEqual(self.search(search="conrad"), [])
+
+    def test_fallback_without_search_index(self):
+        with mock.patch(
+            "book.search.search_index_available", return_value=False
+        ):
+            self.assertEqual(
+                self.search(search="tolk hob"), ["The Hobbit"]
+            )
+
+
+class BookPopularityTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        for title, borrow_count in (
+            ("Dune", 5),
+            ("Emma", 12),
+            ("Ulysses", 0),
+            ("Hamlet", 5),
+        ):
+            Book.objects.create(
+                title=title,
+                author="Author",
+                cover="SOFT",
+                inventory=1,
+                daily_fee=1,
+            )
+            Book.objects.filter(title=title).update(borrow_count=borrow_count)
+
+    def titles(self, **params):
+        titles = []
+        url = BOOK_LIST_URL
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            titles += [book["title"] for book in response.data["results"]]
+            url, params = response.data["next"], None
+        return titles
+
+    def test_most_borrowed_first(self):
+        self.assertEqual(
+            self.titles(ordering="-popularity", page_size=1),
+            ["Emma", "Hamlet", "Dune", "Ulysses"],
+        )
+
+    def test_least_borrowed_first(self):
+        self.assertEqual(
+            self.titles(ordering="popularity", page_size=3),
+            ["Ulysses", "Dune", "Hamlet", "Emma"],
+        )
+
+    def test_invalid_ordering_is_rejected(self):
+        response = self.client.get(BOOK_LIST_URL, {"ordering": "title"})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("ordering", response.data)
+
+
+class RelatedBooksTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.dune, self.emma, self.hamlet = (
+            Book.objects.create(
+                title=title,
+                author="Author",
+                cover="SOFT",
+                inventory=1,
+                daily_fee=1,
+            )
+            for title in ("Dune", "Emma", "Hamlet")
+        )
+
+    def related_url(self, pk):
+        return reverse("books:book-related", args=[pk])
+
+    def test_best_scores_first(self):
+        BookRelation.objects.bulk_create(
+            [
+                BookRelation(book=self.dune, related=self.emma, score=0.25),
+                BookRelation(book=self.dune, related=self.hamlet, score=0.5),
+                BookRelation(book=self.emma, related=self.dune, score=0.25),
+            ]
+        )
+
+        response = self.client.get(self.related_url(self.dune.pk))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(item["book"]["title"], item["score"]) for item in response.data],
+            [("Hamlet", 0.5), ("Emma", 0.25)],
+        )
+
+    def test_book_without_relations(self):
+        response = self.client.get(self.related_url(self.hamlet.pk))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, [])
+
+    def test_unknown_book(self):
+        response = self.client.get(self.related_url(0))
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ConditionalRequestTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin_user = get_user_model().objects.create_superuser(
+            email="tes@admin.com", password="password"
+        )
+        self.book = Book.objects.create(
+            title="Test Book",
+            author="Test Author",
+            cover="SOFT",
+            inventory=5,
+            daily_fee=1,
+        )
+        self.book_url = f"{BOOK_LIST_URL}{self.book.id}/"
+
+    def test_list_and_detail_emit_validators(self):
+        for url in (BOOK_LIST_URL, self.book_url):
+            response = self.client.get(url)
+
+            self.assertTrue(response.has_header("ETag"))
+            self.assertTrue(response.has_header("Last-Modified"))
+
+    def test_matching_etag_returns_not_modified_without_serializing(self):
+        for url in (BOOK_LIST_URL, self.book_url):
+            etag = self.client.get(url)["ETag"]
+
+            with self.assertNumQueries(1):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+            self.assertEqual(
+                response.status_code, status.HTTP_304_NOT_MODIFIED
+            )
+            self.assertEqual(response.content, b"")
+
+    def test_etag_depends_on_query_string(self):
+        first = self.client.get(BOOK_LIST_URL)["ETag"]
+        second = self.client.get(BOOK_LIST_URL, {"cover": "HARD"})["ETag"]
+
+        self.assertNotEqual(first, second)
+
+    def test_admin_write_changes_etags(self):
+        list_etag = self.client.get(BOOK_LIST_URL)["ETag"]
+        detail_etag = self.client.get(self.book_url)["ETag"]
+
+        self.client.force_authenticate(self.admin_user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(self.book_url, {"title": "Updated Title"})
+        self.client.force_authenticate(None)
+
+        self.assertNotEqual(
+            self.client.get(BOOK_LIST_URL)["ETag"], list_etag
+        )
+        self.assertNotEqual(
+            self.client.get(self.book_url)["ETag"], detail_etag
+        )
+
+    def test_inventory_change_changes_etags(self):
+        list_etag = self.client.get(BOOK_LIST_URL)["ETag"]
+        detail_etag = self.client.get(self.book_url)["ETag"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Book.objects.adjust_inventory({self.book.id: -1})
+
+        response = self.client.get(BOOK_LIST_URL, HTTP_IF_NONE_MATCH=list_etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.get(
+            self.book_url, HTTP_IF_NONE_MATCH=detail_etag
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["inventory"], 4)
+
+    def test_missing_book_has_no_validators(self):
+        response = self.client.get(f"{BOOK_LIST_URL}999999/")
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(response.has_header("ETag"))
+
+
+def async_view(viewset, actions):
+    return viewset.as_async_view(viewset.as_view(actions), actions)
+
+
+ASYNC_LIST_VIEW = async_view(BookViewSet, {"get": "list", "post": "create"})
+ASYNC_DETAIL_VIEW = async_view(
+    BookViewSet,
+    {
+        "get": "retrieve",
+        "put": "update",
+        "patch": "partial_update",
+        "delete": "destroy",
+    },
+)
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.books = [
+            Book.objects.create(
+                title=f"Book {index}",
+                author="Test Author",
+                cover="SOFT" if index % 2 else "HARD",
+                inventory=5,
+                daily_fee=1,
+            )
+            for index in range(3)
+        ]
+        self.book_url = f"{BOOK_LIST_URL}{self.books[0].id}/"
+
+    def assertSameResponse(self, view, path, headers=None, **kwargs):
+        """Compare the async view's response with the routed sync one."""
+        expected = self.client.get(path, headers=headers)
+        request = AsyncRequestFactory().get(path, headers=headers)
+        response = async_to_sync(view)(request, **kwargs)
+        if hasattr(response, "render"):
+            response.render()
+
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response.content, expected.content)
+        for header in ("Content-Type", "ETag", "Last-Modified", "Allow"):
+            self.assertEqual(response.get(header), expected.get(header))
+        return response
+
+    def test_views_are_coroutines(self):
+        self.assertTrue(iscoroutinefunction(ASYNC_LIST_VIEW))
+        self.assertTrue(iscoroutinefunction(ASYNC_DETAIL_VIEW))
+
+    def test_list_matches_sync_view(self):
+        first = self.assertSameResponse(
+            ASYNC_LIST_VIEW, f"{BOOK_LIST_URL}?page_size=2"
+        )
+        self.assertSameResponse(ASYNC_LIST_VIEW, json.loads(first.content)["next"])
+        self.assertSameResponse(ASYNC_LIST_VIEW, f"{BOOK_LIST_URL}?cover=hard")
+        self.assertSameResponse(ASYNC_LIST_VIEW, f"{BOOK_LIST_URL}?search=book")
+        self.assertSameResponse(ASYNC_LIST_VIEW, f"{BOOK_LIST_URL}?cursor=x")
+
+    def test_retrieve_matches_sync_view(self):
+        self.assertSameResponse(
+            ASYNC_DETAIL_VIEW, self.book_url, pk=str(self.books[0].id)
+        )
+        self.assertSameResponse(
+            ASYNC_DETAIL_VIEW, f"{BOOK_LIST_URL}999999/", pk="999999"
+        )
+        self.assertSameResponse(
+            ASYNC_DETAIL_VIEW, f"{BOOK_LIST_URL}abc/", pk="abc"
+        )
+
+    def test_conditional_requests_match_sync_view(self):
+        etag = self.client.get(self.book_url)["ETag"]
+        response = self.assertSameResponse(
+            ASYNC_DETAIL_VIEW,
+            self.book_url,
+            headers={"If-None-Match": etag},
+            pk=str(self.books[0].id),
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    @override_settings(BOOK_RESPONSE_CACHE=True)
+    def test_cached_responses_match_sync_view(self):
+        get_cache().clear()
+        for _ in range(2):
+            self.assertSameResponse(ASYNC_LIST_VIEW, BOOK_LIST_URL)
+
+    def test_writes_run_the_sync_view(self):
+        request = AsyncRequestFactory().post(
+            BOOK_LIST_URL, {"title": "New"}, content_type="application/json"
+        )
+        response = async_to_sync(ASYNC_LIST_VIEW)(request)
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+@override_settings(DATABASE_REPLICAS=["default"])
+@mock.patch("library_service.db.choose_replica", return_value="default")
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin_user = get_user_model().objects.create_superuser(
+            email="admin@test.com", password="password"
+        )
+        self.book = Book.objects.create(
+            title="Test Book",
+            author="Test Author",
+            cover="SOFT",
+            inventory=5,
+            daily_fee=1,
+        )
+        self.book_url = f"{BOOK_LIST_URL}{self.book.id}/"
+
+    def test_router_sends_only_replica_reads_to_the_replica(self, choose):
+        with reading_from("replica1"):
+            self.assertEqual(router.db_for_read(Book), "replica1")
+            self.assertEqual(router.db_for_write(Book), "default")
+            self.assertEqual(
+                router.db_for_read(get_user_model()), "default"
+            )
+        self.assertEqual(router.db_for_read(Book), "default")
+
+    def test_list_and_retrieve_read_from_a_replica(self, choose):
+        self.client.get(BOOK_LIST_URL)
+        self.client.get(self.book_url)
+
+        self.assertEqual(choose.call_count, 2)
+
+    def test_writes_pin_the_client_to_the_primary(self, choose):
+        self.client.force_authenticate(self.admin_user)
+        response = self.client.patch(self.book_url, {"title": "Updated"})
+
+        self.assertFalse(choose.called)
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertGreater(float(response[PIN_HEADER]), time.time())
+
+        self.client.get(self.book_url)
+        APIClient().get(
+            self.book_url, headers={PIN_HEADER: response[PIN_HEADER]}
+        )
+        self.assertFalse(choose.called)
+
+    def test_expired_pins_read_from_a_replica(self, choose):
+        self.client.get(
+            self.book_url, headers={PIN_HEADER: str(time.time() - 1)}
+        )
+
+        self.assertTrue(choose.called)
+
+    def test_catalog_version_is_read_where_the_list_is(self, choose):
+        versions = []
+
+        def current():
+            versions.append(current_replica())
+            return CatalogVersion._initial()
+
+        with mock.patch.object(CatalogVersion, "current", current):
+            self.client.get(BOOK_LIST_URL)
+
+        # "default" stands in for the replica chosen by the mock.
+        self.assertEqual(versions, ["default"])
+        self.assertTrue(choose.called)
+
+    def test_catalog_version_is_never_created_by_reads(self, choose):
+        CatalogVersion.objects.all().delete()
+
+        response = self.client.get(BOOK_LIST_URL)
+
+        self.assertEqual(response["ETag"].strip('"').split("-")[0], "0")
+        self.assertFalse(CatalogVersion.objects.exists())
+
+    @override_settings(BOOK_RESPONSE_CACHE=True)
+    def test_replica_responses_are_not_cached(self, choose):
+        get_cache().clear()
+        for url in (BOOK_LIST_URL, self.book_url):
+            self.client.get(url)
+            hits = stats.hits
+
+            self.client.get(url)
+
+            self.assertEqual(stats.hits, hits)
+
+
+@override_settings(BOOK_RESPONSE_CACHE=True)
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        get_cache().clear()
+        self.books = [
+            Book.objects.create(
+                title=f"Book {index}",
+                author="Test Author",
+                cover="SOFT",
+                inventory=5,
+                daily_fee=1,
+            )
+            for index in range(2)
+        ]
+        self.book_url = f"{BOOK_LIST_URL}{self.books[0].id}/"
+        self.other_book_url = f"{BOOK_LIST_URL}{self.books[1].id}/"
+
+    def test_repeated_requests_are_served_from_cache(self):
+        for url in (BOOK_LIST_URL, self.book_url):
+            first = self.client.get(url)
+            hits = stats.hits
+
+            with self.assertNumQueries(1):
+                second = self.client.get(url)
+
+            self.assertEqual(second.content, first.content)
+            self.assertEqual(stats.hits, hits + 1)
+
+    def test_query_params_are_cached_separately(self):
+        self.client.get(BOOK_LIST_URL)
+
+        response = self.client.get(BOOK_LIST_URL, {"cover": "HARD"})
+
+        self.assertEqual(response.data["results"], [])
+
+    def test_write_invalidates_list_and_only_changed_book(self):
+        self.client.get(BOOK_LIST_URL)
+        self.client.get(self.book_url)
+        self.client.get(self.other_book_url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Book.objects.adjust_inventory({self.books[0].id: -1})
+
+        self.assertEqual(
+            self.client.get(BOOK_LIST_URL).data["results"][0]["inventory"], 4
+        )
+        self.assertEqual(self.client.get(self.book_url).data["inventory"], 4)
+        with self.assertNumQueries(1):
+            self.client.get(self.other_book_url)
+
+    def test_delete_invalidates_cached_detail(self):
+        self.client.get(self.book_url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.books[0].delete()
+
+        response = self.client.get(self.book_url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_admin_can_read_cache_stats(self):
+        url = reverse("books:book-cache-stats")
+        self.client.get(BOOK_LIST_URL)
+
+        self.assertEqual(
+            self.client.get(url).status_code, status.HTTP_401_UNAUTHORIZED
+        )
+        self.client.force_authenticate(
+            get_user_model().objects.create_superuser(
+                email="tes@admin.com", password="password"
+            )
+        )
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data["enabled"])
+        self.assertGreaterEqual(response.data["misses"], 1)
+
+
+class ImportBooksCommandTests(TestCase):
+    def write(self, suffix, content):
+        handle = tempfile.NamedTemporaryFile(
+            "w", suffix=suffix, delete=False, encoding="utf-8"
+        )
+        with handle:
+            handle.write(content)
+        self.addCleanup(os.unlink, handle.name)
+        return handle.name
+
+    def test_csv_import_upserts_on_title_and_author(self):
+        Book.objects.create(
+            title="Dune",
+            author="Frank Herbert",
+            cover="HARD",
+            inventory=1,
+            daily_fee=1,
+        )
+        path = self.write(
+            ".csv",
+            "title,author,cover,inventory,daily_fee\n"
+            "Dune,Frank Herbert,SOFT,4,2.50\n"
+            "Emma,Jane Austen,HARD,2,0.75\n"
+            "Emma,Jane Austen,HARD,3,0.75\n",
+        )
+
+        call_command(
+            "import_books", path, batch_size=2, stdout=io.StringIO()
+        )
+
+        self.assertEqual(
+            list(
+                Book.objects.order_by("title").values_list(
+                    "title", "cover", "inventory"
+                )
+            ),
+            [("Dune", "SOFT", 4), ("Emma", "HARD", 3)],
+        )
+
+    def test_ndjson_import_reports_invalid_rows(self):
+        path = self.write(
+            ".ndjson",
+            '{"title": "Emma", "author": "Jane Austen", "cover": "SOFT", '
+            '"inventory": 1, "daily_fee": "1.00"}\n'
+            '{"title": "Bad", "author": "Row", "cover": "PAPER", '
+            '"inventory": -1, "daily_fee": "1.00"}\n'
+            "not json\n",
+        )
+        stdout, stderr = io.StringIO(), io.StringIO()
+
+        call_command("import_books", path, stdout=stdout, stderr=stderr)
+
+        self.assertEqual(
+            list(Book.objects.values_list("title", flat=True)), ["Emma"]
+        )
+        self.assertIn("row 2:", stderr.getvalue())
+        self.assertIn("row 3:", stderr.getvalue())
+        self.assertIn("2 invalid", stdout.getvalue())
+
+    def test_unreadable_file_is_a_command_error(self):
+        with self.assertRaisesMessage(CommandError, "Cannot read missing.csv"):
+            call_command("import_books", "missing.csv", stdout=io.StringIO())
@@ -1,11 +1,207 @@
+from hashlib import sha1
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema, OpenApiParameter
 
-from book.models import Book
-from book.serializers import BookSerializer
+from library_service.async_views import AsyncReadMixin
+from library_service.db import ReplicaReadMixin
+from library_service.pagination import KeysetPagination
+from book import cache
+from book.models import Book, BookRelation, CatalogVersion
+from book.search import search_books, search_index_available
+from book.serializers import BookSerializer, RelatedBookSerializer
 from book.permissions import IsAdminOrReadOnly
 
 
-class BookViewSet(viewsets.ModelViewSet):
+def _representation_key(request):
+    """Tell apart responses to the same validators in different formats."""
+    key = f"{request.get_full_path()}|{request.META.get('HTTP_ACCEPT', '')}"
+    return sha1(key.encode()).hexdigest()[:16]
+
+
+def _catalog_version(request):
+    if not hasattr(request, "_catalog_version"):
+        request._catalog_version = CatalogVersion.current()
+    return request._catalog_version
+
+
+def catalog_etag(request, *args, **kwargs):
+    version = _catalog_version(request).version
+    return f"{version}-{_representation_key(request)}"
+
+
+def catalog_last_modified(request, *args, **kwargs):
+    return _catalog_version(request).updated_at
+
+
+def _updated_at(pk):
+    """The book's `updated_at` as a query, or None for a malformed pk."""
+    try:
+        return Book.objects.filter(pk=pk).values_list("updated_at", flat=True)
+    except (TypeError, ValueError):
+        return None
+
+
+def _book_updated_at(request, pk):
+    if not hasattr(request, "_book_updated_at"):
+        query = _updated_at(pk)
+        request._book_updated_at = None if query is None else query.first()
+    return request._book_updated_at
+
+
+def book_etag(request, pk=None, **kwargs):
+    updated_at = _book_updated_at(request, pk)
+    if updated_at is None:
+        return None
+    return f"{pk}-{updated_at.timestamp()}-{_representation_key(request)}"
+
+
+def book_last_modified(request, pk=None, **kwargs):
+    return _book_updated_at(request, pk)
+
+
+class BookPagination(KeysetPagination):
+    ordering = ("id",)
+    ordering_query_param = "ordering"
+    # ?ordering= value -> keyset ordering
+    orderings = {
+        "popularity": ("borrow_count", "id"),
+        "-popularity": ("-borrow_count", "-id"),
+    }
+
+    def get_ordering(self, request, queryset, view):
+        ordering = request.query_params.get(self.ordering_query_param)
+        if ordering is not None:
+            if ordering not in self.orderings:
+                raise ValidationError(
+                    {
+                        self.ordering_query_param: [
+                            f"Choose one of: {', '.join(self.orderings)}."
+                        ]
+                    }
+                )
+            return self.orderings[ordering]
+        if "search_rank" in queryset.query.annotations:
+            return ("search_rank", "id")
+        return self.ordering
+
+
+book_conditions = method_decorator(
+    condition(etag_func=book_etag, last_modified_func=book_last_modified)
+)
+catalog_conditions = method_decorator(
+    condition(etag_func=catalog_etag, last_modified_func=catalog_last_modified)
+)
+
+
+class BookViewSet(ReplicaReadMixin, AsyncReadMixin, viewsets.ModelViewSet):
     queryset = Book.objects.all()
     serializer_class = BookSerializer
     permission_classes = (IsAdminOrReadOnly,)
+    pagination_class = BookPagination
+    replica_actions = ("list", "retrieve", "related")
+
+    def get_queryset(self):
+        queryset = self.queryset
+
+        if self.action == "list":
+            cover = self.request.query_params.get("cover")
+            if cover:
+                queryset = queryset.filter(cover=cover.upper())
+
+            search = self.request.query_params.get("search")
+            if search:
+                queryset = search_books(queryset, search)
+
+        return queryset
+
+    @book_conditions
+    @cache.cached_response
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    @catalog_conditions
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "search",
+                type=OpenApiTypes.STR,
+                description=(
+                    "Search by words or word prefixes of title and author, "
+                    "best matches first (ex. ?search=tolk lord)"
+                ),
+            ),
+            OpenApiParameter(
+                "cover",
+                type=OpenApiTypes.STR,
+                enum=[choice for choice, _ in Book.COVER_CHOICES],
+                description="Filter by cover type (ex. ?cover=HARD)",
+            ),
+            OpenApiParameter(
+                "ordering",
+                type=OpenApiTypes.STR,
+                enum=list(BookPagination.orderings),
+                description=(
+                    "Sort by how often books were borrowed, overriding "
+                    "search relevance (ex. ?ordering=-popularity)"
+                ),
+            ),
+        ]
+    )
+    @cache.cached_response
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    async def ainitial(self, request, *args, **kwargs):
+        await super().ainitial(request, *args, **kwargs)
+        # Load up front what the sync-only helpers above would query.
+        if self.action == "list":
+            request._catalog_version = await CatalogVersion.acurrent()
+            if request.query_params.get("search"):
+                await sync_to_async(search_index_available)(Book.objects.db)
+        else:
+            query = _updated_at(kwargs.get("pk"))
+            request._book_updated_at = (
+                None if query is None else await query.afirst()
+            )
+
+    @book_conditions
+    @cache.cached_response
+    async def aretrieve(self, request, *args, **kwargs):
+        return await super().aretrieve(request, *args, **kwargs)
+
+    @catalog_conditions
+    @cache.cached_response
+    async def alist(self, request, *args, **kwargs):
+        return await super().alist(request, *args, **kwargs)
+
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="cache-stats",
+        permission_classes=(IsAdminUser,),
+    )
+    def cache_stats(self, request):
+        return Response(
+            {"enabled": settings.BOOK_RESPONSE_CACHE, **cache.stats.as_dict()}
+        )
+
+    @extend_schema(responses=RelatedBookSerializer(many=True))
+    @action(detail=True, methods=["get"])
+    def related(self, request, pk=None):
+        """Books most often borrowed by the readers of this one."""
+        relations = (
+            BookRelation.objects.filter(book=self.get_object())
+            .select_related("related")
+            .order_by("-score", "related_id")
+        )
+        return Response(RelatedBookSerializer(relations, many=True).data)
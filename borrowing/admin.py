@@ -1,6 +1,14 @@
 from django.contrib import admin
 
-from borrowing.models import Borrowing
+from borrowing.models import Borrowing, Job
 
 
-admin.site.register(Borrowing)
+@admin.register(Borrowing)
+class BorrowingAdmin(admin.ModelAdmin):
+    list_select_related = ("book", "user")
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("id", "kind", "key", "status", "attempts", "run_after")
+    list_filter = ("status", "kind")
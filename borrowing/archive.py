@@ -0,0 +1,51 @@
+"""
+Move borrowings returned long ago from `Borrowing` to `ArchivedBorrowing`.
+
+Each batch is copied and deleted in one transaction, so an interrupted
+run leaves every borrowing in exactly one table and the next run picks
+up the rest.
+"""
+
+from datetime import date, timedelta
+
+from django.db import transaction
+
+from borrowing.models import ArchivedBorrowing, Borrowing
+from library_service.db import retry_on_lock
+
+ARCHIVED_FIELDS = (
+    "id",
+    "borrow_date",
+    "expected_return_date",
+    "actual_return_date",
+    "book_id",
+    "user_id",
+)
+
+
+def archivable(days, today=None):
+    """Borrowings returned more than `days` days before `today`."""
+    cutoff = (today or date.today()) - timedelta(days=days)
+    return Borrowing.objects.filter(actual_return_date__lt=cutoff)
+
+
+@retry_on_lock
+def archive_batch(queryset, batch_size):
+    """Archive up to `batch_size` borrowings of `queryset`; return how many."""
+    with transaction.atomic():
+        rows = list(queryset.values(*ARCHIVED_FIELDS)[:batch_size])
+        if rows:
+            ArchivedBorrowing.objects.bulk_create(
+                [ArchivedBorrowing(**row) for row in rows]
+            )
+            Borrowing.objects.filter(
+                pk__in=[row["id"] for row in rows]
+            ).delete()
+    return len(rows)
+
+
+def archive(days, batch_size, today=None):
+    """Archive every borrowing returned more than `days` days ago."""
+    queryset = archivable(days, today)
+    while moved := archive_batch(queryset, batch_size):
+        yield moved
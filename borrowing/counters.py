@@ -0,0 +1,74 @@
+"""
+Recompute the loan counters that the borrow and return paths maintain:
+`Book.active_loans`, `Book.borrow_count` and `UserLoanStats`.
+"""
+
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from book.models import Book
+from book.signals import notify_catalog_changed
+from borrowing.models import ArchivedBorrowing, Borrowing, UserLoanStats
+
+BATCH_SIZE = 5000
+
+
+def _count_per_book(queryset):
+    """A correlated COUNT of `queryset` rows of the outer book."""
+    counts = (
+        queryset.filter(book=OuterRef("pk"))
+        .order_by()
+        .values("book")
+        .annotate(count=Count("*"))
+        .values("count")
+    )
+    return Coalesce(Subquery(counts), Value(0))
+
+
+def _count_per_user(queryset):
+    return Counter(
+        dict(
+            queryset.order_by()
+            .values("user_id")
+            .annotate(count=Count("*"))
+            .values_list("user_id", "count")
+        )
+    )
+
+
+@transaction.atomic
+def repair_book_counters():
+    """Recount every book's loans in one UPDATE; return the book count."""
+    updated = Book.objects.update(
+        active_loans=_count_per_book(Borrowing.objects.active()),
+        borrow_count=_count_per_book(Borrowing.objects.all())
+        + _count_per_book(ArchivedBorrowing.objects.all()),
+    )
+    # Popularity orderings of the catalog may have changed.
+    notify_catalog_changed(Book)
+    return updated
+
+
+@transaction.atomic
+def repair_user_counters():
+    """Rebuild `UserLoanStats` from scratch; return the number of rows."""
+    active = _count_per_user(Borrowing.objects.active())
+    total = _count_per_user(Borrowing.objects.all()) + _count_per_user(
+        ArchivedBorrowing.objects.all()
+    )
+    UserLoanStats.objects.all().delete()
+    UserLoanStats.objects.bulk_create(
+        (
+            UserLoanStats(
+                user_id=user_id,
+                active_loans=active[user_id],
+                total_loans=count,
+            )
+            for user_id, count in total.items()
+        ),
+        batch_size=BATCH_SIZE,
+    )
+    return len(total)
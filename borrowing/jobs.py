@@ -0,0 +1,252 @@
+"""
+A database-backed job queue and the overdue scanner that feeds it.
+
+Jobs are rows of `Job`, unique per `(kind, key)`, so enqueueing the same
+work twice is a no-op. Workers claim due jobs by marking them RUNNING
+with a lease; a job whose worker died is claimed again once its lease
+runs out. Handlers therefore run at least once and must tolerate
+running twice.
+"""
+
+import logging
+import random
+import traceback
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.db import connection, transaction
+from django.db.models import F, Max
+from django.utils import timezone
+
+from borrowing.models import Borrowing, Job, ScanCheckpoint
+from library_service import metrics
+from library_service.db import retry_on_lock
+
+logger = logging.getLogger(__name__)
+
+OVERDUE_REMINDER = "overdue_reminder"
+OVERDUE_SCAN = "overdue_scan"
+ENQUEUE_BATCH_SIZE = 1000
+
+HANDLERS = {}
+
+
+def handler(kind):
+    """Register the decorated function to run jobs of `kind`."""
+
+    def register(func):
+        HANDLERS[kind] = func
+        return func
+
+    return register
+
+
+def enqueue(kind, key, payload=None):
+    """Queue a job unless one of this kind and key already exists."""
+    Job.objects.bulk_create(
+        [Job(kind=kind, key=str(key), payload=payload or {})],
+        ignore_conflicts=True,
+    )
+
+
+@retry_on_lock
+def claim(limit, now=None):
+    """Lease up to `limit` due jobs to the caller and return them."""
+    now = now or timezone.now()
+    with transaction.atomic():
+        _fail_abandoned(now)
+        claimable = Job.objects.claimable(now).order_by("run_after", "id")
+        if connection.features.has_select_for_update_skip_locked:
+            claimable = claimable.select_for_update(skip_locked=True)
+        # SQLite has no row locks, but its transactions here start with
+        # BEGIN IMMEDIATE: no other worker can claim between the SELECT
+        # and the UPDATE.
+        ids = list(claimable.values_list("id", flat=True)[:limit])
+        Job.objects.filter(pk__in=ids).update(
+            status=Job.RUNNING,
+            attempts=F("attempts") + 1,
+            locked_until=now + timedelta(seconds=settings.JOB_LEASE_SECONDS),
+            updated_at=now,
+        )
+    return list(Job.objects.filter(pk__in=ids).order_by("run_after", "id"))
+
+
+def _fail_abandoned(now):
+    """
+    Fail the jobs whose lease expired on their last attempt. Their worker
+    most likely died running them, and running them again would kill the
+    next one.
+    """
+    abandoned = Job.objects.abandoned(now)
+    kinds = list(abandoned.values_list("kind", flat=True))
+    if not kinds:
+        return
+    abandoned.update(
+        status=Job.FAILED,
+        locked_until=None,
+        last_error="The lease expired: the worker stopped or hung.",
+        updated_at=now,
+    )
+    for kind in kinds:
+        metrics.JOBS.labels(kind, "failed").inc()
+    logger.warning(
+        "%s job(s) failed: leases expired after %s attempts.",
+        len(kinds),
+        settings.JOB_MAX_ATTEMPTS,
+    )
+
+
+def run(job):
+    """Run a claimed job, then mark it done or schedule its retry."""
+    try:
+        HANDLERS[job.kind](job)
+    except Exception:
+        _failed(job, traceback.format_exc())
+    else:
+        _done(job)
+
+
+@retry_on_lock
+def _done(job):
+    _leased(job).update(
+        status=Job.DONE,
+        locked_until=None,
+        last_error="",
+        updated_at=timezone.now(),
+    )
+    metrics.JOBS.labels(job.kind, "done").inc()
+
+
+@retry_on_lock
+def _failed(job, error):
+    now = timezone.now()
+    if job.attempts >= settings.JOB_MAX_ATTEMPTS:
+        changes = {"status": Job.FAILED}
+        outcome = "failed"
+    else:
+        # Exponential backoff, jittered so that retries spread out.
+        delay = settings.JOB_RETRY_BACKOFF_SECONDS * 2 ** (job.attempts - 1)
+        changes = {
+            "status": Job.PENDING,
+            "run_after": now
+            + timedelta(seconds=delay * random.uniform(0.5, 1)),
+        }
+        outcome = "retry"
+    _leased(job).update(
+        **changes, locked_until=None, last_error=error, updated_at=now
+    )
+    metrics.JOBS.labels(job.kind, outcome).inc()
+    logger.warning("Job %s %s: %s", job.pk, outcome, error.splitlines()[-1])
+
+
+def _leased(job):
+    """The job's row, unless its lease expired and it was claimed again."""
+    return Job.objects.filter(
+        pk=job.pk, status=Job.RUNNING, attempts=job.attempts
+    )
+
+
+def scan_overdue(today=None):
+    """
+    Queue a reminder for every borrowing that fell overdue since the
+    last scan and return how many borrowings were found.
+
+    The checkpoint is the last expected return date scanned; each day
+    is queued and checkpointed in its own transaction, so an interrupted
+    scan resumes where it stopped. The first scan only covers loans due
+    yesterday, that is, the ones that fell overdue today. Borrowings
+    added since the last scan with a due date already scanned are
+    found by id.
+    """
+    today = today or date.today()
+    last_due = today - timedelta(days=1)
+    newest = Borrowing.objects.aggregate(newest=Max("id"))["newest"] or 0
+    checkpoint, _ = ScanCheckpoint.objects.get_or_create(
+        name=OVERDUE_SCAN,
+        defaults={
+            "position": last_due - timedelta(days=1),
+            "last_id": newest,
+        },
+    )
+
+    found = _queue_added(checkpoint, newest, today)
+    day = checkpoint.position
+    while day < last_due:
+        day += timedelta(days=1)
+        found += _queue_reminders(day, today)
+    return found
+
+
+@retry_on_lock
+def _queue_added(checkpoint, newest, today):
+    borrowings = Borrowing.objects.overdue(today).filter(
+        id__gt=checkpoint.last_id,
+        id__lte=newest,
+        expected_return_date__lte=checkpoint.position,
+    )
+    with transaction.atomic():
+        found = _queue(borrowings)
+        ScanCheckpoint.objects.filter(pk=checkpoint.pk).update(last_id=newest)
+    return found
+
+
+@retry_on_lock
+def _queue_reminders(due, today):
+    borrowings = Borrowing.objects.overdue(today).filter(
+        expected_return_date=due
+    )
+    with transaction.atomic():
+        found = _queue(borrowings)
+        ScanCheckpoint.objects.filter(name=OVERDUE_SCAN).update(position=due)
+    return found
+
+
+def _queue(borrowings):
+    found = 0
+    batch = []
+    for borrowing_id in borrowings.values_list("id", flat=True).iterator(
+        ENQUEUE_BATCH_SIZE
+    ):
+        batch.append(
+            Job(
+                kind=OVERDUE_REMINDER,
+                key=str(borrowing_id),
+                payload={"borrowing": borrowing_id},
+            )
+        )
+        if len(batch) == ENQUEUE_BATCH_SIZE:
+            found += _create(batch)
+            batch = []
+    return found + _create(batch)
+
+
+def _create(jobs):
+    # Reminders queued by an earlier, interrupted scan are skipped.
+    Job.objects.bulk_create(jobs, ignore_conflicts=True)
+    return len(jobs)
+
+
+@handler(OVERDUE_REMINDER)
+def send_overdue_reminder(job):
+    borrowing = (
+        Borrowing.objects.overdue()
+        .with_fines()
+        .select_related("book", "user")
+        .filter(pk=job.payload["borrowing"])
+        .first()
+    )
+    if borrowing is None:
+        # Returned or deleted since the scan queued it.
+        return
+    send_mail(
+        f"Overdue: {borrowing.book.title}",
+        (
+            f"{borrowing.book.title} was due back on "
+            f"{borrowing.expected_return_date}. It is "
+            f"{borrowing.days_overdue} day(s) overdue and the fine so far "
+            f"is {borrowing.fine:.2f}."
+        ),
+        None,
+        [borrowing.user.email],
+    )
@@ -0,0 +1,47 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from borrowing.archive import archivable, archive
+
+
+class Command(BaseCommand):
+    help = (
+        "Move borrowings returned more than --days days ago into the "
+        "archive table, one transaction per batch. Safe to interrupt and "
+        "run again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days", type=int, default=settings.BORROWING_ARCHIVE_DAYS
+        )
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only count the borrowings that would be archived.",
+        )
+
+    def handle(self, *args, **options):
+        if options["days"] < 0:
+            raise CommandError("--days must not be negative.")
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be positive.")
+
+        if options["dry_run"]:
+            count = archivable(options["days"]).count()
+            self.stdout.write(f"{count} borrowing(s) would be archived.")
+            return
+
+        start = time.perf_counter()
+        total = 0
+        for moved in archive(options["days"], options["batch_size"]):
+            total += moved
+            if options["verbosity"] > 1:
+                self.stdout.write(f"Archived {total} borrowing(s)...")
+        self.stdout.write(
+            f"Archived {total} borrowing(s) in "
+            f"{time.perf_counter() - start:.1f}s."
+        )
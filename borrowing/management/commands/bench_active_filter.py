@@ -0,0 +1,91 @@
+import random
+import time
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from book.models import Book
+from borrowing.models import Borrowing
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the in-Python is_active filter with the SQL one on a "
+        "synthetic borrowing table. All generated rows are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=100_000)
+        parser.add_argument("--active-ratio", type=float, default=0.05)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--batch-size", type=int, default=10_000)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user = self._populate(options)
+            queryset = Borrowing.objects.filter(user=user)
+
+            python_time, python_count = self._measure(
+                lambda: [b for b in queryset if b.is_active],
+                options["repeat"],
+            )
+            sql_time, sql_count = self._measure(
+                lambda: list(queryset.active()), options["repeat"]
+            )
+            transaction.set_rollback(True)
+
+        assert python_count == sql_count
+        self.stdout.write(
+            f"rows={options['rows']} active={sql_count}\n"
+            f"python filter: {python_time * 1000:.1f} ms\n"
+            f"sql filter:    {sql_time * 1000:.1f} ms\n"
+            f"speedup:       {python_time / sql_time:.1f}x"
+        )
+
+    def _populate(self, options):
+        rng = random.Random(options["seed"])
+        user = get_user_model().objects.create_user(
+            email="bench-active-filter@example.com"
+        )
+        book = Book.objects.create(
+            title="Benchmark",
+            author="Benchmark",
+            cover="SOFT",
+            inventory=1,
+            daily_fee=1,
+        )
+        today = date.today()
+        batch = []
+        for _ in range(options["rows"]):
+            borrow_date = today - timedelta(days=rng.randint(0, 3650))
+            returned = rng.random() >= options["active_ratio"]
+            batch.append(
+                Borrowing(
+                    user=user,
+                    book=book,
+                    borrow_date=borrow_date,
+                    expected_return_date=borrow_date + timedelta(days=14),
+                    actual_return_date=(
+                        min(borrow_date + timedelta(days=7), today)
+                        if returned
+                        else None
+                    ),
+                )
+            )
+            if len(batch) >= options["batch_size"]:
+                Borrowing.objects.bulk_create(batch)
+                batch = []
+        Borrowing.objects.bulk_create(batch)
+        return user
+
+    @staticmethod
+    def _measure(func, repeat):
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = func()
+            best = min(best, time.perf_counter() - start)
+        return best, len(result)
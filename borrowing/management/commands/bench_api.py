@@ -0,0 +1,347 @@
+import json
+import platform
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import django
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.urls import reverse
+from django.utils import timezone
+
+from book.models import Book
+from borrowing.models import Borrowing
+from library_service.benchmark import (
+    LiveClient,
+    LocalClient,
+    compare,
+    summarize,
+)
+
+MEMBER_EMAIL = "bench-api-member@example.com"
+STAFF_EMAIL = "bench-api-staff@example.com"
+PASSWORD = "bench-api-password"
+
+SCENARIOS = (
+    "books-list",
+    "books-detail",
+    "borrowings-list-active",
+    "borrowings-list-user",
+    "borrow",
+    "return",
+    "token-obtain",
+    "token-refresh",
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the main API endpoints and report latency percentiles, "
+        "throughput and SQL queries per request. Runs in-process on a "
+        "generated throwaway database, or against a running server with "
+        "--url (which must share this project's database)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--url",
+            help="Base URL of a running server, e.g. http://127.0.0.1:8000",
+        )
+        parser.add_argument(
+            "--scenario",
+            action="append",
+            choices=SCENARIOS,
+            help="Run only these scenarios; repeatable.",
+        )
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=1,
+            help=(
+                "Connections sending requests at once, each on its own "
+                "thread; requires --url."
+            ),
+        )
+        parser.add_argument("--warmup", type=int, default=20)
+        parser.add_argument(
+            "--history",
+            type=int,
+            default=200,
+            help="Past borrowings of the benchmark member.",
+        )
+        parser.add_argument("--users", type=int, default=1_000)
+        parser.add_argument("--books", type=int, default=1_000)
+        parser.add_argument("--borrowings", type=int, default=100_000)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Write the results as JSON.")
+        parser.add_argument(
+            "--baseline",
+            help="Fail when the results regress this earlier --output.",
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.2,
+            help="Allowed latency/throughput drift against the baseline.",
+        )
+
+    def handle(self, *args, **options):
+        if options["requests"] < 1:
+            raise CommandError("--requests must be positive.")
+        if options["warmup"] < 0:
+            raise CommandError("--warmup must not be negative.")
+        if options["concurrency"] < 1:
+            raise CommandError("--concurrency must be positive.")
+        if options["concurrency"] > 1 and not options["url"]:
+            raise CommandError("--concurrency needs a server to call, --url.")
+        baseline = None
+        if options["baseline"]:
+            with open(options["baseline"], encoding="utf-8") as file:
+                baseline = json.load(file)
+
+        if options["url"]:
+            results = self._benchmark(LiveClient(options["url"]), options)
+        else:
+            results = self._benchmark_in_process(options)
+
+        self._report(results)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as file:
+                json.dump(results, file, indent=2)
+                file.write("\n")
+        if baseline is not None:
+            regressions = compare(baseline, results, options["tolerance"])
+            if regressions:
+                raise CommandError(
+                    "Regressed against the baseline:\n  "
+                    + "\n  ".join(regressions)
+                )
+            self.stdout.write(self.style.SUCCESS("No regressions."))
+
+    def _benchmark_in_process(self, options):
+        old_name = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, serialize=False)
+        try:
+            call_command(
+                "generate_data",
+                users=options["users"],
+                books=options["books"],
+                borrowings=options["borrowings"],
+                seed=options["seed"],
+                stdout=self.stdout,
+            )
+            return self._benchmark(LocalClient(), options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def _benchmark(self, client, options):
+        rng = random.Random(options["seed"])
+        count = options["requests"] + options["warmup"]
+        member, staff, book = self._create_fixtures(options["history"], count)
+        context = {
+            "book": book.id,
+            "book_ids": list(
+                Book.objects.values_list("id", flat=True)[:1_000]
+            ),
+            "member": member.id,
+            "returnable": [],
+        }
+        try:
+            scenarios = {}
+            for name in options["scenario"] or SCENARIOS:
+                context["member_tokens"] = self._login(client, MEMBER_EMAIL)
+                context["staff_tokens"] = self._login(client, STAFF_EMAIL)
+                if name == "return":
+                    context["returnable"] = self._create_returnable(
+                        member, book, count
+                    )
+                self.stdout.write(f"Running {name}...")
+                scenarios[name] = self._run(
+                    client, name, context, rng, options
+                )
+        finally:
+            client.close()
+            book.delete()
+            member.delete()
+            staff.delete()
+
+        return {
+            "meta": {
+                "mode": "live" if options["url"] else "in-process",
+                "url": options["url"],
+                "created_at": timezone.now().isoformat(),
+                "requests": options["requests"],
+                "warmup": options["warmup"],
+                "concurrency": options["concurrency"],
+                "dataset": {
+                    "users": get_user_model().objects.count(),
+                    "books": Book.objects.count(),
+                    "borrowings": Borrowing.objects.count(),
+                },
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "database": connection.vendor,
+            },
+            "scenarios": scenarios,
+        }
+
+    @staticmethod
+    def _create_fixtures(history, count):
+        User = get_user_model()
+        User.objects.filter(email__in=(MEMBER_EMAIL, STAFF_EMAIL)).delete()
+        member = User.objects.create_user(MEMBER_EMAIL, PASSWORD)
+        staff = User.objects.create_user(STAFF_EMAIL, PASSWORD, is_staff=True)
+        book = Book.objects.create(
+            title=f"Benchmark {time.time_ns()}",
+            author="Benchmark",
+            cover="SOFT",
+            inventory=count,
+            daily_fee=1,
+        )
+        today = date.today()
+        Borrowing.objects.bulk_create(
+            Borrowing(
+                user=member,
+                book=book,
+                borrow_date=today - timedelta(days=n),
+                expected_return_date=today - timedelta(days=n - 14),
+                # Every tenth borrowing is still out.
+                actual_return_date=(
+                    None if n % 10 == 0 else today - timedelta(days=n - 7)
+                ),
+            )
+            for n in range(history)
+        )
+        return member, staff, book
+
+    @staticmethod
+    def _create_returnable(member, book, count):
+        today = date.today()
+        borrowings = Borrowing.objects.bulk_create(
+            Borrowing(
+                user=member,
+                book=book,
+                borrow_date=today,
+                expected_return_date=today + timedelta(days=14),
+            )
+            for _ in range(count)
+        )
+        return [borrowing.pk for borrowing in borrowings]
+
+    @staticmethod
+    def _login(client, email):
+        status, data, _, _ = client.request(
+            "POST",
+            reverse("users:token_obtain_pair"),
+            {"email": email, "password": PASSWORD},
+        )
+        if status != 200:
+            raise CommandError(f"Could not obtain a token for {email}.")
+        return data
+
+    @staticmethod
+    def _request(name, context, rng):
+        """Return `(method, path, data, token, expected_status)`."""
+        member = context["member_tokens"]["access"]
+        staff = context["staff_tokens"]["access"]
+        borrowings = reverse("borrowings:borrowing-list")
+        if name == "books-list":
+            return "GET", reverse("books:book-list"), None, None, 200
+        if name == "books-detail":
+            book_id = rng.choice(context["book_ids"])
+            path = reverse("books:book-detail", args=[book_id])
+            return "GET", path, None, None, 200
+        if name == "borrowings-list-active":
+            return "GET", f"{borrowings}?is_active=true", None, member, 200
+        if name == "borrowings-list-user":
+            path = f"{borrowings}?user_id={context['member']}&is_active=false"
+            return "GET", path, None, staff, 200
+        if name == "borrow":
+            data = {
+                "book": context["book"],
+                "borrow_date": date.today(),
+                "expected_return_date": date.today() + timedelta(days=14),
+            }
+            return "POST", borrowings, data, member, 201
+        if name == "return":
+            path = reverse(
+                "borrowings:borrowing-return-book",
+                args=[context["returnable"].pop()],
+            )
+            return "POST", path, None, member, 200
+        if name == "token-obtain":
+            data = {"email": MEMBER_EMAIL, "password": PASSWORD}
+            return "POST", reverse("users:token_obtain_pair"), data, None, 200
+        data = {"refresh": context["member_tokens"]["refresh"]}
+        return "POST", reverse("users:token_refresh"), data, None, 200
+
+    def _run(self, client, name, context, rng, options):
+        for _ in range(options["warmup"]):
+            method, path, data, token, _ = self._request(name, context, rng)
+            client.request(method, path, data, token)
+
+        concurrency = options["concurrency"]
+        shares = [
+            options["requests"] // concurrency
+            + (index < options["requests"] % concurrency)
+            for index in range(concurrency)
+        ]
+        start = time.perf_counter()
+        if concurrency == 1:
+            results = [self._send(client, name, context, rng, shares[0])]
+        else:
+
+            def send(count):
+                client = LiveClient(options["url"])
+                try:
+                    return self._send(client, name, context, rng, count)
+                finally:
+                    client.close()
+
+            with ThreadPoolExecutor(concurrency) as executor:
+                results = list(executor.map(send, shares))
+        duration = time.perf_counter() - start
+
+        latencies, queries, errors = [], [], 0
+        for result in results:
+            latencies += result[0]
+            queries += result[1]
+            errors += result[2]
+        return summarize(latencies, duration, errors, queries)
+
+    def _send(self, client, name, context, rng, count):
+        """Send `count` requests; return latencies, queries and errors."""
+        latencies = []
+        queries = []
+        errors = 0
+        for _ in range(count):
+            method, path, data, token, expected = self._request(
+                name, context, rng
+            )
+            status, _, elapsed, query_count = client.request(
+                method, path, data, token
+            )
+            latencies.append(elapsed)
+            if query_count is not None:
+                queries.append(query_count)
+            errors += status != expected
+        return latencies, queries, errors
+
+    def _report(self, results):
+        self.stdout.write(
+            f"\n{'scenario':<24}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+            f"{'req/s':>9}{'queries':>9}{'errors':>8}"
+        )
+        for name, result in results["scenarios"].items():
+            queries = result["queries_per_request"]
+            self.stdout.write(
+                f"{name:<24}{result['p50_ms']:>9.2f}{result['p95_ms']:>9.2f}"
+                f"{result['p99_ms']:>9.2f}{result['rps']:>9.1f}"
+                f"{'-' if queries is None else queries:>9}"
+                f"{result['errors']:>8}"
+            )
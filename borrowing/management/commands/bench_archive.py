@@ -0,0 +1,156 @@
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from book.models import Book
+from borrowing.archive import archive
+from borrowing.models import Borrowing
+
+QUERIES = ("user active list", "admin active list", "active count")
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure active-loan queries while the returned history grows, "
+        "with the history left in the borrowing table and with it "
+        "archived. All generated rows are rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            default="10000,100000,300000",
+            help="Comma-separated history sizes to measure at.",
+        )
+        parser.add_argument("--active", type=int, default=1000)
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--batch-size", type=int, default=10_000)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        try:
+            sizes = sorted(int(size) for size in options["sizes"].split(","))
+        except ValueError:
+            raise CommandError("--sizes must be comma-separated integers.")
+        if options["users"] < 1 or options["active"] < 1:
+            raise CommandError("--users and --active must be positive.")
+
+        results = {
+            mode: self._run(options, sizes, archived=mode == "archived")
+            for mode in ("hot", "archived")
+        }
+
+        self.stdout.write(
+            f"{'history':>9}  {'query':<18}{'hot ms':>9}{'archived ms':>13}"
+        )
+        for size in sizes:
+            for query in QUERIES:
+                self.stdout.write(
+                    f"{size:>9}  {query:<18}"
+                    f"{results['hot'][size][query]:>9.2f}"
+                    f"{results['archived'][size][query]:>13.2f}"
+                )
+
+    def _run(self, options, sizes, archived):
+        rng = random.Random(options["seed"])
+        results = {}
+        with transaction.atomic():
+            users, book = self._populate_active(options, rng)
+            admin = get_user_model().objects.create_user(
+                "bench-archive-admin@example.com", is_staff=True
+            )
+            history = 0
+            for size in sizes:
+                self._populate_history(
+                    options, rng, users, book, size - history
+                )
+                history = size
+                if archived:
+                    for _ in archive(
+                        settings.BORROWING_ARCHIVE_DAYS, options["batch_size"]
+                    ):
+                        pass
+                results[size] = self._measure(options, users[0], admin)
+            transaction.set_rollback(True)
+        return results
+
+    def _populate_active(self, options, rng):
+        User = get_user_model()
+        users = User.objects.bulk_create(
+            User(email=f"bench-archive-{index}@example.com")
+            for index in range(options["users"])
+        )
+        book = Book.objects.create(
+            title=f"Benchmark {time.time_ns()}",
+            author="Benchmark",
+            cover="SOFT",
+            inventory=1,
+            daily_fee=1,
+        )
+        today = date.today()
+        Borrowing.objects.bulk_create(
+            (
+                Borrowing(
+                    user=rng.choice(users),
+                    book=book,
+                    borrow_date=today - timedelta(days=rng.randint(0, 13)),
+                    expected_return_date=today + timedelta(days=14),
+                )
+                for _ in range(options["active"])
+            ),
+            batch_size=options["batch_size"],
+        )
+        return users, book
+
+    def _populate_history(self, options, rng, users, book, count):
+        """Add `count` loans returned before the archive cutoff."""
+        oldest = settings.BORROWING_ARCHIVE_DAYS + 3650
+        today = date.today()
+        batch = []
+        for _ in range(count):
+            borrow_date = today - timedelta(
+                days=rng.randint(settings.BORROWING_ARCHIVE_DAYS + 8, oldest)
+            )
+            batch.append(
+                Borrowing(
+                    user=rng.choice(users),
+                    book=book,
+                    borrow_date=borrow_date,
+                    expected_return_date=borrow_date + timedelta(days=14),
+                    actual_return_date=borrow_date + timedelta(days=7),
+                )
+            )
+            if len(batch) >= options["batch_size"]:
+                Borrowing.objects.bulk_create(batch)
+                batch = []
+        Borrowing.objects.bulk_create(batch)
+
+    def _measure(self, options, user, admin):
+        url = f"{reverse('borrowings:borrowing-list')}?is_active=true"
+        clients = {}
+        for name, who in (("user", user), ("admin", admin)):
+            clients[name] = APIClient(HTTP_HOST="localhost")
+            clients[name].force_authenticate(who)
+        queries = {
+            "user active list": lambda: clients["user"].get(url),
+            "admin active list": lambda: clients["admin"].get(url),
+            "active count": lambda: Borrowing.objects.active().count(),
+        }
+        timings = {}
+        for name, query in queries.items():
+            latencies = []
+            for _ in range(options["repeat"]):
+                start = time.perf_counter()
+                query()
+                latencies.append(time.perf_counter() - start)
+            timings[name] = statistics.median(latencies) * 1000
+        return timings
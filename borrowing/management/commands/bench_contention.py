@@ -0,0 +1,207 @@
+import json
+import multiprocessing
+import random
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.urls import reverse
+from prometheus_client import REGISTRY
+from rest_framework.test import APIClient
+
+from book.models import Book
+from library_service.benchmark import summarize
+
+EMAIL = "bench-contention@example.com"
+OPERATIONS = ("read", "borrow", "return")
+
+
+def _work(index, user_id, book_id, options, deadline):
+    """Run one process's share of the mix until `deadline` (epoch)."""
+    rng = random.Random(options["seed"] + index)
+    client = APIClient(HTTP_HOST="localhost", raise_request_exception=False)
+    client.force_authenticate(get_user_model().objects.get(pk=user_id))
+    list_url = reverse("borrowings:borrowing-list")
+    payload = {
+        "book": book_id,
+        "borrow_date": date.today(),
+        "expected_return_date": date.today() + timedelta(days=14),
+    }
+    reads = (
+        f"{list_url}?is_active=true",
+        reverse("books:book-list"),
+        reverse("books:book-detail", args=[book_id]),
+    )
+    latencies = {operation: [] for operation in OPERATIONS}
+    statuses = {operation: Counter() for operation in OPERATIONS}
+
+    def send(operation, method, path, data=None):
+        start = time.perf_counter()
+        response = getattr(client, method)(path, data, format="json")
+        latencies[operation].append(time.perf_counter() - start)
+        statuses[operation][response.status_code] += 1
+        return response
+
+    try:
+        while time.time() < deadline:
+            if rng.random() >= options["write_ratio"]:
+                send("read", "get", rng.choice(reads))
+                continue
+            response = send("borrow", "post", list_url, payload)
+            if response.status_code == 201:
+                send(
+                    "return",
+                    "post",
+                    f"{list_url}{response.json()['id']}/return/",
+                )
+    finally:
+        connection.close()
+    retries = REGISTRY.get_sample_value("library_db_lock_retries_total")
+    return latencies, statuses, retries or 0
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a mix of reads, borrows and returns from several processes "
+        "against this project's SQLite database and report the sustained "
+        "throughput. --stock compares with Django's default SQLite setup."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=4)
+        parser.add_argument(
+            "--duration", type=float, default=10, help="Seconds to run."
+        )
+        parser.add_argument(
+            "--write-ratio",
+            type=float,
+            default=0.2,
+            help="Share of iterations that borrow and return a book.",
+        )
+        parser.add_argument(
+            "--stock",
+            action="store_true",
+            help=(
+                "Use a rollback journal, DEFERRED transactions and no "
+                "pragmas, as Django does by default."
+            ),
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", help="Write the results as JSON.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("This benchmark targets SQLite.")
+        if options["processes"] < 1:
+            raise CommandError("--processes must be positive.")
+        if not 0 <= options["write_ratio"] <= 1:
+            raise CommandError("--write-ratio must be between 0 and 1.")
+
+        tuned_options = connection.settings_dict["OPTIONS"]
+        if options["stock"]:
+            self._reconnect({})
+            with connection.cursor() as cursor:
+                cursor.execute("PRAGMA journal_mode = DELETE")
+        try:
+            results = self._benchmark(options)
+        finally:
+            # The tuned init_command switches the journal back to WAL.
+            self._reconnect(tuned_options)
+            connection.ensure_connection()
+
+        self._report(results)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as file:
+                json.dump(results, file, indent=2)
+                file.write("\n")
+
+    @staticmethod
+    def _reconnect(sqlite_options):
+        connection.close()
+        connection.settings_dict["OPTIONS"] = sqlite_options
+
+    def _benchmark(self, options):
+        User = get_user_model()
+        User.objects.filter(email=EMAIL).delete()
+        user = User.objects.create_user(EMAIL)
+        book = Book.objects.create(
+            title=f"Benchmark {time.time_ns()}",
+            author="Benchmark",
+            cover="SOFT",
+            inventory=1_000_000,
+            daily_fee=1,
+        )
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode")
+            journal_mode = cursor.fetchone()[0]
+        # Forked workers must open their own connections.
+        connections.close_all()
+
+        processes = options["processes"]
+        deadline = time.time() + options["duration"]
+        try:
+            with ProcessPoolExecutor(
+                processes, mp_context=multiprocessing.get_context("fork")
+            ) as executor:
+                futures = [
+                    executor.submit(
+                        _work, index, user.id, book.id, options, deadline
+                    )
+                    for index in range(processes)
+                ]
+                outcomes = [future.result() for future in futures]
+        finally:
+            book.delete()
+            user.delete()
+
+        scenarios = {}
+        for operation in OPERATIONS:
+            latencies = []
+            statuses = Counter()
+            for outcome in outcomes:
+                latencies += outcome[0][operation]
+                statuses.update(outcome[1][operation])
+            expected = 200 if operation != "borrow" else 201
+            errors = sum(statuses.values()) - statuses[expected]
+            scenarios[operation] = summarize(
+                latencies, options["duration"], errors, queries=[]
+            ) | {"statuses": {str(k): v for k, v in statuses.items()}}
+        return {
+            "meta": {
+                "processes": processes,
+                "duration": options["duration"],
+                "write_ratio": options["write_ratio"],
+                "journal_mode": journal_mode,
+                "stock": options["stock"],
+            },
+            "scenarios": scenarios,
+            "lock_retries": sum(outcome[2] for outcome in outcomes),
+        }
+
+    def _report(self, results):
+        meta = results["meta"]
+        self.stdout.write(
+            f"\n{meta['processes']} processes, journal_mode="
+            f"{meta['journal_mode']}, "
+            f"{'stock' if meta['stock'] else 'tuned'} settings"
+        )
+        self.stdout.write(
+            f"{'operation':<12}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+            f"{'req/s':>9}{'errors':>8}"
+        )
+        total = 0
+        for name, result in results["scenarios"].items():
+            total += result["rps"] or 0
+            self.stdout.write(
+                f"{name:<12}{result['p50_ms']:>9.2f}{result['p95_ms']:>9.2f}"
+                f"{result['p99_ms']:>9.2f}{result['rps']:>9.1f}"
+                f"{result['errors']:>8}"
+            )
+        self.stdout.write(
+            f"total: {total:.1f} req/s, "
+            f"{results['lock_retries']:.0f} lock retries"
+        )
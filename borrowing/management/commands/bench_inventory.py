@@ -0,0 +1,140 @@
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta
+from queue import Empty, Queue
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from book.models import Book
+from borrowing.models import Borrowing
+
+
+class Command(BaseCommand):
+    help = (
+        "Fire concurrent borrows and returns at one book through the API "
+        "and check that the final inventory is exact."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--borrows", type=int, default=2000)
+        parser.add_argument(
+            "--inventory",
+            type=int,
+            default=1000,
+            help="Starting inventory; borrows beyond it must be rejected.",
+        )
+        parser.add_argument("--threads", type=int, default=16)
+
+    def handle(self, *args, **options):
+        user = get_user_model().objects.create_user(
+            email="bench-inventory@example.com"
+        )
+        book = Book.objects.create(
+            title="Benchmark",
+            author="Benchmark",
+            cover="SOFT",
+            inventory=options["inventory"],
+            daily_fee=1,
+        )
+        try:
+            self._run(user, book, options)
+        finally:
+            book.delete()
+            user.delete()
+
+    def _run(self, user, book, options):
+        list_url = reverse("borrowings:borrowing-list")
+        payload = {
+            "book": book.id,
+            "borrow_date": date.today(),
+            "expected_return_date": date.today() + timedelta(days=7),
+        }
+
+        borrow_results, borrow_time = self._fire(
+            user,
+            options["threads"],
+            [(list_url, payload)] * options["borrows"],
+        )
+        book.refresh_from_db()
+        borrowed = borrow_results[201]
+        expected_borrowed = min(options["borrows"], options["inventory"])
+        self._check(
+            borrowed == expected_borrowed
+            and book.inventory == options["inventory"] - borrowed,
+            f"borrowed {borrowed} (expected {expected_borrowed}), "
+            f"inventory {book.inventory}",
+        )
+
+        borrowing_ids = Borrowing.objects.filter(book=book).values_list(
+            "id", flat=True
+        )
+        # Every borrowing is returned twice to race duplicate returns.
+        return_results, return_time = self._fire(
+            user,
+            options["threads"],
+            [
+                (f"{list_url}{borrowing_id}/return/", None)
+                for borrowing_id in borrowing_ids
+                for _ in range(2)
+            ],
+        )
+        book.refresh_from_db()
+        self._check(
+            return_results[200] == borrowed
+            and book.inventory == options["inventory"],
+            f"returned {return_results[200]} of {borrowed}, "
+            f"inventory {book.inventory}",
+        )
+
+        self.stdout.write(
+            f"borrow: {sum(borrow_results.values())} requests "
+            f"{dict(borrow_results)} in {borrow_time:.2f}s "
+            f"({sum(borrow_results.values()) / borrow_time:.0f} req/s)\n"
+            f"return: {sum(return_results.values())} requests "
+            f"{dict(return_results)} in {return_time:.2f}s "
+            f"({sum(return_results.values()) / return_time:.0f} req/s)"
+        )
+        self.stdout.write(self.style.SUCCESS("Final inventory is exact."))
+
+    def _check(self, condition, message):
+        if not condition:
+            raise CommandError(f"Inventory mismatch: {message}")
+
+    @staticmethod
+    def _fire(user, thread_count, requests):
+        work = Queue()
+        for request in requests:
+            work.put(request)
+        results = Counter()
+        lock = threading.Lock()
+
+        def worker():
+            client = APIClient(HTTP_HOST="localhost")
+            client.force_authenticate(user)
+            local = Counter()
+            try:
+                while True:
+                    try:
+                        url, data = work.get_nowait()
+                    except Empty:
+                        break
+                    local[client.post(url, data).status_code] += 1
+            finally:
+                connection.close()
+                with lock:
+                    results.update(local)
+
+        threads = [
+            threading.Thread(target=worker) for _ in range(thread_count)
+        ]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, time.perf_counter() - start
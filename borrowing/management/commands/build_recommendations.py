@@ -0,0 +1,102 @@
+import os
+import resource
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from borrowing import recommendations
+from borrowing.recommendations import LoanMatrix
+
+
+class Command(BaseCommand):
+    help = (
+        "Store the books most often borrowed together with every book. "
+        "Without --full, only borrowings newer than the snapshot are read "
+        "and only the books whose neighbours they change are rescored."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Rebuild from every borrowing, ignoring the snapshot.",
+        )
+        parser.add_argument(
+            "--snapshot",
+            default=settings.RECOMMENDATIONS_SNAPSHOT,
+            help="File the loan matrix is kept in between runs.",
+        )
+        parser.add_argument(
+            "--top-k", type=int, default=settings.RECOMMENDATIONS_TOP_K
+        )
+        parser.add_argument(
+            "--min-support",
+            type=int,
+            default=1,
+            help="Fewest readers a pair of books needs in common.",
+        )
+        parser.add_argument(
+            "--block-size",
+            type=int,
+            default=2000,
+            help="Books scored at once; bounds the memory used.",
+        )
+        parser.add_argument("--chunk-size", type=int, default=100_000)
+
+    def handle(self, *args, **options):
+        for option in ("top_k", "min_support", "block_size", "chunk_size"):
+            if options[option] < 1:
+                name = option.replace("_", "-")
+                raise CommandError(f"--{name} must be positive.")
+        snapshot = options["snapshot"]
+        full = options["full"] or not os.path.exists(snapshot)
+        timings = {}
+
+        start = time.perf_counter()
+        loans = None if full else LoanMatrix.load(snapshot)
+        users, books, last_id = recommendations.read_loans(
+            0 if full else loans.last_id, options["chunk_size"]
+        )
+        timings["read"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        if full:
+            loans = LoanMatrix.from_loans(users, books, last_id)
+            touched = loans.book_ids
+        else:
+            loans, touched = loans.extend(users, books, last_id)
+        timings["matrix"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        written = recommendations.store_relations(
+            loans,
+            touched,
+            options["top_k"],
+            options["min_support"],
+            options["block_size"],
+        )
+        if full:
+            recommendations.remove_relations(loans.book_ids)
+        loans.save(snapshot)
+        timings["score and store"] = time.perf_counter() - start
+
+        self.stdout.write(
+            f"{'Rebuilt' if full else 'Refreshed'} {len(touched)} book(s) "
+            f"from {len(users)} borrowing(s): {written} relation(s), "
+            f"{loans.matrix.nnz} distinct loans by {len(loans.user_ids)} "
+            f"user(s)."
+        )
+        phases = ", ".join(
+            f"{phase} {took:.2f}s" for phase, took in timings.items()
+        )
+        self.stdout.write(
+            f"{phases}, peak memory {self._peak_memory_mb():.0f} MB."
+        )
+
+    @staticmethod
+    def _peak_memory_mb():
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS bytes.
+        return peak / 1024 ** (2 if sys.platform == "darwin" else 1)
@@ -0,0 +1,374 @@
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from book.models import Book
+from book.signals import notify_catalog_changed
+from borrowing.counters import repair_book_counters, repair_user_counters
+from borrowing.models import Borrowing
+
+TITLE_WORDS = (
+    "Silent",
+    "Winter",
+    "Garden",
+    "River",
+    "Shadow",
+    "Empire",
+    "Stone",
+    "Glass",
+    "Last",
+    "Hidden",
+    "Northern",
+    "Iron",
+    "Paper",
+    "Lost",
+    "Golden",
+    "Night",
+    "House",
+    "Sea",
+    "Fire",
+    "Memory",
+)
+AUTHOR_NAMES = (
+    "Ada",
+    "Boris",
+    "Clara",
+    "Dmytro",
+    "Elena",
+    "Farid",
+    "Greta",
+    "Hugo",
+    "Iris",
+    "Jonas",
+    "Kateryna",
+    "Liam",
+    "Mira",
+    "Nils",
+    "Olga",
+    "Pablo",
+)
+AUTHOR_SURNAMES = (
+    "Adams",
+    "Bondar",
+    "Costa",
+    "Dahl",
+    "Evans",
+    "Franke",
+    "Garcia",
+    "Horvat",
+    "Ivanova",
+    "Jensen",
+    "Kovalenko",
+    "Lind",
+    "Moreau",
+    "Novak",
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate synthetic users, books and borrowings for scale testing. "
+        "Book popularity is Zipfian and the output is reproducible for a "
+        "given --seed and --end-date."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=10_000)
+        parser.add_argument("--books", type=int, default=5_000)
+        parser.add_argument("--borrowings", type=int, default=1_000_000)
+        parser.add_argument(
+            "--years",
+            type=int,
+            default=5,
+            help="Span of borrow dates, ending at --end-date.",
+        )
+        parser.add_argument(
+            "--end-date",
+            type=date.fromisoformat,
+            default=date.today(),
+            help="The generated 'today'. Defaults to the current date.",
+        )
+        parser.add_argument(
+            "--active-ratio",
+            type=float,
+            default=0.05,
+            help="Share of borrowings not returned yet.",
+        )
+        parser.add_argument(
+            "--overdue-ratio",
+            type=float,
+            default=0.3,
+            help="Share of active borrowings past their expected return.",
+        )
+        parser.add_argument(
+            "--zipf",
+            type=float,
+            default=1.1,
+            help="Exponent of the book popularity distribution.",
+        )
+        parser.add_argument("--loan-days", type=int, default=14)
+        parser.add_argument("--email-prefix", default="user")
+        parser.add_argument("--password", default="password")
+        parser.add_argument("--batch-size", type=int, default=50_000)
+        parser.add_argument(
+            "--drop-indexes",
+            action="store_true",
+            help=(
+                "Drop the borrowing indexes during the insert and rebuild "
+                "them once at the end. A later run recreates them if this "
+                "one is killed before then."
+            ),
+        )
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        if min(options["users"], options["books"], options["borrowings"]) < 0:
+            raise CommandError("Counts must not be negative.")
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be positive.")
+        if options["borrowings"] and not (
+            options["users"] and options["books"]
+        ):
+            raise CommandError("Borrowings need at least one user and book.")
+
+        # Neither pragmas nor SQLite schema changes work inside a
+        # transaction, e.g. when called from a test.
+        fast_path = not connection.in_atomic_block
+        if fast_path:
+            self._restore_indexes()
+
+        rng = random.Random(options["seed"])
+        start = time.perf_counter()
+        try:
+            user_ids = self._create_users(options)
+            book_ids = self._create_books(rng, options)
+        except IntegrityError as error:
+            raise CommandError(
+                f"{error}. Use another --email-prefix or --seed, or start "
+                "from an empty database."
+            )
+        self._log(f"{len(user_ids)} users, {len(book_ids)} books", start)
+
+        if options["borrowings"]:
+            if fast_path:
+                self._tune_connection()
+            indexes = (
+                Borrowing._meta.indexes
+                if fast_path and options["drop_indexes"]
+                else []
+            )
+            self._alter_indexes("remove_index", indexes)
+            try:
+                self._create_borrowings(rng, user_ids, book_ids, options)
+            finally:
+                index_start = time.perf_counter()
+                self._alter_indexes("add_index", indexes)
+                if indexes:
+                    self._log("Rebuilt borrowing indexes", index_start)
+            counters_start = time.perf_counter()
+            repair_book_counters()
+            repair_user_counters()
+            # The generated books were created with every copy on the
+            # shelf; take their loans off it.
+            Book.objects.filter(
+                pk__range=(min(book_ids), max(book_ids))
+            ).update(inventory=F("inventory") - F("active_loans"))
+            self._log("Counted loans per book and user", counters_start)
+        if book_ids:
+            notify_catalog_changed(Book)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Generated {len(user_ids)} users, {len(book_ids)} books and "
+                f"{options['borrowings']} borrowings in "
+                f"{time.perf_counter() - start:.1f}s."
+            )
+        )
+
+    @staticmethod
+    def _tune_connection():
+        """
+        Skip fsyncs and enlarge the page cache for this connection only.
+
+        Generated data is disposable, so losing it to a power cut is an
+        acceptable price for the bulk insert speed.
+        """
+        if connection.vendor != "sqlite":
+            return
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA synchronous = OFF")
+            cursor.execute("PRAGMA cache_size = -262144")
+
+    def _restore_indexes(self):
+        """Recreate borrowing indexes left dropped by a killed run."""
+        with connection.cursor() as cursor:
+            existing = connection.introspection.get_constraints(
+                cursor, Borrowing._meta.db_table
+            )
+        missing = [
+            index
+            for index in Borrowing._meta.indexes
+            if index.name not in existing
+        ]
+        if missing:
+            start = time.perf_counter()
+            self._alter_indexes("add_index", missing)
+            self._log(f"Recreated {len(missing)} missing index(es)", start)
+
+    @staticmethod
+    def _alter_indexes(operation, indexes):
+        if not indexes:
+            return
+        with connection.schema_editor() as schema_editor:
+            for index in indexes:
+                getattr(schema_editor, operation)(Borrowing, index)
+
+    def _create_users(self, options):
+        # Hashing is deliberately slow, so every user shares one hash.
+        password = make_password(options["password"])
+        now = timezone.now()
+        User = get_user_model()
+        users = (
+            User(
+                email=f"{options['email_prefix']}{n}@example.com",
+                password=password,
+                date_joined=now,
+            )
+            for n in range(options["users"])
+        )
+        return self._bulk_create(User, users, options["batch_size"])
+
+    def _create_books(self, rng, options):
+        def book(n):
+            title = " ".join(rng.sample(TITLE_WORDS, 2))
+            return Book(
+                title=f"{title} {n}",
+                author=(
+                    f"{rng.choice(AUTHOR_NAMES)} "
+                    f"{rng.choice(AUTHOR_SURNAMES)}"
+                ),
+                cover=rng.choice(("HARD", "SOFT")),
+                inventory=rng.randint(1, 20),
+                daily_fee=Decimal(rng.randint(10, 300)) / 100,
+            )
+
+        books = (book(n) for n in range(options["books"]))
+        return self._bulk_create(Book, books, options["batch_size"])
+
+    @staticmethod
+    def _bulk_create(model, objects, batch_size):
+        ids = []
+        batch = []
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) >= batch_size:
+                with transaction.atomic():
+                    model.objects.bulk_create(batch)
+                ids.extend(obj.pk for obj in batch)
+                batch = []
+        with transaction.atomic():
+            model.objects.bulk_create(batch)
+        ids.extend(obj.pk for obj in batch)
+        return ids
+
+    def _create_borrowings(self, rng, user_ids, book_ids, options):
+        """
+        Insert borrowings with executemany, bypassing model instances.
+
+        Popularity follows a Zipf law over a shuffled copy of the books, so
+        the most borrowed titles are not simply the oldest rows. A book has
+        at most as many active loans as copies; once they are all out,
+        further loans of it are generated as returned.
+        """
+        total = options["borrowings"]
+        on_shelf = dict(
+            Book.objects.filter(
+                pk__range=(min(book_ids), max(book_ids))
+            ).values_list("id", "inventory")
+        )
+        books = book_ids[:]
+        rng.shuffle(books)
+        exponent = options["zipf"]
+        cum_weights = list(
+            accumulate(1 / rank**exponent for rank in range(1, len(books) + 1))
+        )
+
+        today = options["end_date"]
+        span = max(options["years"] * 365, 1)
+        loan_days = options["loan_days"]
+        active_ratio = options["active_ratio"]
+        overdue_ratio = options["overdue_ratio"]
+        max_overdue = 60
+        # Every date lies within a known window, so adapt each day once.
+        # `days[loan_days + n]` is the date n days before `today`.
+        adapt = connection.ops.adapt_datefield_value
+        days = [
+            adapt(today - timedelta(days=offset))
+            for offset in range(
+                -loan_days, max(span, loan_days + max_overdue) + 1
+            )
+        ]
+
+        fields = [
+            Borrowing._meta.get_field(name)
+            for name in (
+                "borrow_date",
+                "expected_return_date",
+                "actual_return_date",
+                "book",
+                "user",
+            )
+        ]
+        sql = "INSERT INTO {} ({}) VALUES ({})".format(
+            connection.ops.quote_name(Borrowing._meta.db_table),
+            ", ".join(connection.ops.quote_name(f.column) for f in fields),
+            ", ".join(["%s"] * len(fields)),
+        )
+
+        start = time.perf_counter()
+        created = 0
+        while created < total:
+            size = min(options["batch_size"], total - created)
+            rows = []
+            for book, user in zip(
+                rng.choices(books, cum_weights=cum_weights, k=size),
+                rng.choices(user_ids, k=size),
+            ):
+                if rng.random() < active_ratio and on_shelf[book]:
+                    on_shelf[book] -= 1
+                    if rng.random() < overdue_ratio:
+                        borrowed = loan_days + rng.randint(1, max_overdue)
+                    else:
+                        borrowed = rng.randint(0, loan_days)
+                    returned = None
+                else:
+                    borrowed = rng.randint(1, span)
+                    held = rng.randint(1, loan_days + 7)
+                    returned = days[loan_days + max(borrowed - held, 0)]
+                rows.append(
+                    (
+                        days[loan_days + borrowed],
+                        days[borrowed],
+                        returned,
+                        book,
+                        user,
+                    )
+                )
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.executemany(sql, rows)
+            created += size
+            self._log(f"{created} borrowings", start, created, ending="\r")
+        self.stdout.write("")
+
+    def _log(self, message, start, rows=None, ending="\n"):
+        elapsed = max(time.perf_counter() - start, 1e-9)
+        rate = f", {rows / elapsed:.0f} rows/s" if rows else ""
+        self.stdout.write(f"{message} in {elapsed:.1f}s{rate}", ending=ending)
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from borrowing.counters import repair_book_counters, repair_user_counters
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the per-book and per-user loan counters from the "
+        "borrowing and archive tables, e.g. after loading data in bulk."
+    )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        books = repair_book_counters()
+        users = repair_user_counters()
+        self.stdout.write(
+            f"Recounted loans of {books} book(s) and {users} user(s) in "
+            f"{time.perf_counter() - start:.1f}s."
+        )
@@ -0,0 +1,110 @@
+import logging
+import signal
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from borrowing import jobs
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Run queued background jobs on a thread pool and queue reminders "
+        "for newly overdue borrowings every --scan-interval seconds. "
+        "SIGINT or SIGTERM stops claiming jobs and waits for the running "
+        "ones. Without --once, a failed scan or claim is logged and retried."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=4)
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1,
+            help="Seconds to wait when no job is due.",
+        )
+        parser.add_argument(
+            "--scan-interval",
+            type=float,
+            default=3600,
+            help="Seconds between scans for newly overdue borrowings.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Scan once, run every due job and exit.",
+        )
+
+    def handle(self, *args, **options):
+        if options["threads"] < 1:
+            raise CommandError("--threads must be positive.")
+        self.stopping = threading.Event()
+        previous = {
+            signum: signal.signal(signum, self._stop)
+            for signum in (signal.SIGINT, signal.SIGTERM)
+        }
+        try:
+            self._work(options)
+        finally:
+            for signum, handler in previous.items():
+                signal.signal(signum, handler)
+
+    def _work(self, options):
+        threads = options["threads"]
+        next_scan = 0
+        running = set()
+        with ThreadPoolExecutor(threads) as executor:
+            while not self.stopping.is_set():
+                running = {future for future in running if not future.done()}
+                free = threads - len(running)
+                try:
+                    if time.monotonic() >= next_scan:
+                        found = jobs.scan_overdue()
+                        self.stdout.write(
+                            f"Found {found} newly overdue loan(s)."
+                        )
+                        next_scan = time.monotonic() + options["scan_interval"]
+                    claimed = jobs.claim(free) if free else []
+                except Exception:
+                    if options["once"]:
+                        raise
+                    # E.g. a lock outlasting retry_on_lock: poll again.
+                    logger.exception("Polling for jobs failed.")
+                    close_old_connections()
+                    self.stopping.wait(options["poll_interval"])
+                    continue
+                for job in claimed:
+                    running.add(executor.submit(self._run, job))
+                if claimed:
+                    continue
+                if options["once"] and not running:
+                    break
+                if running:
+                    wait(
+                        running,
+                        timeout=options["poll_interval"],
+                        return_when=FIRST_COMPLETED,
+                    )
+                else:
+                    self.stopping.wait(options["poll_interval"])
+            # Leaving the block waits for the running jobs.
+
+    def _stop(self, signum, frame):
+        self.stdout.write("Stopping once the running jobs finish.")
+        self.stopping.set()
+
+    @staticmethod
+    def _run(job):
+        close_old_connections()
+        try:
+            jobs.run(job)
+        except Exception:
+            # The job stays RUNNING and is retried once its lease expires.
+            logger.exception("Job %s could not be recorded.", job.pk)
+        finally:
+            close_old_connections()
@@ -0,0 +1,54 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the primary SQLite database onto every file in "
+        "DATABASE_REPLICA_NAMES with SQLite's online backup, once or every "
+        "--interval seconds to emulate replication lag."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=float,
+            help="Keep copying, waiting this many seconds between copies.",
+        )
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError("No replicas: set DATABASE_REPLICA_NAMES.")
+        for alias in ("default", *settings.DATABASE_REPLICAS):
+            if connections[alias].vendor != "sqlite":
+                raise CommandError(f"{alias} is not an SQLite database.")
+
+        while True:
+            start = time.perf_counter()
+            self._copy()
+            self.stdout.write(
+                f"Copied the primary to {len(settings.DATABASE_REPLICAS)} "
+                f"replica(s) in {time.perf_counter() - start:.2f}s."
+            )
+            if options["interval"] is None:
+                return
+            time.sleep(options["interval"])
+
+    @staticmethod
+    def _copy():
+        primary = sqlite3.connect(connections["default"].settings_dict["NAME"])
+        try:
+            for alias in settings.DATABASE_REPLICAS:
+                replica = sqlite3.connect(
+                    connections[alias].settings_dict["NAME"]
+                )
+                try:
+                    primary.backup(replica)
+                finally:
+                    replica.close()
+        finally:
+            primary.close()
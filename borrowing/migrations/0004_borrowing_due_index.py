@@ -0,0 +1,23 @@
+# Generated by Django 5.1.4 on 2026-10-18 04:53
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("book", "0004_book_unique_title_author"),
+        ("borrowing", "0003_borrowing_keyset_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="borrowing",
+            index=models.Index(
+                fields=["actual_return_date", "expected_return_date"],
+                name="borrowing_b_actual__683a1d_idx",
+            ),
+        ),
+    ]
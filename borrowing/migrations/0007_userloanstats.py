@@ -0,0 +1,92 @@
+# Generated by Django 5.1.4 on 2026-10-18 05:12
+
+from collections import Counter
+from datetime import date
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_loans(apps, schema_editor):
+    """Fill the loan counters for the borrowings made so far."""
+    Book = apps.get_model("book", "Book")
+    Borrowing = apps.get_model("borrowing", "Borrowing")
+    ArchivedBorrowing = apps.get_model("borrowing", "ArchivedBorrowing")
+    UserLoanStats = apps.get_model("borrowing", "UserLoanStats")
+    active = Q(actual_return_date__isnull=True) | Q(
+        actual_return_date__gt=date.today()
+    )
+
+    def per_book(queryset):
+        counts = (
+            queryset.filter(book=OuterRef("pk"))
+            .order_by()
+            .values("book")
+            .annotate(count=Count("*"))
+            .values("count")
+        )
+        return Coalesce(Subquery(counts), Value(0))
+
+    def per_user(queryset):
+        return Counter(
+            dict(
+                queryset.order_by()
+                .values("user_id")
+                .annotate(count=Count("*"))
+                .values_list("user_id", "count")
+            )
+        )
+
+    Book.objects.update(
+        active_loans=per_book(Borrowing.objects.filter(active)),
+        borrow_count=per_book(Borrowing.objects.all())
+        + per_book(ArchivedBorrowing.objects.all()),
+    )
+    active_loans = per_user(Borrowing.objects.filter(active))
+    total_loans = per_user(Borrowing.objects.all()) + per_user(
+        ArchivedBorrowing.objects.all()
+    )
+    UserLoanStats.objects.bulk_create(
+        (
+            UserLoanStats(
+                user_id=user_id,
+                active_loans=active_loans[user_id],
+                total_loans=count,
+            )
+            for user_id, count in total_loans.items()
+        ),
+        batch_size=5000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("book", "0005_book_loan_counters"),
+        ("borrowing", "0006_archivedborrowing"),
+        ("user", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UserLoanStats",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="loan_stats",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                ("active_loans", models.PositiveIntegerField(default=0)),
+                ("total_loans", models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(count_loans, migrations.RunPython.noop),
+    ]
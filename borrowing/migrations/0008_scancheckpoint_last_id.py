@@ -0,0 +1,31 @@
+# Generated by Django 5.1.4 on 2026-10-18 05:53
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def start_from_newest_borrowing(apps, schema_editor):
+    # Existing scans already covered every borrowing up to now.
+    Borrowing = apps.get_model("borrowing", "Borrowing")
+    newest = Borrowing.objects.aggregate(newest=Max("id"))["newest"] or 0
+    apps.get_model("borrowing", "ScanCheckpoint").objects.update(
+        last_id=newest
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("borrowing", "0007_userloanstats"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="scancheckpoint",
+            name="last_id",
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(
+            start_from_newest_borrowing, migrations.RunPython.noop
+        ),
+    ]
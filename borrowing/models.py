@@ -1,11 +1,88 @@
 from datetime import date
+from decimal import Decimal
 
+from django.conf import settings
 from django.db import models
+from django.db.models import Case, F, Func, Q, Value, When
+from django.db.models.functions import Coalesce, Greatest, Least, Round
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 
 from book.models import Book
 
 
+class DaysBetween(Func):
+    """Whole days from `start` to `end`, negative when `end` is earlier."""
+
+    arg_joiner = " - "
+    template = "(%(expressions)s)"
+    output_field = models.IntegerField()
+
+    def __init__(self, end, start, **extra):
+        super().__init__(end, start, **extra)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler,
+            connection,
+            template="CAST(julianday(%(expressions)s) AS INTEGER)",
+            arg_joiner=") - julianday(",
+            **extra_context,
+        )
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler,
+            connection,
+            template="DATEDIFF(%(expressions)s)",
+            arg_joiner=", ",
+            **extra_context,
+        )
+
+
+class BorrowingQuerySet(models.QuerySet):
+    def active(self):
+        return self.filter(
+            Q(actual_return_date__isnull=True)
+            | Q(actual_return_date__gt=date.today())
+        )
+
+    def inactive(self):
+        return self.filter(actual_return_date__lte=date.today())
+
+    def overdue(self, today=None):
+        """Active borrowings past their expected return date."""
+        today = today or date.today()
+        # One branch per index range: (actual_return_date IS NULL AND
+        # expected_return_date < today), then the rare early-dated returns.
+        return self.filter(
+            Q(actual_return_date__isnull=True, expected_return_date__lt=today)
+            | Q(actual_return_date__gt=today, expected_return_date__lt=today)
+        )
+
+    def with_fines(self, today=None):
+        """
+        Annotate `days_overdue` (days kept past the expected return date,
+        up to the return or `today`) and `fine`, the book's daily fee for
+        each of them, rounded to cents and capped at `OVERDUE_FINE_CAP`.
+        """
+        today = Value(today or date.today())
+        kept_until = Least(Coalesce("actual_return_date", today), today)
+        return self.annotate(
+            days_overdue=Greatest(
+                DaysBetween(kept_until, "expected_return_date"), Value(0)
+            )
+        ).annotate(
+            fine=Least(
+                Round(F("book__daily_fee") * F("days_overdue"), 2),
+                Value(Decimal(settings.OVERDUE_FINE_CAP)),
+                output_field=models.DecimalField(
+                    max_digits=10, decimal_places=2
+                ),
+            )
+        )
+
+
 class Borrowing(models.Model):
     borrow_date = models.DateField()
     expected_return_date = models.DateField()
@@ -17,6 +94,19 @@ class Borrowing(models.Model):
         get_user_model(), on_delete=models.CASCADE, related_name="borrowings"
     )
 
+    objects = BorrowingQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "actual_return_date"]),
+            models.Index(fields=["actual_return_date"]),
+            models.Index(fields=["borrow_date", "id"]),
+            models.Index(fields=["user", "borrow_date", "id"]),
+            models.Index(
+                fields=["actual_return_date", "expected_return_date"]
+            ),
+        ]
+
     def __str__(self) -> str:
         return f"{self.book.title} ({self.user.email})"
 
@@ -26,3 +116,191 @@ class Borrowing(models.Model):
             self.actual_return_date is None
             or self.actual_return_date > date.today()
         )
+
+
+class ArchivedBorrowing(models.Model):
+    """
+    A borrowing returned long ago, moved out of `Borrowing` by
+    `archive_borrowings` so that the hot table holds recent loans only.
+    It keeps the id it had as a `Borrowing`.
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    borrow_date = models.DateField()
+    expected_return_date = models.DateField()
+    actual_return_date = models.DateField()
+    book = models.ForeignKey(
+        Book, on_delete=models.CASCADE, related_name="archived_borrowings"
+    )
+    user = models.ForeignKey(
+        get_user_model(),
+        on_delete=models.CASCADE,
+        related_name="archived_borrowings",
+    )
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    # Only returned borrowings are archived.
+    is_active = False
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["borrow_date", "id"]),
+            models.Index(fields=["user", "borrow_date", "id"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.book.title} ({self.user.email}, archived)"
+
+
+class UserLoanStatsQuerySet(models.QuerySet):
+    def capacity(self, user_id):
+        """Loans the user may still take out, or None without a limit."""
+        if not settings.MAX_ACTIVE_LOANS:
+            return None
+        active = (
+            self.filter(user_id=user_id)
+            .values_list("active_loans", flat=True)
+            .first()
+        )
+        return max(settings.MAX_ACTIVE_LOANS - (active or 0), 0)
+
+    def add_loans(self, user_id, count) -> bool:
+        """
+        Count `count` new loans for the user, unless that would take them
+        over `MAX_ACTIVE_LOANS` active ones. Returns whether it did.
+        """
+        self.bulk_create(
+            [UserLoanStats(user_id=user_id)], ignore_conflicts=True
+        )
+        rows = self.filter(user_id=user_id)
+        if settings.MAX_ACTIVE_LOANS:
+            rows = rows.filter(
+                active_loans__lte=settings.MAX_ACTIVE_LOANS - count
+            )
+        return bool(
+            rows.update(
+                active_loans=F("active_loans") + count,
+                total_loans=F("total_loans") + count,
+            )
+        )
+
+    def end_loans(self, counts: dict) -> None:
+        """Take `{user_id: returned}` off the users' active loans."""
+        counts = {pk: count for pk, count in counts.items() if count}
+        if not counts:
+            return
+        self.filter(user_id__in=counts).update(
+            active_loans=Case(
+                *(
+                    When(
+                        user_id=pk,
+                        then=Greatest(F("active_loans") - count, Value(0)),
+                    )
+                    for pk, count in counts.items()
+                ),
+                default=F("active_loans"),
+                output_field=models.PositiveIntegerField(),
+            )
+        )
+
+
+class UserLoanStats(models.Model):
+    """
+    Per-user loan counters. They live in their own table so that borrowing
+    never writes to user rows, which authentication caches.
+    """
+
+    user = models.OneToOneField(
+        get_user_model(),
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="loan_stats",
+    )
+    active_loans = models.PositiveIntegerField(default=0)
+    # Includes archived borrowings.
+    total_loans = models.PositiveIntegerField(default=0)
+
+    objects = UserLoanStatsQuerySet.as_manager()
+
+    def __str__(self) -> str:
+        return f"{self.user_id}: {self.active_loans} active"
+
+
+class JobQuerySet(models.QuerySet):
+    def claimable(self, now):
+        """
+        Pending jobs that are due, and running jobs whose lease expired
+        with attempts left.
+        """
+        return self.filter(
+            Q(status=Job.PENDING, run_after__lte=now)
+            | Q(
+                status=Job.RUNNING,
+                locked_until__lt=now,
+                attempts__lt=settings.JOB_MAX_ATTEMPTS,
+            )
+        )
+
+    def abandoned(self, now):
+        """Running jobs whose lease expired on their last attempt."""
+        return self.filter(
+            status=Job.RUNNING,
+            locked_until__lt=now,
+            attempts__gte=settings.JOB_MAX_ATTEMPTS,
+        )
+
+
+class Job(models.Model):
+    """A unit of background work, claimed and run by `run_worker`."""
+
+    PENDING = "PENDING"
+    RUNNING = "RUNNING"
+    DONE = "DONE"
+    FAILED = "FAILED"
+    STATUS_CHOICES = (
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    )
+    kind = models.CharField(max_length=50)
+    # Deduplicates jobs of one kind, e.g. the borrowing a reminder is for.
+    key = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(
+        max_length=7, choices=STATUS_CHOICES, default=PENDING
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = JobQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["kind", "key"], name="unique_job_kind_key"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["status", "run_after"]),
+            models.Index(fields=["status", "locked_until"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.kind} {self.key} ({self.status})"
+
+
+class ScanCheckpoint(models.Model):
+    """How far a periodic scan got, so the next run resumes from there."""
+
+    name = models.CharField(max_length=50, unique=True)
+    position = models.DateField()
+    # Highest borrowing id seen, to catch rows added behind `position`.
+    last_id = models.BigIntegerField(default=0)
+
+    def __str__(self) -> str:
+        return f"{self.name} at {self.position}"
@@ -7,4 +7,4 @@ class IsOwnerOrAdmin(BasePermission):
         if request.user.is_staff:
             return True
 
-        return obj.user == request.user
+        return obj.user_id == request.user.id
@@ -0,0 +1,195 @@
+"""
+"Borrowed together" recommendations.
+
+Loans form a sparse user x book matrix `A` with a 1 wherever a user
+borrowed a book. `A.T @ A` counts, for every pair of books, the readers
+who borrowed both, and dividing by the square roots of both books'
+reader counts gives their cosine similarity. The top `top_k` neighbours
+of each book are stored as `BookRelation` rows.
+
+The matrix is saved to a snapshot together with the last borrowing id it
+covers. A refresh reads only newer borrowings (archived ones keep their
+ids) and rescores only the books whose neighbours they can change.
+"""
+
+import os
+
+import numpy as np
+from django.db import transaction
+from scipy import sparse
+
+from book.models import Book, BookRelation
+from borrowing.models import ArchivedBorrowing, Borrowing
+
+
+def read_loans(after_id=0, chunk_size=100_000):
+    """
+    Return the `(user_id, book_id)` arrays of every borrowing, archived or
+    not, with an id above `after_id`, and the highest id read.
+    """
+    users, books = [], []
+    last_id = after_id
+    for model in (Borrowing, ArchivedBorrowing):
+        position = after_id
+        while True:
+            rows = list(
+                model.objects.filter(id__gt=position)
+                .order_by("id")
+                .values_list("id", "user_id", "book_id")[:chunk_size]
+            )
+            if not rows:
+                break
+            chunk = np.array(rows, dtype=np.int64)
+            users.append(chunk[:, 1])
+            books.append(chunk[:, 2])
+            position = int(chunk[-1, 0])
+            last_id = max(last_id, position)
+    if not users:
+        return np.empty(0, np.int64), np.empty(0, np.int64), last_id
+    return np.concatenate(users), np.concatenate(books), last_id
+
+
+class LoanMatrix:
+    """The binary user x book matrix, indexed by sorted user and book ids."""
+
+    def __init__(self, user_ids, book_ids, matrix, last_id):
+        self.user_ids = user_ids
+        self.book_ids = book_ids
+        self.matrix = matrix
+        self.last_id = last_id
+
+    @classmethod
+    def from_loans(cls, users, books, last_id):
+        user_ids, rows = np.unique(users, return_inverse=True)
+        book_ids, columns = np.unique(books, return_inverse=True)
+        matrix = sparse.csr_matrix(
+            (np.ones(len(rows), np.int32), (rows, columns)),
+            shape=(len(user_ids), len(book_ids)),
+        )
+        # Borrowing a book twice does not make it more related.
+        matrix.data[:] = 1
+        return cls(user_ids, book_ids, matrix, last_id)
+
+    def loans(self):
+        """The `(user_id, book_id)` arrays of the matrix's nonzeros."""
+        coo = self.matrix.tocoo()
+        return self.user_ids[coo.row], self.book_ids[coo.col]
+
+    def extend(self, users, books, last_id):
+        """
+        Return the matrix with the new loans added, and the ids of the books
+        whose neighbours may have changed: every book read by a reader of a
+        newly borrowed book. Those are the books co-read with a book whose
+        reader count, the cosine denominator, changed; they include every
+        book of the new loans' readers, whose pair counts changed.
+        """
+        old_users, old_books = self.loans()
+        extended = self.from_loans(
+            np.concatenate([old_users, users]),
+            np.concatenate([old_books, books]),
+            last_id,
+        )
+        borrowed = np.searchsorted(extended.book_ids, np.unique(books))
+        readers = np.unique(extended.matrix.tocsc()[:, borrowed].indices)
+        touched = np.unique(extended.matrix[readers].indices)
+        return extended, extended.book_ids[touched]
+
+    def save(self, path):
+        # A run killed while saving leaves the previous snapshot intact.
+        partial = f"{path}.partial"
+        with open(partial, "wb") as file:
+            np.savez(
+                file,
+                user_ids=self.user_ids,
+                book_ids=self.book_ids,
+                indptr=self.matrix.indptr,
+                indices=self.matrix.indices,
+                last_id=self.last_id,
+            )
+        os.replace(partial, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as snapshot:
+            user_ids = snapshot["user_ids"]
+            book_ids = snapshot["book_ids"]
+            indices = snapshot["indices"]
+            matrix = sparse.csr_matrix(
+                (np.ones(len(indices), np.int32), indices, snapshot["indptr"]),
+                shape=(len(user_ids), len(book_ids)),
+            )
+            return cls(user_ids, book_ids, matrix, int(snapshot["last_id"]))
+
+
+def top_neighbours(loans, book_ids, top_k, min_support=1, block_size=2000):
+    """
+    Yield, `block_size` books of `book_ids` at a time, the block's book ids
+    and `(book_ids, related_ids, scores)` arrays of the `top_k` most
+    similar books of each, best first. Only one block of the
+    co-occurrence matrix is in memory at once. Pairs read together by
+    fewer than `min_support` users are skipped.
+    """
+    matrix = loans.matrix.tocsc()
+    by_book = matrix.T.tocsr()
+    readers = np.diff(matrix.indptr)
+    positions = np.searchsorted(loans.book_ids, book_ids)
+
+    for start in range(0, len(positions), block_size):
+        block = positions[start : start + block_size]
+        together = (by_book[block] @ matrix).tocsr()
+        rows = np.repeat(np.arange(len(block)), np.diff(together.indptr))
+        columns = together.indices
+        keep = (columns != block[rows]) & (together.data >= min_support)
+        rows, columns = rows[keep], columns[keep]
+        scores = together.data[keep] / np.sqrt(
+            readers[block[rows]].astype(np.float64) * readers[columns]
+        )
+
+        # Per row: best score first, lower book id first among ties.
+        order = np.lexsort((columns, -scores, rows))
+        rows, columns, scores = rows[order], columns[order], scores[order]
+        first = np.searchsorted(rows, np.arange(len(block)))
+        best = np.arange(len(rows)) - first[rows] < top_k
+        yield loans.book_ids[block], (
+            loans.book_ids[block[rows[best]]],
+            loans.book_ids[columns[best]],
+            scores[best],
+        )
+
+
+def store_relations(loans, book_ids, top_k, min_support=1, block_size=2000):
+    """
+    Replace the stored neighbours of `book_ids`, one transaction per
+    block, and return how many relations were written.
+    """
+    # Books deleted since their loans were read are left out.
+    existing = set(Book.objects.values_list("id", flat=True))
+    written = 0
+    for block, neighbours in top_neighbours(
+        loans, book_ids, top_k, min_support, block_size
+    ):
+        relations = [
+            BookRelation(book_id=book_id, related_id=related_id, score=score)
+            for book_id, related_id, score in zip(
+                *(array.tolist() for array in neighbours)
+            )
+            if book_id in existing and related_id in existing
+        ]
+        with transaction.atomic():
+            BookRelation.objects.filter(book_id__in=block.tolist()).delete()
+            BookRelation.objects.bulk_create(relations, batch_size=5000)
+        written += len(relations)
+    return written
+
+
+def remove_relations(keep_book_ids, batch_size=5000):
+    """Delete the neighbours of every book not in `keep_book_ids`."""
+    stale = sorted(
+        set(
+            BookRelation.objects.values_list("book_id", flat=True).distinct()
+        ).difference(keep_book_ids.tolist())
+    )
+    for start in range(0, len(stale), batch_size):
+        BookRelation.objects.filter(
+            book_id__in=stale[start : start + batch_size]
+        ).delete()
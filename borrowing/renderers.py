@@ -0,0 +1,70 @@
+import csv
+import json
+from itertools import islice
+
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class _Echo:
+    """File-like object handing each written line back to the caller."""
+
+    def write(self, value):
+        return value
+
+
+class StreamingRenderer(BaseRenderer):
+    charset = "utf-8"
+    chunk_rows = 500
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # Used for error responses raised before streaming starts.
+        if not isinstance(data, dict):
+            data = {"detail": data}
+        messages = [
+            " ".join(map(str, value)) if isinstance(value, list) else value
+            for value in data.values()
+        ]
+        return b"".join(self.stream(list(data), [messages]))
+
+    def stream(self, header, rows):
+        """Yield encoded chunks of `chunk_rows` rows from an iterable."""
+        rows = iter(rows)
+        lines = self.header_lines(header)
+        while True:
+            batch = list(islice(rows, self.chunk_rows))
+            if not batch:
+                break
+            lines.extend(self.format_row(header, row) for row in batch)
+            yield "".join(lines).encode(self.charset)
+            lines = []
+        if lines:
+            yield "".join(lines).encode(self.charset)
+
+    def header_lines(self, header):
+        return []
+
+    def format_row(self, header, row):
+        raise NotImplementedError
+
+
+class CSVRenderer(StreamingRenderer):
+    media_type = "text/csv"
+    format = "csv"
+
+    def __init__(self):
+        self.writer = csv.writer(_Echo())
+
+    def header_lines(self, header):
+        return [self.writer.writerow(header)]
+
+    def format_row(self, header, row):
+        return self.writer.writerow(row)
+
+
+class NDJSONRenderer(StreamingRenderer):
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+
+    def format_row(self, header, row):
+        return json.dumps(dict(zip(header, row)), cls=JSONEncoder) + "\n"
@@ -1,13 +1,25 @@
+from collections import Counter
+from datetime import date
+
+from django.conf import settings
 from django.db import transaction
 from rest_framework import serializers
 
-from borrowing.models import Borrowing
+from borrowing.models import Borrowing, UserLoanStats
 from book.models import Book
 from book.serializers import BookSerializer
+from library_service.serializers import TimedSerializerMixin
 from user.serializers import UserSerializer
 
 
-class BorrowingSerializer(serializers.ModelSerializer):
+def loan_limit_message():
+    return (
+        f"You may not have more than {settings.MAX_ACTIVE_LOANS} books "
+        "borrowed at once."
+    )
+
+
+class BorrowingSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     book = serializers.PrimaryKeyRelatedField(queryset=Book.objects.all())
     user = serializers.PrimaryKeyRelatedField(read_only=True)
     is_active = serializers.ReadOnlyField()
@@ -32,12 +44,17 @@ class BorrowingSerializer(serializers.ModelSerializer):
         return data
 
     def create(self, validated_data):
+        user = self.context["request"].user
         with transaction.atomic():
+            if not UserLoanStats.objects.add_loans(user.pk, 1):
+                raise serializers.ValidationError(loan_limit_message())
             book = validated_data["book"]
-            book.inventory -= 1
-            book.save()
+            if not Book.objects.adjust_inventory({book.pk: -1}):
+                raise serializers.ValidationError(
+                    "Inventory must be greater than 0."
+                )
 
-            validated_data["user"] = self.context["request"].user
+            validated_data["user"] = user
             return super().create(validated_data)
 
 
@@ -49,3 +66,147 @@ class BorrowingListSerializer(BorrowingSerializer):
 class BorrowingDetailSerializer(BorrowingSerializer):
     book = BookSerializer(read_only=True)
     user = UserSerializer(read_only=True)
+
+
+class OverdueBorrowingSerializer(BorrowingListSerializer):
+    days_overdue = serializers.IntegerField(read_only=True)
+    fine = serializers.DecimalField(
+        max_digits=10, decimal_places=2, read_only=True
+    )
+
+    class Meta(BorrowingListSerializer.Meta):
+        fields = [
+            "id",
+            "borrow_date",
+            "expected_return_date",
+            "actual_return_date",
+            "book",
+            "user",
+            "days_overdue",
+            "fine",
+        ]
+
+
+class OverdueTotalsSerializer(TimedSerializerMixin, serializers.Serializer):
+    loans = serializers.IntegerField()
+    days_overdue = serializers.IntegerField(source="total_days")
+    fine = serializers.DecimalField(
+        max_digits=12, decimal_places=2, source="total_fine"
+    )
+
+
+class UserOverdueTotalsSerializer(OverdueTotalsSerializer):
+    user_id = serializers.IntegerField()
+    user_email = serializers.EmailField()
+
+
+class BookOverdueTotalsSerializer(OverdueTotalsSerializer):
+    book_id = serializers.IntegerField()
+    book_title = serializers.CharField()
+
+
+class BulkBorrowItemSerializer(serializers.Serializer):
+    book = serializers.IntegerField(min_value=1)
+    borrow_date = serializers.DateField(required=False)
+    expected_return_date = serializers.DateField()
+
+
+class BulkBorrowSerializer(serializers.Serializer):
+    ALL_OR_NOTHING = "all_or_nothing"
+    BEST_EFFORT = "best_effort"
+    MAX_ITEMS = 100
+
+    mode = serializers.ChoiceField(
+        choices=(ALL_OR_NOTHING, BEST_EFFORT), default=ALL_OR_NOTHING
+    )
+    items = BulkBorrowItemSerializer(
+        many=True, allow_empty=False, max_length=MAX_ITEMS
+    )
+
+    def create(self, validated_data):
+        items = validated_data["items"]
+        best_effort = validated_data["mode"] == self.BEST_EFFORT
+        user = self.context["request"].user
+
+        with transaction.atomic():
+            available = dict(
+                Book.objects.select_for_update()
+                .filter(pk__in={item["book"] for item in items})
+                .values_list("id", "inventory")
+            )
+            capacity = UserLoanStats.objects.select_for_update().capacity(
+                user.pk
+            )
+            results, reserved = self._allocate(items, available, capacity)
+
+            failed = len(results) - sum(reserved.values())
+            if not reserved or (failed and not best_effort):
+                for result in results:
+                    if result["status"] == "created":
+                        result["status"] = "skipped"
+                        result["detail"] = "Another item in the batch failed."
+                return {"created": 0, "results": results}
+
+            deltas = {pk: -count for pk, count in reserved.items()}
+            if Book.objects.adjust_inventory(deltas) != len(deltas):
+                raise serializers.ValidationError(
+                    "Inventory changed during the request, please retry."
+                )
+            if not UserLoanStats.objects.add_loans(
+                user.pk, sum(reserved.values())
+            ):
+                raise serializers.ValidationError(loan_limit_message())
+
+            created = iter(
+                Borrowing.objects.bulk_create(
+                    [
+                        Borrowing(
+                            user=user,
+                            book_id=item["book"],
+                            borrow_date=item.get("borrow_date", date.today()),
+                            expected_return_date=item["expected_return_date"],
+                        )
+                        for item, result in zip(items, results)
+                        if result["status"] == "created"
+                    ]
+                )
+            )
+            for result in results:
+                if result["status"] == "created":
+                    result["id"] = next(created).id
+
+        return {"created": sum(reserved.values()), "results": results}
+
+    @staticmethod
+    def _allocate(items, available, capacity=None):
+        results = []
+        reserved = Counter()
+        for index, item in enumerate(items):
+            book_id = item["book"]
+            result = {"index": index, "book": book_id, "status": "created"}
+            if book_id not in available:
+                result["status"] = "error"
+                result["detail"] = "Book does not exist."
+            elif available[book_id] - reserved[book_id] <= 0:
+                result["status"] = "error"
+                result["detail"] = "Inventory must be greater than 0."
+            elif capacity is not None and sum(reserved.values()) >= capacity:
+                result["status"] = "error"
+                result["detail"] = loan_limit_message()
+            else:
+                reserved[book_id] += 1
+            results.append(result)
+        return results, reserved
+
+
+class BulkReturnSerializer(serializers.Serializer):
+    MAX_ITEMS = 500
+
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=MAX_ITEMS,
+    )
+
+    def validate_ids(self, ids):
+        return list(dict.fromkeys(ids))
@@ -1,13 +1,52 @@
+import csv
+import io
+import json
+import os
+import tempfile
+from base64 import b64encode
 from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
 
-from django.test import TestCase
-from rest_framework.test import APIClient
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core import mail
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection
+from django.test import (
+    AsyncClient,
+    AsyncRequestFactory,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from prometheus_client import REGISTRY
+from rest_framework.test import APIClient, APIRequestFactory
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework_simplejwt.tokens import AccessToken
 from django.urls import reverse
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 
-from book.models import Book
-from borrowing.models import Borrowing
+from book.models import Book, BookRelation
+from borrowing import jobs, recommendations
+from borrowing.archive import archive
+from borrowing.management.commands import run_worker
+from borrowing.models import (
+    ArchivedBorrowing,
+    Borrowing,
+    Job,
+    ScanCheckpoint,
+    UserLoanStats,
+)
+from borrowing.renderers import CSVRenderer
+from borrowing.serializers import BorrowingSerializer
+from borrowing.views import BorrowingViewSet
+from library_service.benchmark import compare, summarize
+from library_service.db import retry_on_lock
+from user.authentication import get_user_cache
 
 
 BORROWING_LIST_URL = reverse("borrowings:borrowing-list")
@@ -74,6 +113,130 @@ class AuthenticatedUserTests(TestCase):
         self.assertEqual(borrowing.user, self.user)
         self.assertEqual(borrowing.book.inventory, 0)
 
+    def test_create_does_not_oversell_after_validation(self):
+        book = sample_book(inventory=1)
+        request = APIRequestFactory().post(BORROWING_LIST_URL)
+        request.user = self.user
+        serializer = BorrowingSerializer(
+            data={
+                "borrow_date": date.today(),
+                "expected_return_date": date.today() + timedelta(days=7),
+                "book": book.id,
+            },
+            context={"request": request},
+        )
+        self.assertTrue(serializer.is_valid())
+
+        Book.objects.filter(pk=book.pk).update(inventory=0)
+
+        with self.assertRaises(ValidationError):
+            serializer.save()
+        book.refresh_from_db()
+        self.assertEqual(book.inventory, 0)
+        self.assertFalse(Borrowing.objects.exists())
+
+
+class AsyncViewTests(TestCase):
+    list_actions = {"get": "list", "post": "create"}
+    detail_actions = {"get": "retrieve"}
+
+    def setUp(self):
+        get_user_cache().clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com", password="password123"
+        )
+        self.other_user = get_user_model().objects.create_user(
+            email="other@test.com", password="password123"
+        )
+        self.admin_user = get_user_model().objects.create_superuser(
+            email="admin@test.com", password="adminpass"
+        )
+        book = sample_book(inventory=5)
+        today = date.today()
+        self.borrowings = [
+            sample_borrowing(
+                user=user,
+                book=book,
+                borrow_date=today - timedelta(days=index),
+                expected_return_date=today + timedelta(days=7),
+                actual_return_date=today if index % 2 else None,
+            )
+            for index, user in enumerate(
+                (self.user, self.user, self.user, self.other_user)
+            )
+        ]
+
+    @staticmethod
+    def bearer(user):
+        return {"Authorization": f"Bearer {AccessToken.for_user(user)}"}
+
+    def assertSameResponse(self, actions, path, headers=None, **kwargs):
+        expected = self.client.get(path, headers=headers)
+        view = BorrowingViewSet.as_async_view(
+            BorrowingViewSet.as_view(actions), actions
+        )
+        request = AsyncRequestFactory().get(path, headers=headers)
+        response = async_to_sync(view)(request, **kwargs).render()
+
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response.content, expected.content)
+        for header in ("Content-Type", "Allow", "WWW-Authenticate"):
+            self.assertEqual(response.get(header), expected.get(header))
+        return response
+
+    def test_list_matches_sync_view(self):
+        for user, query in (
+            (self.user, ""),
+            (self.user, "?is_active=true"),
+            (self.user, "?is_active=false&page_size=1"),
+            (self.admin_user, f"?user_id={self.other_user.id}"),
+        ):
+            with self.subTest(user=user.email, query=query):
+                self.assertSameResponse(
+                    self.list_actions,
+                    f"{BORROWING_LIST_URL}{query}",
+                    self.bearer(user),
+                )
+
+    def test_list_with_archived_history_matches_sync_view(self):
+        # Archive everything returned before tomorrow.
+        self.assertEqual(sum(archive(days=-1, batch_size=10)), 2)
+
+        for query in ("", "?is_active=false&page_size=1"):
+            with self.subTest(query=query):
+                self.assertSameResponse(
+                    self.list_actions,
+                    f"{BORROWING_LIST_URL}{query}",
+                    self.bearer(self.user),
+                )
+
+    def test_retrieve_matches_sync_view(self):
+        for user, borrowing in (
+            (self.user, self.borrowings[0]),
+            (self.user, self.borrowings[3]),
+            (self.admin_user, self.borrowings[3]),
+        ):
+            with self.subTest(user=user.email, borrowing=borrowing.id):
+                self.assertSameResponse(
+                    self.detail_actions,
+                    f"{BORROWING_LIST_URL}{borrowing.id}/",
+                    self.bearer(user),
+                    pk=str(borrowing.id),
+                )
+
+    def test_authentication_failures_match_sync_view(self):
+        deleted_user = self.bearer(self.other_user)
+        self.other_user.delete()
+
+        for headers in (None, {"Authorization": "Bearer x"}, deleted_user):
+            response = self.assertSameResponse(
+                self.list_actions, BORROWING_LIST_URL, headers
+            )
+            self.assertEqual(
+                response.status_code, status.HTTP_401_UNAUTHORIZED
+            )
+
 
 class BorrowingFilterAndPermissionTests(TestCase):
     def setUp(self):
@@ -108,14 +271,18 @@ class BorrowingFilterAndPermissionTests(TestCase):
         response = self.client.get(BORROWING_LIST_URL, {"is_active": "true"})
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]["id"], active_borrowing.id)
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertEqual(
+            response.data["results"][0]["id"], active_borrowing.id
+        )
 
         response = self.client.get(BORROWING_LIST_URL, {"is_active": "false"})
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]["id"], inactive_borrowing.id)
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertEqual(
+            response.data["results"][0]["id"], inactive_borrowing.id
+        )
 
     def test_filter_by_user_id(self):
         other_user = get_user_model().objects.create_user(
@@ -144,8 +311,10 @@ class BorrowingFilterAndPermissionTests(TestCase):
         )
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]["id"], other_user_borrowing.id)
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertEqual(
+            response.data["results"][0]["id"], other_user_borrowing.id
+        )
 
         response = self.client.get(
             f"{BORROWING_LIST_URL}{other_user_borrowing.id}/"
@@ -158,11 +327,85 @@ class BorrowingFilterAndPermissionTests(TestCase):
         )
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]["id"], other_user_borrowing.id)
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertEqual(
+            response.data["results"][0]["id"], other_user_borrowing.id
+        )
+
+    def test_admin_can_combine_is_active_and_user_id_filters(self):
+        other_user = get_user_model().objects.create_user(
+            email="other@test.com",
+            password="password123",
+        )
+        sample_borrowing(
+            user=self.user,
+            book=self.book,
+            borrow_date=date.today(),
+            expected_return_date=date.today() + timedelta(days=7),
+            actual_return_date=None,
+        )
+        other_active = sample_borrowing(
+            user=other_user,
+            book=self.book,
+            borrow_date=date.today(),
+            expected_return_date=date.today() + timedelta(days=7),
+            actual_return_date=None,
+        )
+        sample_borrowing(
+            user=other_user,
+            book=self.book,
+            borrow_date=date.today(),
+            expected_return_date=date.today() + timedelta(days=7),
+            actual_return_date=date.today() - timedelta(days=1),
+        )
+
+        self.client.force_authenticate(self.admin_user)
+        response = self.client.get(
+            BORROWING_LIST_URL, {"is_active": "true", "user_id": other_user.id}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertEqual(response.data["results"][0]["id"], other_active.id)
 
 
-class BorrowingReturnTests(TestCase):
+class BorrowingQuerySetTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com", password="password123"
+        )
+        self.book = sample_book()
+
+    def test_active_and_inactive_match_is_active_property(self):
+        for actual_return_date in (
+            None,
+            date.today() - timedelta(days=1),
+            date.today(),
+            date.today() + timedelta(days=1),
+        ):
+            sample_borrowing(
+                user=self.user,
+                book=self.book,
+                borrow_date=date.today() - timedelta(days=3),
+                expected_return_date=date.today() + timedelta(days=7),
+                actual_return_date=actual_return_date,
+            )
+
+        active = Borrowing.objects.active()
+        inactive = Borrowing.objects.inactive()
+
+        self.assertEqual(
+            set(active.values_list("id", flat=True)),
+            {b.id for b in Borrowing.objects.all() if b.is_active},
+        )
+        self.assertEqual(
+            set(inactive.values_list("id", flat=True)),
+            {b.id for b in Borrowing.objects.all() if not b.is_active},
+        )
+        self.assertEqual(active.count() + inactive.count(), 4)
+
+
+class BorrowingPaginationTests(TestCase):
     def setUp(self):
         self.client = APIClient()
         self.user = get_user_model().objects.create_user(
@@ -170,43 +413,1508 @@ class BorrowingReturnTests(TestCase):
         )
         self.client.force_authenticate(self.user)
         self.book = sample_book()
+        self.borrowings = [
+            sample_borrowing(
+                user=self.user,
+                book=self.book,
+                borrow_date=date.today() - timedelta(days=index // 2),
+                expected_return_date=date.today() + timedelta(days=7),
+                actual_return_date=(
+                    None if index % 3 else date.today() - timedelta(days=1)
+                ),
+            )
+            for index in range(7)
+        ]
 
+    def collect_pages(self, params):
+        ids = []
+        url = BORROWING_LIST_URL
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids.extend(item["id"] for item in response.data["results"])
+            url, params = response.data["next"], None
+        return ids
 
-    def test_successful_return(self):
+    def test_pages_follow_borrow_date_then_id(self):
+        expected = [
+            b.id
+            for b in sorted(
+                self.borrowings, key=lambda b: (b.borrow_date, b.id)
+            )
+        ]
 
-        self.client.post(BORROWING_LIST_URL, data={
-            "user": self.user.id,
-            "book": self.book.id,
-            "borrow_date": date.today(),
-            "expected_return_date" : date.today() + timedelta(days=7)
-        })
+        self.assertEqual(self.collect_pages({"page_size": 2}), expected)
 
-        borrowing = Borrowing.objects.first()
+    def test_previous_link_returns_preceding_page(self):
+        first = self.client.get(BORROWING_LIST_URL, {"page_size": 3})
+        second = self.client.get(first.data["next"])
+        previous = self.client.get(second.data["previous"])
 
+        self.assertIsNone(first.data["previous"])
+        self.assertEqual(previous.data["results"], first.data["results"])
 
-        response = self.client.post(f"{BORROWING_LIST_URL}{borrowing.id}/return/")
+    def test_pagination_respects_is_active_filter(self):
+        expected = [
+            b.id
+            for b in sorted(
+                self.borrowings, key=lambda b: (b.borrow_date, b.id)
+            )
+            if b.is_active
+        ]
 
-        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            self.collect_pages({"page_size": 2, "is_active": "true"}),
+            expected,
+        )
 
-        borrowing.refresh_from_db()
+    def test_invalid_cursor_returns_not_found(self):
+        response = self.client.get(BORROWING_LIST_URL, {"cursor": "garbage"})
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_cursor_values_must_suit_the_ordering(self):
+        for position in (["notadate", 1], ["2025-01-01", "x"]):
+            with self.subTest(position=position):
+                cursor = b64encode(json.dumps({"p": position}).encode())
+                response = self.client.get(
+                    BORROWING_LIST_URL, {"cursor": cursor.decode()}
+                )
+                self.assertEqual(
+                    response.status_code, status.HTTP_404_NOT_FOUND
+                )
+
+
+class BorrowingQueryCountTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com", password="password123"
+        )
+        self.admin_user = get_user_model().objects.create_superuser(
+            email="admin@test.com", password="adminpass"
+        )
+        self.book = sample_book()
+
+    def create_borrowings(self, count):
+        return [
+            sample_borrowing(
+                user=self.user,
+                book=sample_book(title=f"Title {index}"),
+                borrow_date=date.today(),
+                expected_return_date=date.today() + timedelta(days=7),
+                actual_return_date=None,
+            )
+            for index in range(count)
+        ]
+
+    def test_list_query_count_does_not_depend_on_page_size(self):
+        self.create_borrowings(10)
+
+        for user in (self.user, self.admin_user):
+            self.client.force_authenticate(user)
+            for page_size in (1, 10):
+                with self.assertNumQueries(1):
+                    response = self.client.get(
+                        BORROWING_LIST_URL,
+                        {"page_size": page_size, "is_active": "true"},
+                    )
+                self.assertEqual(len(response.data["results"]), page_size)
+
+    def test_retrieve_uses_single_query(self):
+        borrowing = self.create_borrowings(1)[0]
+        self.client.force_authenticate(self.user)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                f"{BORROWING_LIST_URL}{borrowing.id}/"
+            )
+
+        self.assertEqual(response.data["book"]["title"], "Title 0")
+        self.assertEqual(response.data["user"]["email"], self.user.email)
+
+
+class BulkBorrowTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com", password="password123"
+        )
+        self.client.force_authenticate(self.user)
+        self.book = sample_book(inventory=2)
+        self.other_book = sample_book(title="Other", inventory=1)
+        self.url = reverse("borrowings:borrowing-bulk-borrow")
+
+    def item(self, book_id):
+        return {
+            "book": book_id,
+            "expected_return_date": date.today() + timedelta(days=7),
+        }
+
+    def test_borrows_all_items(self):
+        items = [
+            self.item(self.book.id),
+            self.item(self.book.id),
+            self.item(self.other_book.id),
+        ]
+
+        response = self.client.post(
+            self.url, {"items": items}, format="json"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["created"], 3)
+        self.assertEqual(
+            {result["id"] for result in response.data["results"]},
+            set(Borrowing.objects.values_list("id", flat=True)),
+        )
+        self.book.refresh_from_db()
+        self.other_book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 0)
+        self.assertEqual(self.other_book.inventory, 0)
+        self.assertEqual(
+            Borrowing.objects.filter(
+                user=self.user, borrow_date=date.today()
+            ).count(),
+            3,
+        )
+
+    def test_all_or_nothing_rolls_back_on_any_failure(self):
+        items = [
+            self.item(self.book.id),
+            self.item(self.other_book.id),
+            self.item(self.other_book.id),
+        ]
+
+        response = self.client.post(
+            self.url, {"items": items}, format="json"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            [result["status"] for result in response.data["results"]],
+            ["skipped", "skipped", "error"],
+        )
+        self.assertFalse(Borrowing.objects.exists())
         self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 2)
 
-        self.assertFalse(borrowing.is_active)
-        self.assertIsNotNone(borrowing.actual_return_date)
+    def test_best_effort_creates_what_it_can(self):
+        items = [
+            self.item(self.other_book.id),
+            self.item(self.other_book.id),
+            self.item(999_999),
+            self.item(self.book.id),
+        ]
+
+        response = self.client.post(
+            self.url, {"mode": "best_effort", "items": items}, format="json"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["created"], 2)
+        self.assertEqual(
+            [result["status"] for result in response.data["results"]],
+            ["created", "error", "error", "created"],
+        )
+        self.assertEqual(Borrowing.objects.count(), 2)
+        self.other_book.refresh_from_db()
+        self.assertEqual(self.other_book.inventory, 0)
+
+    def test_rejects_empty_batch(self):
+        response = self.client.post(self.url, {"items": []}, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BulkReturnTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com", password="password123"
+        )
+        self.client.force_authenticate(self.user)
+        self.book = sample_book(inventory=0)
+        self.url = reverse("borrowings:borrowing-bulk-return")
+
+    def borrowing(self, user=None, actual_return_date=None):
+        return sample_borrowing(
+            user=user or self.user,
+            book=self.book,
+            borrow_date=date.today(),
+            expected_return_date=date.today() + timedelta(days=7),
+            actual_return_date=actual_return_date,
+        )
+
+    def test_returns_active_and_reports_the_rest(self):
+        first = self.borrowing()
+        second = self.borrowing()
+        returned = self.borrowing(
+            actual_return_date=date.today() - timedelta(days=1)
+        )
+        foreign = self.borrowing(
+            user=get_user_model().objects.create_user(
+                email="other@test.com", password="password123"
+            )
+        )
+
+        with self.assertNumQueries(7):
+            response = self.client.post(
+                self.url,
+                {"ids": [first.id, returned.id, second.id, foreign.id]},
+                format="json",
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["returned"], 2)
+        self.assertEqual(
+            [result["status"] for result in response.data["results"]],
+            ["returned", "already_returned", "returned", "not_found"],
+        )
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 2)
+        first.refresh_from_db()
+        foreign.refresh_from_db()
+        self.assertFalse(first.is_active)
+        self.assertTrue(foreign.is_active)
+
+    def test_repeated_ids_are_returned_once(self):
+        borrowing = self.borrowing()
+
+        response = self.client.post(
+            self.url, {"ids": [borrowing.id, borrowing.id]}, format="json"
+        )
+
+        self.assertEqual(response.data["returned"], 1)
+        self.book.refresh_from_db()
         self.assertEqual(self.book.inventory, 1)
 
-    def test_cannot_return_already_returned_book(self):
-        returned = sample_borrowing(
+
+class BorrowingExportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com", password="password123"
+        )
+        self.admin_user = get_user_model().objects.create_superuser(
+            email="admin@test.com", password="adminpass"
+        )
+        self.book = sample_book()
+        self.url = reverse("borrowings:borrowing-export")
+        self.old = sample_borrowing(
             user=self.user,
             book=self.book,
+            borrow_date=date(2024, 1, 10),
+            expected_return_date=date(2024, 1, 20),
+            actual_return_date=date(2024, 1, 15),
+        )
+        self.recent = sample_borrowing(
+            user=self.admin_user,
+            book=self.book,
             borrow_date=date.today(),
             expected_return_date=date.today() + timedelta(days=7),
-            actual_return_date=date.today() - timedelta(days=7),
+            actual_return_date=None,
         )
 
-        response = self.client.post(f"{BORROWING_LIST_URL}{returned.id}/return/")
+    def export(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return b"".join(response.streaming_content).decode()
 
+    def test_only_admins_can_export(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.client.force_authenticate(self.user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_csv_export(self):
+        self.client.force_authenticate(self.admin_user)
+
+        rows = list(csv.reader(io.StringIO(self.export(format="csv"))))
+
+        self.assertEqual(rows[0][:3], ["id", "user_id", "user_email"])
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[1][2], "user@test.com")
+        self.assertEqual(rows[1][-2:], ["2024-01-15", "False"])
+        self.assertEqual(rows[2][-2:], ["", "True"])
+
+    def test_ndjson_export_honors_filters(self):
+        self.client.force_authenticate(self.admin_user)
+
+        lines = self.export(
+            format="ndjson", is_active="false", user_id=self.user.id
+        ).splitlines()
+        self.assertEqual(
+            [json.loads(line)["id"] for line in lines], [self.old.id]
+        )
+
+        lines = self.export(
+            format="ndjson", borrow_date_after=date.today().isoformat()
+        ).splitlines()
+        self.assertEqual(
+            [json.loads(line)["id"] for line in lines], [self.recent.id]
+        )
+
+    @mock.patch.object(CSVRenderer, "chunk_rows", 1)
+    def test_export_streams_under_asgi(self):
+        self.client.force_authenticate(self.admin_user)
+        expected = self.export(format="csv")
+        token = AccessToken.for_user(self.admin_user)
+
+        async def chunks():
+            response = await AsyncClient().get(
+                self.url,
+                {"format": "csv"},
+                headers={"Authorization": f"Bearer {token}"},
+            )
+            # An async iterator is sent as it is read, not as a list.
+            self.assertTrue(response.is_async)
+            return [chunk async for chunk in response.streaming_content]
+
+        chunks = async_to_sync(chunks)()
+
+        self.assertEqual(len(chunks), 2)
+        self.assertEqual(b"".join(chunks).decode(), expected)
+
+    def test_invalid_date_is_rejected(self):
+        self.client.force_authenticate(self.admin_user)
+
+        response = self.client.get(
+            self.url, {"format": "ndjson", "borrow_date_before": "soon"}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_csv_errors_are_plain_messages(self):
+        self.client.force_authenticate(self.admin_user)
+
+        response = self.client.get(
+            self.url, {"format": "csv", "borrow_date_after": "soon"}
+        )
+
+        rows = list(csv.reader(io.StringIO(response.content.decode())))
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(rows[0], ["borrow_date_after"])
+        self.assertTrue(rows[1][0].startswith("Date has wrong format."))
+        self.assertNotIn("ErrorDetail", rows[1][0])
+
+
+class BorrowingOverdueTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com", password="password123"
+        )
+        self.admin_user = get_user_model().objects.create_superuser(
+            email="admin@test.com", password="adminpass"
+        )
+        self.client.force_authenticate(self.admin_user)
+        self.cheap = sample_book(title="Cheap", daily_fee="2.50")
+        self.dear = sample_book(title="Dear", daily_fee=30)
+        today = date.today()
+
+        def borrow(user, book, due_in, returned_in=None):
+            return sample_borrowing(
+                user=user,
+                book=book,
+                borrow_date=today - timedelta(days=20),
+                expected_return_date=today + timedelta(days=due_in),
+                actual_return_date=(
+                    None
+                    if returned_in is None
+                    else today + timedelta(days=returned_in)
+                ),
+            )
+
+        self.four_days = borrow(self.user, self.cheap, -4)
+        self.capped = borrow(self.user, self.dear, -10)
+        self.two_days = borrow(self.admin_user, self.cheap, -2)
+        self.returned_late = borrow(self.admin_user, self.cheap, -3, -1)
+        self.not_due = borrow(self.admin_user, self.cheap, 3)
+        self.url = reverse("borrowings:borrowing-overdue")
+        self.totals_url = reverse("borrowings:borrowing-overdue-totals")
+
+    def test_with_fines_computes_days_and_capped_fines(self):
+        fines = {
+            borrowing.id: (borrowing.days_overdue, borrowing.fine)
+            for borrowing in Borrowing.objects.with_fines()
+        }
+
+        self.assertEqual(fines[self.four_days.id], (4, Decimal("10.00")))
+        self.assertEqual(fines[self.capped.id], (10, Decimal("100.00")))
+        self.assertEqual(fines[self.returned_late.id], (2, Decimal("5.00")))
+        self.assertEqual(fines[self.not_due.id], (0, Decimal("0")))
+
+    def test_overdue_excludes_returned_and_not_due_borrowings(self):
         self.assertEqual(
-            response.data["detail"], "This book has already been returned."
+            set(Borrowing.objects.overdue().values_list("id", flat=True)),
+            {self.four_days.id, self.capped.id, self.two_days.id},
+        )
+
+    def test_only_admins_can_see_overdue_borrowings(self):
+        self.client.force_authenticate(self.user)
+
+        for url in (self.url, self.totals_url):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_overdue_sorted_by_fine_by_default(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data["results"]
+        self.assertEqual(
+            [result["id"] for result in results],
+            [self.capped.id, self.four_days.id, self.two_days.id],
+        )
+        self.assertEqual(results[0]["fine"], "100.00")
+        self.assertEqual(results[0]["days_overdue"], 10)
+        self.assertEqual(results[0]["book"], "Dear")
+        self.assertEqual(results[0]["user"], "user@test.com")
+
+    def test_overdue_pages_follow_the_requested_ordering(self):
+        ids = []
+        url = f"{self.url}?ordering=fine&page_size=1"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids += [result["id"] for result in response.data["results"]]
+            url = response.data["next"]
+
+        self.assertEqual(
+            ids, [self.two_days.id, self.four_days.id, self.capped.id]
         )
+
+    def test_invalid_ordering_is_rejected(self):
+        response = self.client.get(self.url, {"ordering": "title"})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("ordering", response.data)
+
+    def test_totals_per_user(self):
+        response = self.client.get(self.totals_url, {"group_by": "user"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [dict(row) for row in response.data["results"]],
+            [
+                {
+                    "loans": 2,
+                    "days_overdue": 14,
+                    "fine": "110.00",
+                    "user_id": self.user.id,
+                    "user_email": "user@test.com",
+                },
+                {
+                    "loans": 1,
+                    "days_overdue": 2,
+                    "fine": "5.00",
+                    "user_id": self.admin_user.id,
+                    "user_email": "admin@test.com",
+                },
+            ],
+        )
+
+    def test_totals_per_book_paginate(self):
+        first = self.client.get(
+            self.totals_url, {"group_by": "book", "page_size": 1}
+        )
+        second = self.client.get(first.data["next"])
+
+        self.assertEqual(first.data["results"][0]["book_title"], "Dear")
+        self.assertEqual(first.data["results"][0]["fine"], "100.00")
+        self.assertEqual(
+            dict(second.data["results"][0]),
+            {
+                "loans": 2,
+                "days_overdue": 6,
+                "fine": "15.00",
+                "book_id": self.cheap.id,
+                "book_title": "Cheap",
+            },
+        )
+        self.assertIsNone(second.data["next"])
+
+    def test_invalid_group_by_is_rejected(self):
+        response = self.client.get(self.totals_url, {"group_by": "author"})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BorrowingArchiveTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com", password="password123"
+        )
+        self.other_user = get_user_model().objects.create_user(
+            email="other@test.com", password="password123"
+        )
+        self.admin_user = get_user_model().objects.create_superuser(
+            email="admin@test.com", password="adminpass"
+        )
+        book = sample_book(title="Dune")
+        today = date.today()
+
+        def borrow(user, days_ago, returned_days_ago=None):
+            return sample_borrowing(
+                user=user,
+                book=book,
+                borrow_date=today - timedelta(days=days_ago),
+                expected_return_date=today - timedelta(days=days_ago - 14),
+                actual_return_date=(
+                    None
+                    if returned_days_ago is None
+                    else today - timedelta(days=returned_days_ago)
+                ),
+            )
+
+        self.old = [borrow(self.user, days, days - 7) for days in (900, 500)]
+        self.recent = borrow(self.user, 700, 10)
+        self.active = borrow(self.user, 3)
+        self.others = borrow(self.other_user, 600, 590)
+
+    def ids(self, url, params=None):
+        ids = []
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids += [result["id"] for result in response.data["results"]]
+            url, params = response.data["next"], None
+        return ids
+
+    def test_archive_moves_borrowings_returned_long_ago(self):
+        self.assertEqual(list(archive(days=365, batch_size=2)), [2, 1])
+
+        archived = ArchivedBorrowing.objects.order_by("id")
+        self.assertEqual(
+            list(archived.values_list("id", flat=True)),
+            [self.old[0].id, self.old[1].id, self.others.id],
+        )
+        self.assertEqual(
+            archived[0].actual_return_date, self.old[0].actual_return_date
+        )
+        self.assertEqual(
+            set(Borrowing.objects.values_list("id", flat=True)),
+            {self.recent.id, self.active.id},
+        )
+        self.assertEqual(list(archive(days=365, batch_size=2)), [])
+
+    def test_archive_command(self):
+        out = io.StringIO()
+        call_command("archive_borrowings", "--dry-run", stdout=out)
+        call_command("archive_borrowings", "--days", "100", stdout=out)
+
+        self.assertIn("3 borrowing(s) would be archived.", out.getvalue())
+        self.assertIn("Archived 3 borrowing(s)", out.getvalue())
+        self.assertEqual(ArchivedBorrowing.objects.count(), 3)
+
+    def test_history_pages_through_both_tables(self):
+        list(archive(days=365, batch_size=10))
+        self.client.force_authenticate(self.user)
+
+        ids = self.ids(BORROWING_LIST_URL, {"page_size": 1})
+        self.assertEqual(
+            ids,
+            [self.old[0].id, self.recent.id, self.old[1].id, self.active.id],
+        )
+        self.assertEqual(
+            self.ids(BORROWING_LIST_URL, {"is_active": "false"}),
+            [self.old[0].id, self.recent.id, self.old[1].id],
+        )
+
+        last = self.client.get(
+            BORROWING_LIST_URL, {"is_active": "false", "page_size": 2}
+        )
+        last = self.client.get(last.data["next"])
+        previous = self.client.get(last.data["previous"])
+        self.assertEqual(
+            [result["id"] for result in previous.data["results"]],
+            [self.old[0].id, self.recent.id],
+        )
+        self.assertEqual(previous.data["results"][0]["book"], "Dune")
+        self.assertFalse(previous.data["results"][0]["is_active"])
+
+    def test_admin_history_filters_archived_borrowings_by_user(self):
+        list(archive(days=365, batch_size=10))
+        self.client.force_authenticate(self.admin_user)
+
+        self.assertEqual(len(self.ids(BORROWING_LIST_URL)), 5)
+        self.assertEqual(
+            self.ids(BORROWING_LIST_URL, {"user_id": self.other_user.id}),
+            [self.others.id],
+        )
+
+    def test_active_borrowings_do_not_query_the_archive(self):
+        self.client.force_authenticate(self.user)
+
+        with self.assertNumQueries(1):
+            self.client.get(BORROWING_LIST_URL, {"is_active": "true"})
+        with self.assertNumQueries(2):
+            self.client.get(BORROWING_LIST_URL, {"is_active": "false"})
+
+    def test_export_includes_archived_borrowings(self):
+        list(archive(days=365, batch_size=10))
+        self.client.force_authenticate(self.admin_user)
+
+        response = self.client.get(
+            reverse("borrowings:borrowing-export"), {"format": "csv"}
+        )
+        rows = list(
+            csv.reader(
+                io.StringIO(b"".join(response.streaming_content).decode())
+            )
+        )
+
+        self.assertEqual(
+            [int(row[0]) for row in rows[1:]],
+            sorted(
+                b.id
+                for b in (*self.old, self.recent, self.active, self.others)
+            ),
+        )
+
+    def test_archived_borrowings_can_be_retrieved(self):
+        list(archive(days=365, batch_size=10))
+        url = f"{BORROWING_LIST_URL}{self.old[0].id}/"
+        self.client.force_authenticate(self.user)
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["book"]["title"], "Dune")
+        self.assertFalse(response.data["is_active"])
+
+        actions = {"get": "retrieve"}
+        view = BorrowingViewSet.as_async_view(
+            BorrowingViewSet.as_view(actions), actions
+        )
+        token = AccessToken.for_user(self.user)
+        request = AsyncRequestFactory().get(
+            url, headers={"Authorization": f"Bearer {token}"}
+        )
+        async_response = async_to_sync(view)(request, pk=str(self.old[0].id))
+        self.assertEqual(async_response.render().content, response.content)
+
+        # Only loans still in `Borrowing` can be returned.
+        response = self.client.post(f"{url}return/")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        self.client.force_authenticate(self.other_user)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class LoanCounterTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com", password="password123"
+        )
+        self.client.force_authenticate(self.user)
+        self.book = sample_book(inventory=3)
+        self.other_book = sample_book(title="Other", inventory=3)
+
+    def borrow(self, book):
+        return self.client.post(
+            BORROWING_LIST_URL,
+            {
+                "book": book.id,
+                "borrow_date": date.today(),
+                "expected_return_date": date.today() + timedelta(days=7),
+            },
+        )
+
+    def bulk_borrow(self, *books, mode="all_or_nothing"):
+        return self.client.post(
+            reverse("borrowings:borrowing-bulk-borrow"),
+            {
+                "mode": mode,
+                "items": [
+                    {
+                        "book": book.id,
+                        "expected_return_date": date.today()
+                        + timedelta(days=7),
+                    }
+                    for book in books
+                ],
+            },
+            format="json",
+        )
+
+    def assertCounters(self, book, active_loans, borrow_count):
+        book.refresh_from_db()
+        self.assertEqual(
+            (book.active_loans, book.borrow_count),
+            (active_loans, borrow_count),
+        )
+
+    def assertUserCounters(self, active_loans, total_loans):
+        stats = UserLoanStats.objects.get(user=self.user)
+        self.assertEqual(
+            (stats.active_loans, stats.total_loans),
+            (active_loans, total_loans),
+        )
+
+    def test_borrow_and_return_update_the_counters(self):
+        borrowing_id = self.borrow(self.book).data["id"]
+        self.assertCounters(self.book, 1, 1)
+        self.assertUserCounters(1, 1)
+
+        self.client.post(f"{BORROWING_LIST_URL}{borrowing_id}/return/")
+
+        self.assertCounters(self.book, 0, 1)
+        self.assertUserCounters(0, 1)
+
+    def test_bulk_borrow_and_return_update_the_counters(self):
+        response = self.bulk_borrow(self.book, self.book, self.other_book)
+        ids = [result["id"] for result in response.data["results"]]
+        self.assertCounters(self.book, 2, 2)
+        self.assertCounters(self.other_book, 1, 1)
+        self.assertUserCounters(3, 3)
+
+        self.client.post(
+            reverse("borrowings:borrowing-bulk-return"),
+            {"ids": ids[1:]},
+            format="json",
+        )
+
+        self.assertCounters(self.book, 1, 2)
+        self.assertCounters(self.other_book, 0, 1)
+        self.assertUserCounters(1, 3)
+
+    @override_settings(MAX_ACTIVE_LOANS=1)
+    def test_borrowing_over_the_limit_is_rejected(self):
+        self.assertEqual(
+            self.borrow(self.book).status_code, status.HTTP_201_CREATED
+        )
+
+        response = self.borrow(self.other_book)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("more than 1 books", str(response.data))
+        self.assertCounters(self.other_book, 0, 0)
+        self.other_book.refresh_from_db()
+        self.assertEqual(self.other_book.inventory, 3)
+        self.assertUserCounters(1, 1)
+
+    @override_settings(MAX_ACTIVE_LOANS=2)
+    def test_bulk_borrow_respects_the_limit(self):
+        self.borrow(self.book)
+
+        response = self.bulk_borrow(self.book, self.other_book)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["created"], 0)
+
+        response = self.bulk_borrow(
+            self.book, self.other_book, mode="best_effort"
+        )
+        self.assertEqual(response.data["created"], 1)
+        self.assertIn(
+            "more than 2 books", response.data["results"][1]["detail"]
+        )
+        self.assertUserCounters(2, 2)
+
+    def test_repair_recounts_from_both_tables(self):
+        today = date.today()
+        for returned in (None, today - timedelta(days=400), today):
+            sample_borrowing(
+                user=self.user,
+                book=self.book,
+                borrow_date=today - timedelta(days=500),
+                expected_return_date=today - timedelta(days=480),
+                actual_return_date=returned,
+            )
+        list(archive(days=365, batch_size=10))
+        UserLoanStats.objects.create(user=self.user, active_loans=9)
+
+        out = io.StringIO()
+        call_command("repair_loan_counters", stdout=out)
+
+        self.assertIn("2 book(s) and 1 user(s)", out.getvalue())
+        self.assertCounters(self.book, 1, 3)
+        self.assertCounters(self.other_book, 0, 0)
+        self.assertUserCounters(1, 3)
+
+
+class RecommendationTests(TestCase):
+    def setUp(self):
+        self.books = [sample_book(title=title) for title in "ABCD"]
+        self.users = [
+            get_user_model().objects.create_user(f"reader{index}@test.com")
+            for index in range(3)
+        ]
+        # A: readers 0, 1, 2; B: 0, 1; C: 2; D: nobody yet.
+        for user, book in ((0, 0), (0, 1), (1, 0), (1, 1), (2, 0), (2, 2)):
+            self.borrow(user, book)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.snapshot = os.path.join(directory.name, "loans")
+
+    def borrow(self, user, book):
+        today = date.today()
+        Borrowing.objects.create(
+            user=self.users[user],
+            book=self.books[book],
+            borrow_date=today,
+            expected_return_date=today + timedelta(days=7),
+            actual_return_date=today,
+        )
+
+    def build(self, **options):
+        out = io.StringIO()
+        call_command(
+            "build_recommendations",
+            snapshot=self.snapshot,
+            stdout=out,
+            **options,
+        )
+        return out.getvalue()
+
+    def relations(self):
+        titles = {book.pk: book.title for book in self.books}
+        return {
+            (titles[book], titles[related]): round(score, 4)
+            for book, related, score in BookRelation.objects.values_list(
+                "book", "related", "score"
+            )
+        }
+
+    def test_scores_are_cosine_similarities(self):
+        self.build()
+
+        self.assertEqual(
+            self.relations(),
+            {
+                ("A", "B"): round(2 / 6**0.5, 4),
+                ("A", "C"): round(1 / 3**0.5, 4),
+                ("B", "A"): round(2 / 6**0.5, 4),
+                ("C", "A"): round(1 / 3**0.5, 4),
+            },
+        )
+
+    def test_top_k_and_min_support(self):
+        self.build(top_k=1)
+        self.assertEqual(
+            set(self.relations()), {("A", "B"), ("B", "A"), ("C", "A")}
+        )
+
+        self.build(full=True, min_support=2)
+        self.assertEqual(set(self.relations()), {("A", "B"), ("B", "A")})
+
+    def test_borrowing_a_book_twice_counts_once(self):
+        self.borrow(0, 1)
+        self.build()
+
+        self.assertEqual(self.relations()[("A", "B")], round(2 / 6**0.5, 4))
+
+    def test_archived_borrowings_are_read(self):
+        list(archive(0, 10, today=date.today() + timedelta(days=1)))
+        self.assertFalse(Borrowing.objects.exists())
+        self.build()
+
+        self.assertEqual(len(self.relations()), 4)
+
+    def test_refresh_rescores_the_books_of_new_readers(self):
+        self.build()
+        rescored = BookRelation.objects.get(
+            book=self.books[0], related=self.books[2]
+        )
+        kept = BookRelation.objects.get(book=self.books[1])
+        # Reader 2 borrows D: A, C and D are rescored, B is left alone.
+        self.borrow(2, 3)
+
+        output = self.build()
+
+        self.assertIn("Refreshed 3 book(s) from 1 borrowing(s)", output)
+        self.assertFalse(BookRelation.objects.filter(pk=rescored.pk).exists())
+        self.assertTrue(BookRelation.objects.filter(pk=kept.pk).exists())
+        relations = self.relations()
+        self.assertEqual(relations[("D", "C")], round(1 / 1**0.5, 4))
+        self.assertEqual(relations[("A", "D")], round(1 / 3**0.5, 4))
+
+        self.build(full=True)
+        self.assertEqual(self.relations(), relations)
+
+    def test_refresh_matches_a_full_rebuild(self):
+        self.build()
+        self.users.append(
+            get_user_model().objects.create_user("reader3@test.com")
+        )
+        # Only B gains a reader, yet A -> B is scored by B's reader count.
+        self.borrow(3, 1)
+
+        output = self.build()
+        refreshed = self.relations()
+        self.build(full=True)
+
+        self.assertIn("Refreshed 2 book(s) from 1 borrowing(s)", output)
+        self.assertEqual(refreshed[("A", "B")], round(2 / 9**0.5, 4))
+        self.assertEqual(refreshed, self.relations())
+
+    def test_refresh_without_new_borrowings(self):
+        self.build()
+        before = self.relations()
+
+        output = self.build()
+
+        self.assertIn("Refreshed 0 book(s) from 0 borrowing(s)", output)
+        self.assertEqual(self.relations(), before)
+
+    def test_full_build_drops_books_no_longer_borrowed(self):
+        self.build()
+        Borrowing.objects.filter(book=self.books[2]).delete()
+
+        self.build(full=True)
+
+        self.assertEqual(set(self.relations()), {("A", "B"), ("B", "A")})
+
+    def test_blocks_score_like_a_single_pass(self):
+        users, books, last_id = recommendations.read_loans(chunk_size=2)
+        loans = recommendations.LoanMatrix.from_loans(users, books, last_id)
+
+        def scored(block_size):
+            return [
+                pair
+                for _, neighbours in recommendations.top_neighbours(
+                    loans, loans.book_ids, 10, block_size=block_size
+                )
+                for pair in zip(*(array.tolist() for array in neighbours))
+            ]
+
+        self.assertEqual(last_id, Borrowing.objects.latest("id").pk)
+        self.assertEqual(scored(1), scored(100))
+
+    def test_snapshot_round_trip(self):
+        users, books, last_id = recommendations.read_loans()
+        loans = recommendations.LoanMatrix.from_loans(users, books, last_id)
+        loans.save(self.snapshot)
+
+        loaded = recommendations.LoanMatrix.load(self.snapshot)
+
+        self.assertEqual(loaded.last_id, last_id)
+        self.assertEqual(
+            sorted(zip(*loaded.loans())), sorted(zip(*loans.loans()))
+        )
+
+    def test_invalid_options(self):
+        with self.assertRaisesMessage(CommandError, "--top-k"):
+            self.build(top_k=0)
+
+
+class BorrowingReturnTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com", password="password123"
+        )
+        self.client.force_authenticate(self.user)
+        self.book = sample_book()
+
+
+    def test_successful_return(self):
+
+        self.client.post(BORROWING_LIST_URL, data={
+            "user": self.user.id,
+            "book": self.book.id,
+            "borrow_date": date.today(),
+            "expected_return_date" : date.today() + timedelta(days=7)
+        })
+
+        borrowing = Borrowing.objects.first()
+
+
+        response = self.client.post(f"{BORROWING_LIST_URL}{borrowing.id}/return/")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        borrowing.refresh_from_db()
+        self.book.refresh_from_db()
+
+        self.assertFalse(borrowing.is_active)
+        self.assertIsNotNone(borrowing.actual_return_date)
+        self.assertEqual(self.book.inventory, 1)
+
+    def test_return_only_touches_inventory(self):
+        borrowing = sample_borrowing(
+            user=self.user,
+            book=self.book,
+            borrow_date=date.today(),
+            expected_return_date=date.today() + timedelta(days=7),
+            actual_return_date=None,
+        )
+        Book.objects.filter(pk=self.book.pk).update(inventory=4, title="New")
+
+        response = self.client.post(
+            f"{BORROWING_LIST_URL}{borrowing.id}/return/"
+        )
+        second = self.client.post(
+            f"{BORROWING_LIST_URL}{borrowing.id}/return/"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.status_code, status.HTTP_400_BAD_REQUEST)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.inventory, 5)
+        self.assertEqual(self.book.title, "New")
+
+    def test_cannot_return_already_returned_book(self):
+        returned = sample_borrowing(
+            user=self.user,
+            book=self.book,
+            borrow_date=date.today(),
+            expected_return_date=date.today() + timedelta(days=7),
+            actual_return_date=date.today() - timedelta(days=7),
+        )
+
+        response = self.client.post(f"{BORROWING_LIST_URL}{returned.id}/return/")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            response.data["detail"], "This book has already been returned."
+        )
+
+
+class GenerateDataCommandTests(TestCase):
+    options = {
+        "users": 5,
+        "books": 20,
+        "borrowings": 500,
+        "end_date": date(2025, 1, 31),
+        "years": 2,
+        "active_ratio": 0.2,
+        "seed": 7,
+    }
+
+    def generate(self, **options):
+        options = {**self.options, **options}
+        call_command("generate_data", **options, stdout=io.StringIO())
+        return list(
+            Borrowing.objects.order_by("id").values_list(
+                "book__title",
+                "borrow_date",
+                "expected_return_date",
+                "actual_return_date",
+            )
+        )
+
+    def test_generates_requested_rows_within_the_date_span(self):
+        rows = self.generate()
+        end = self.options["end_date"]
+
+        self.assertEqual(get_user_model().objects.count(), 5)
+        self.assertEqual(Book.objects.count(), 20)
+        self.assertEqual(len(rows), 500)
+        for _, borrowed, expected, returned in rows:
+            self.assertGreaterEqual(borrowed, end - timedelta(days=730))
+            self.assertLessEqual(borrowed, end)
+            self.assertGreater(expected, borrowed)
+            if returned is not None:
+                self.assertGreaterEqual(returned, borrowed)
+                self.assertLessEqual(returned, end)
+        active = sum(returned is None for *_, returned in rows)
+        self.assertTrue(50 < active < 150)
+
+    def test_active_loans_are_taken_off_the_shelf(self):
+        self.generate(active_ratio=0.9)
+
+        for book in Book.objects.all():
+            active = Borrowing.objects.active().filter(book=book).count()
+            self.assertEqual(book.active_loans, active)
+            # Books are created with 1 to 20 copies.
+            self.assertGreaterEqual(book.inventory, 0)
+            self.assertLessEqual(book.inventory + active, 20)
+            self.assertGreaterEqual(book.inventory + active, 1)
+        # The most popular books ran out of copies.
+        self.assertTrue(Book.objects.filter(inventory=0).exists())
+
+    def test_output_is_reproducible_from_the_seed(self):
+        first = self.generate()
+        Borrowing.objects.all().delete()
+        Book.objects.all().delete()
+
+        self.assertEqual(self.generate(email_prefix="again"), first)
+        self.assertNotEqual(self.generate(email_prefix="other", seed=8), first)
+
+
+class GenerateDataIndexTests(TransactionTestCase):
+    def index_names(self):
+        with connection.cursor() as cursor:
+            return set(
+                connection.introspection.get_constraints(
+                    cursor, Borrowing._meta.db_table
+                )
+            )
+
+    def test_dropped_indexes_are_rebuilt(self):
+        call_command(
+            "generate_data",
+            users=2,
+            books=2,
+            borrowings=50,
+            drop_indexes=True,
+            stdout=io.StringIO(),
+        )
+
+        self.assertEqual(Borrowing.objects.count(), 50)
+        self.assertLessEqual(
+            {index.name for index in Borrowing._meta.indexes},
+            self.index_names(),
+        )
+
+    def test_indexes_left_dropped_by_a_killed_run_are_recreated(self):
+        index = Borrowing._meta.indexes[0]
+        with connection.schema_editor() as schema_editor:
+            schema_editor.remove_index(Borrowing, index)
+
+        out = io.StringIO()
+        call_command(
+            "generate_data", users=1, books=1, borrowings=0, stdout=out
+        )
+
+        self.assertIn(index.name, self.index_names())
+        self.assertIn("Recreated 1 missing index(es)", out.getvalue())
+
+
+class BenchmarkHelperTests(TestCase):
+    def result(self, **overrides):
+        result = summarize([0.001 * n for n in range(1, 101)], 2.0, 0, [3])
+        return {"scenarios": {"books-list": {**result, **overrides}}}
+
+    def test_summarize_reports_percentiles_and_throughput(self):
+        result = self.result()["scenarios"]["books-list"]
+
+        self.assertEqual(result["requests"], 100)
+        self.assertAlmostEqual(result["p50_ms"], 50.5)
+        self.assertAlmostEqual(result["p99_ms"], 99.01)
+        self.assertEqual(result["rps"], 50.0)
+        self.assertEqual(result["queries_per_request"], 3)
+
+    def test_compare_allows_drift_within_tolerance(self):
+        baseline = self.result()
+        current = self.result(p95_ms=110, rps=45.0)
+
+        self.assertEqual(compare(baseline, current, tolerance=0.2), [])
+
+    def test_compare_flags_slower_responses_and_extra_queries(self):
+        regressions = compare(
+            self.result(),
+            self.result(p95_ms=200, queries_per_request=4),
+            tolerance=0.2,
+        )
+
+        self.assertEqual(len(regressions), 2)
+        self.assertIn("p95", regressions[0])
+        self.assertIn("queries", regressions[1])
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="metrics@test.com", password="test1234"
+        )
+        self.client.force_authenticate(self.user)
+
+    def sample(self, name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_requests_are_counted_by_resolved_url_name(self):
+        labels = {"route": "borrowings:borrowing-list", "method": "GET"}
+        requests = self.sample(
+            "library_http_requests_total", status="200", **labels
+        )
+        observed = self.sample(
+            "library_http_request_db_queries_count", **labels
+        )
+
+        self.client.get(BORROWING_LIST_URL)
+
+        self.assertEqual(
+            self.sample("library_http_requests_total", status="200", **labels),
+            requests + 1,
+        )
+        self.assertEqual(
+            self.sample("library_http_request_db_queries_count", **labels),
+            observed + 1,
+        )
+
+    def test_metrics_endpoint_reports_catalog_gauges(self):
+        book = sample_book(inventory=1)
+        sample_borrowing(
+            user=self.user,
+            book=book,
+            borrow_date=date.today(),
+            expected_return_date=date.today() + timedelta(days=7),
+            actual_return_date=None,
+        )
+
+        response = self.client.get("/metrics")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        body = response.content.decode()
+        self.assertIn("library_active_borrowings 1.0", body)
+        self.assertIn("library_low_inventory_books 1.0", body)
+        self.assertIn("library_http_request_duration_seconds_bucket", body)
+
+
+class DatabaseSettingsTests(TestCase):
+    def test_connections_are_tuned_for_concurrent_writers(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA busy_timeout")
+            busy_timeout = cursor.fetchone()[0]
+            cursor.execute("PRAGMA synchronous")
+            synchronous = cursor.fetchone()[0]
+
+        self.assertEqual(
+            busy_timeout, settings.SQLITE_PRAGMAS["busy_timeout"]
+        )
+        self.assertEqual(synchronous, 1)  # NORMAL
+        self.assertEqual(connection.transaction_mode, "IMMEDIATE")
+
+
+@mock.patch("library_service.db.time.sleep")
+class RetryOnLockTests(SimpleTestCase):
+    def failing(self, error, failures):
+        calls = []
+
+        @retry_on_lock
+        def write():
+            calls.append(None)
+            if len(calls) <= failures:
+                raise OperationalError(error)
+            return "written"
+
+        return write, calls
+
+    def test_lock_errors_are_retried(self, sleep):
+        write, calls = self.failing("database is locked", failures=2)
+
+        self.assertEqual(write(), "written")
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(sleep.call_count, 2)
+
+    @override_settings(DB_LOCK_RETRIES=1)
+    def test_gives_up_after_the_configured_retries(self, sleep):
+        write, calls = self.failing("database is locked", failures=5)
+
+        with self.assertRaises(OperationalError):
+            write()
+        self.assertEqual(len(calls), 2)
+
+    def test_other_errors_are_not_retried(self, sleep):
+        write, calls = self.failing("no such table: book_book", failures=1)
+
+        with self.assertRaises(OperationalError):
+            write()
+        self.assertEqual(len(calls), 1)
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="user@test.com", password="password123"
+        )
+        self.book = sample_book(title="Dune")
+        self.today = date(2025, 3, 10)
+
+    def borrow(self, due, returned=None):
+        return sample_borrowing(
+            user=self.user,
+            book=self.book,
+            borrow_date=date(2025, 2, 1),
+            expected_return_date=due,
+            actual_return_date=returned,
+        )
+
+    def queued(self):
+        return set(
+            Job.objects.filter(kind=jobs.OVERDUE_REMINDER).values_list(
+                "key", flat=True
+            )
+        )
+
+    def test_first_scan_queues_loans_that_fell_overdue_today(self):
+        yesterday = self.borrow(date(2025, 3, 9))
+        self.borrow(date(2025, 3, 8))
+        self.borrow(date(2025, 3, 9), returned=date(2025, 3, 9))
+        self.borrow(date(2025, 3, 10))
+
+        self.assertEqual(jobs.scan_overdue(self.today), 1)
+
+        self.assertEqual(self.queued(), {str(yesterday.id)})
+        self.assertEqual(
+            ScanCheckpoint.objects.get(name=jobs.OVERDUE_SCAN).position,
+            date(2025, 3, 9),
+        )
+
+    def test_later_scans_resume_from_the_checkpoint(self):
+        first = self.borrow(date(2025, 3, 9))
+        jobs.scan_overdue(self.today)
+        later = [self.borrow(date(2025, 3, day)) for day in (10, 11, 12)]
+
+        self.assertEqual(jobs.scan_overdue(self.today), 0)
+        self.assertEqual(jobs.scan_overdue(date(2025, 3, 13)), 3)
+
+        self.assertEqual(
+            self.queued(), {str(b.id) for b in [first, *later]}
+        )
+
+    def test_loans_added_behind_the_checkpoint_are_queued(self):
+        jobs.scan_overdue(self.today)
+        late_entry = self.borrow(date(2025, 3, 1))
+
+        self.assertEqual(jobs.scan_overdue(self.today), 1)
+        self.assertEqual(jobs.scan_overdue(self.today), 0)
+
+        self.assertEqual(self.queued(), {str(late_entry.id)})
+
+    def test_rescanning_does_not_queue_twice(self):
+        self.borrow(date(2025, 3, 9))
+        jobs.scan_overdue(self.today)
+        ScanCheckpoint.objects.all().delete()
+
+        jobs.scan_overdue(self.today)
+
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_claimed_jobs_are_leased_to_one_worker(self):
+        for key in range(3):
+            jobs.enqueue("test", key)
+
+        claimed = jobs.claim(2)
+
+        self.assertEqual([job.key for job in claimed], ["0", "1"])
+        self.assertEqual({job.status for job in claimed}, {Job.RUNNING})
+        self.assertEqual([job.key for job in jobs.claim(5)], ["2"])
+        self.assertEqual(jobs.claim(5), [])
+
+    def test_expired_leases_are_claimed_again(self):
+        jobs.enqueue("test", 1)
+        job = jobs.claim(1)[0]
+        later = timezone.now() + timedelta(
+            seconds=settings.JOB_LEASE_SECONDS + 1
+        )
+
+        reclaimed = jobs.claim(1, now=later)
+
+        self.assertEqual([j.pk for j in reclaimed], [job.pk])
+        self.assertEqual(reclaimed[0].attempts, 2)
+        # The first worker's late result no longer applies.
+        with mock.patch.dict(jobs.HANDLERS, {"test": mock.Mock()}):
+            jobs.run(job)
+        self.assertEqual(Job.objects.get().status, Job.RUNNING)
+
+    @override_settings(JOB_MAX_ATTEMPTS=2)
+    def test_expired_leases_fail_after_the_last_attempt(self):
+        jobs.enqueue("test", 1)
+        lease = timedelta(seconds=settings.JOB_LEASE_SECONDS + 1)
+        jobs.claim(1)
+        jobs.claim(1, now=timezone.now() + lease)
+
+        with self.assertLogs("borrowing.jobs", "WARNING") as logs:
+            self.assertEqual(jobs.claim(1, now=timezone.now() + 3 * lease), [])
+
+        job = Job.objects.get()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.attempts, 2)
+        self.assertIn("lease expired", job.last_error)
+        self.assertIn("1 job(s) failed", logs.output[0])
+
+    def test_reminder_is_mailed_and_the_job_done(self):
+        borrowing = self.borrow(date.today() - timedelta(days=3))
+        jobs.enqueue(
+            jobs.OVERDUE_REMINDER,
+            borrowing.id,
+            {"borrowing": borrowing.id},
+        )
+
+        jobs.run(jobs.claim(1)[0])
+
+        self.assertEqual(Job.objects.get().status, Job.DONE)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["user@test.com"])
+        self.assertIn("3 day(s) overdue", mail.outbox[0].body)
+
+    def test_no_reminder_once_returned(self):
+        borrowing = self.borrow(
+            date.today() - timedelta(days=3), returned=date.today()
+        )
+        jobs.enqueue(
+            jobs.OVERDUE_REMINDER,
+            borrowing.id,
+            {"borrowing": borrowing.id},
+        )
+
+        jobs.run(jobs.claim(1)[0])
+
+        self.assertEqual(Job.objects.get().status, Job.DONE)
+        self.assertEqual(mail.outbox, [])
+
+    @override_settings(JOB_MAX_ATTEMPTS=2, JOB_RETRY_BACKOFF_SECONDS=60)
+    def test_failed_jobs_back_off_then_fail(self):
+        jobs.enqueue("broken", 1)
+        broken = mock.Mock(side_effect=RuntimeError("boom"))
+
+        with mock.patch.dict(
+            jobs.HANDLERS, {"broken": broken}
+        ), self.assertLogs("borrowing.jobs", "WARNING") as logs:
+            before = timezone.now()
+            jobs.run(jobs.claim(1)[0])
+            job = Job.objects.get()
+            self.assertEqual(job.status, Job.PENDING)
+            self.assertIn("RuntimeError: boom", job.last_error)
+            self.assertGreaterEqual(
+                job.run_after, before + timedelta(seconds=30)
+            )
+            self.assertEqual(jobs.claim(1), [])
+
+            jobs.run(jobs.claim(1, now=job.run_after)[0])
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.attempts, 2)
+        self.assertIn("failed: RuntimeError: boom", logs.output[-1])
+
+
+class RunWorkerCommandTests(TransactionTestCase):
+    def test_once_scans_and_drains_the_queue(self):
+        user = get_user_model().objects.create_user(
+            email="user@test.com", password="password123"
+        )
+        borrowing = sample_borrowing(
+            user=user,
+            book=sample_book(),
+            borrow_date=date.today() - timedelta(days=10),
+            expected_return_date=date.today() - timedelta(days=1),
+            actual_return_date=None,
+        )
+
+        out = io.StringIO()
+        call_command("run_worker", "--once", "--threads", "2", stdout=out)
+
+        self.assertIn("Found 1 newly overdue loan(s).", out.getvalue())
+        job = Job.objects.get()
+        self.assertEqual(job.key, str(borrowing.id))
+        self.assertEqual(job.status, Job.DONE)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_failed_polls_are_logged_and_retried(self):
+        command = run_worker.Command()
+        failures = [OperationalError("database is locked")]
+
+        def claim(free):
+            if failures:
+                raise failures.pop()
+            command.stopping.set()
+            return []
+
+        with mock.patch.object(jobs, "claim", claim), self.assertLogs(
+            run_worker.logger
+        ) as logs:
+            call_command(command, "--poll-interval", "0", stdout=io.StringIO())
+
+        self.assertIn("Polling for jobs failed.", logs.output[0])
+        self.assertIn("OperationalError", logs.output[0])
@@ -1,23 +1,116 @@
+import heapq
+from collections import Counter
 from datetime import date
 
-from rest_framework import viewsets, mixins
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.http import Http404, StreamingHttpResponse
+from rest_framework import viewsets, mixins, serializers
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
 from rest_framework.decorators import action
+from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema, OpenApiParameter
 
+from library_service.async_views import AsyncReadMixin, aiterate
+from library_service.db import ReplicaReadMixin, retry_on_lock
+from library_service.pagination import KeysetPagination
+from book.models import Book
+from book.serializers import BookSerializer
 from borrowing.permissions import IsOwnerOrAdmin
-from borrowing.models import Borrowing
+from borrowing.renderers import CSVRenderer, NDJSONRenderer
+from borrowing.models import ArchivedBorrowing, Borrowing, UserLoanStats
 from borrowing.serializers import (
     BorrowingSerializer,
     BorrowingListSerializer,
     BorrowingDetailSerializer,
+    BulkBorrowSerializer,
+    BulkReturnSerializer,
+    OverdueBorrowingSerializer,
+    UserOverdueTotalsSerializer,
+    BookOverdueTotalsSerializer,
 )
 
 
+BORROWING_FIELDS = (
+    "id",
+    "borrow_date",
+    "expected_return_date",
+    "actual_return_date",
+)
+
+# What the detail serializer reads, with its book and user.
+DETAIL_FIELDS = (
+    *BORROWING_FIELDS,
+    *(f"book__{field}" for field in BookSerializer.Meta.fields),
+    "user__id",
+    "user__email",
+    "user__is_staff",
+)
+
+# Export column name -> lookup; actual_return_date must stay last.
+EXPORT_FIELDS = {
+    "id": "id",
+    "user_id": "user_id",
+    "user_email": "user__email",
+    "book_id": "book_id",
+    "book_title": "book__title",
+    "borrow_date": "borrow_date",
+    "expected_return_date": "expected_return_date",
+    "actual_return_date": "actual_return_date",
+}
+
+
+# ?group_by= value -> (group key, label column, serializer)
+OVERDUE_GROUPS = {
+    "user": (
+        "user_id",
+        {"user_email": F("user__email")},
+        UserOverdueTotalsSerializer,
+    ),
+    "book": (
+        "book_id",
+        {"book_title": F("book__title")},
+        BookOverdueTotalsSerializer,
+    ),
+}
+
+
+class BorrowingPagination(KeysetPagination):
+    ordering = ("borrow_date", "id")
+
+
+class OverduePagination(KeysetPagination):
+    ordering_query_param = "ordering"
+    ordering_fields = ("fine", "days_overdue", "expected_return_date")
+    default_ordering = "-fine"
+
+    def get_ordering(self, request, queryset, view):
+        ordering = request.query_params.get(
+            self.ordering_query_param, self.default_ordering
+        )
+        if ordering.lstrip("-") not in self.ordering_fields:
+            choices = ", ".join(
+                f"{field}, -{field}" for field in self.ordering_fields
+            )
+            raise ValidationError(
+                {self.ordering_query_param: [f"Choose one of: {choices}."]}
+            )
+        return (ordering, "-id" if ordering.startswith("-") else "id")
+
+
+class OverdueTotalsPagination(KeysetPagination):
+    def get_ordering(self, request, queryset, view):
+        return ("-total_fine", view.group_key)
+
+
 class BorrowingViewSet(
+    ReplicaReadMixin,
+    AsyncReadMixin,
     mixins.RetrieveModelMixin,
     mixins.ListModelMixin,
     mixins.CreateModelMixin,
@@ -26,62 +119,361 @@ class BorrowingViewSet(
     serializer_class = BorrowingSerializer
     queryset = Borrowing.objects.all()
     permission_classes = (IsAuthenticated, IsOwnerOrAdmin)
+    pagination_class = BorrowingPagination
 
     def get_serializer_class(self):
         if self.action == "list":
             return BorrowingListSerializer
         if self.action == "retrieve":
             return BorrowingDetailSerializer
+        if self.action == "bulk_borrow":
+            return BulkBorrowSerializer
+        if self.action == "bulk_return":
+            return BulkReturnSerializer
+        if self.action == "overdue":
+            return OverdueBorrowingSerializer
         return BorrowingSerializer
 
     def get_queryset(self):
-        user = self.request.user
         queryset = Borrowing.objects.all()
 
-        if not user.is_staff:
-            queryset = queryset.filter(user=user)
+        if self.action == "list":
+            queryset = queryset.select_related("book", "user").only(
+                *BORROWING_FIELDS, "book__title", "user__email"
+            )
+        elif self.action == "retrieve":
+            queryset = queryset.select_related("book", "user").only(
+                *DETAIL_FIELDS
+            )
+        elif self.action == "return_book":
+            queryset = queryset.only("id", "user_id", "book_id")
+        elif self.action == "overdue":
+            queryset = queryset.select_related("book", "user").only(
+                *BORROWING_FIELDS, "book__title", "user__email"
+            )
+        if self.action in ("overdue", "overdue_totals"):
+            queryset = queryset.overdue().with_fines()
 
         is_active = self.request.query_params.get("is_active")
         if is_active is not None:
             if is_active.lower() == "true":
-                queryset = [b for b in queryset if b.is_active]
+                queryset = queryset.active()
             elif is_active.lower() == "false":
-                queryset = [b for b in queryset if not b.is_active]
+                queryset = queryset.inactive()
+
+        return self._filter_user(queryset)
+
+    def get_archived_queryset(self):
+        """
+        Archived borrowings that `list`, `retrieve` and `export` show along
+        with `get_queryset()`, or None when only active loans are asked
+        for.
+        """
+        is_active = self.request.query_params.get("is_active")
+        if self.action not in ("list", "retrieve", "export") or (
+            is_active is not None and is_active.lower() == "true"
+        ):
+            return None
+
+        queryset = ArchivedBorrowing.objects.all()
+        if self.action == "list":
+            queryset = queryset.select_related("book", "user").only(
+                *BORROWING_FIELDS, "book__title", "user__email"
+            )
+        elif self.action == "retrieve":
+            queryset = queryset.select_related("book", "user").only(
+                *DETAIL_FIELDS
+            )
+        return self._filter_user(queryset)
+
+    def get_object(self):
+        try:
+            return super().get_object()
+        except Http404:
+            archived = self.get_archived_queryset()
+            if archived is None:
+                raise
+        borrowing = get_object_or_404(
+            self.filter_queryset(archived), pk=self.kwargs["pk"]
+        )
+        self.check_object_permissions(self.request, borrowing)
+        return borrowing
 
-        if user.is_staff:
-            user_id = self.request.query_params.get("user_id")
-            if user_id is not None:
-                queryset = queryset.filter(user_id=user_id)
+    async def aget_object(self):
+        try:
+            return await super().aget_object()
+        except Http404:
+            archived = self.get_archived_queryset()
+            if archived is None:
+                raise
+        return await super().aget_object(archived)
 
+    def _filter_user(self, queryset):
+        user = self.request.user
+        if not user.is_staff:
+            return queryset.filter(user=user)
+
+        user_id = self.request.query_params.get("user_id")
+        if user_id is not None:
+            queryset = queryset.filter(user_id=user_id)
         return queryset
 
+    @retry_on_lock
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+
     @action(detail=True, methods=["post"], url_path="return")
+    @retry_on_lock
     def return_book(self, request, pk=None):
-
         borrowing = self.get_object()
 
-        if not borrowing.is_active:
+        with transaction.atomic():
+            returned = (
+                Borrowing.objects.filter(pk=borrowing.pk)
+                .active()
+                .update(actual_return_date=date.today())
+            )
+            if returned:
+                Book.objects.adjust_inventory({borrowing.book_id: 1})
+                UserLoanStats.objects.end_loans({borrowing.user_id: 1})
+
+        if not returned:
             return Response(
                 {"detail": "This book has already been returned."},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        borrowing.actual_return_date = date.today()
-        borrowing.book.inventory += 1
-        borrowing.book.save()
-        borrowing.save()
-
         return Response(
             {"detail": "The book has been successfully returned."},
             status=status.HTTP_200_OK,
         )
 
+    @action(detail=False, methods=["post"], url_path="bulk")
+    @retry_on_lock
+    def bulk_borrow(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        result = serializer.save()
+
+        return Response(
+            result,
+            status=(
+                status.HTTP_201_CREATED
+                if result["created"]
+                else status.HTTP_400_BAD_REQUEST
+            ),
+        )
+
+    @action(detail=False, methods=["post"], url_path="bulk-return")
+    @retry_on_lock
+    def bulk_return(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data["ids"]
+        queryset = self.get_queryset().filter(pk__in=ids)
+
+        with transaction.atomic():
+            returnable = {
+                pk: (book_id, user_id)
+                for pk, book_id, user_id in queryset.select_for_update()
+                .active()
+                .values_list("id", "book_id", "user_id")
+            }
+            found = (
+                set(queryset.values_list("id", flat=True))
+                if len(returnable) < len(ids)
+                else returnable.keys()
+            )
+
+            if returnable:
+                returned = (
+                    Borrowing.objects.filter(pk__in=returnable)
+                    .active()
+                    .update(actual_return_date=date.today())
+                )
+                if returned != len(returnable):
+                    raise ValidationError(
+                        "Borrowings changed during the request, please retry."
+                    )
+                Book.objects.adjust_inventory(
+                    Counter(book_id for book_id, _ in returnable.values())
+                )
+                UserLoanStats.objects.end_loans(
+                    Counter(user_id for _, user_id in returnable.values())
+                )
+
+        results = []
+        for borrowing_id in ids:
+            result = {"id": borrowing_id, "status": "returned"}
+            if borrowing_id not in found:
+                result["status"] = "not_found"
+                result["detail"] = "No borrowing with this id."
+            elif borrowing_id not in returnable:
+                result["status"] = "already_returned"
+                result["detail"] = "This book has already been returned."
+            results.append(result)
+
+        return Response(
+            {"returned": len(returnable), "results": results},
+            status=status.HTTP_200_OK,
+        )
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "is_active",
+                type=OpenApiTypes.BOOL,
+                description=(
+                    "Filter by active borrowings (ex. ?is_active=true)"
+                ),
+            ),
+            OpenApiParameter(
+                "user_id",
+                type=OpenApiTypes.INT,
+                description="Filter by user id (ex. ?user_id=3)",
+            ),
+            OpenApiParameter(
+                "borrow_date_after",
+                type=OpenApiTypes.DATE,
+                description="Borrowed on or after (ex. 2025-01-01)",
+            ),
+            OpenApiParameter(
+                "borrow_date_before",
+                type=OpenApiTypes.DATE,
+                description="Borrowed on or before (ex. 2025-01-31)",
+            ),
+        ],
+        responses={(200, "text/csv"): str, (200, "application/x-ndjson"): str},
+    )
+    @action(
+        detail=False,
+        methods=["get"],
+        permission_classes=(IsAuthenticated, IsAdminUser),
+        renderer_classes=(NDJSONRenderer, CSVRenderer),
+    )
+    def export(self, request):
+        querysets = [self.get_queryset()]
+        archived = self.get_archived_queryset()
+        if archived is not None:
+            querysets.append(archived)
+        for param, lookup in (
+            ("borrow_date_after", "borrow_date__gte"),
+            ("borrow_date_before", "borrow_date__lte"),
+        ):
+            value = request.query_params.get(param)
+            if value:
+                try:
+                    value = serializers.DateField().to_internal_value(value)
+                except ValidationError as error:
+                    raise ValidationError({param: error.detail})
+                querysets = [
+                    queryset.filter(**{lookup: value})
+                    for queryset in querysets
+                ]
+
+        today = date.today()
+        rows = (
+            (*row, row[-1] is None or row[-1] > today)
+            # Both tables stream in id order; rows start with the id.
+            for row in heapq.merge(
+                *(
+                    queryset.order_by("id")
+                    .values_list(*EXPORT_FIELDS.values())
+                    .iterator(chunk_size=2000)
+                    for queryset in querysets
+                )
+            )
+        )
+        renderer = request.accepted_renderer
+        content = renderer.stream([*EXPORT_FIELDS, "is_active"], rows)
+        if isinstance(request._request, ASGIRequest):
+            content = aiterate(content)
+        response = StreamingHttpResponse(
+            content,
+            content_type=f"{renderer.media_type}; charset={renderer.charset}",
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="borrowings.{renderer.format}"'
+        )
+        return response
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "ordering",
+                type=OpenApiTypes.STR,
+                enum=[
+                    f"{sign}{field}"
+                    for field in OverduePagination.ordering_fields
+                    for sign in ("-", "")
+                ],
+                description="Sort order, highest fine first by default",
+            ),
+            OpenApiParameter(
+                "user_id",
+                type=OpenApiTypes.INT,
+                description="Filter by user id (ex. ?user_id=3)",
+            ),
+        ],
+        responses=OverdueBorrowingSerializer(many=True),
+    )
+    @action(
+        detail=False,
+        methods=["get"],
+        permission_classes=(IsAuthenticated, IsAdminUser),
+        pagination_class=OverduePagination,
+    )
+    def overdue(self, request):
+        return self.list(request)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "group_by",
+                type=OpenApiTypes.STR,
+                enum=list(OVERDUE_GROUPS),
+                description="Total overdue loans per user or per book",
+            ),
+        ],
+        responses=UserOverdueTotalsSerializer(many=True),
+    )
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="overdue/totals",
+        permission_classes=(IsAuthenticated, IsAdminUser),
+        pagination_class=OverdueTotalsPagination,
+    )
+    def overdue_totals(self, request):
+        group_by = request.query_params.get("group_by", "user")
+        if group_by not in OVERDUE_GROUPS:
+            raise ValidationError(
+                {"group_by": [f"Choose one of: {', '.join(OVERDUE_GROUPS)}."]}
+            )
+        self.group_key, label, serializer_class = OVERDUE_GROUPS[group_by]
+        queryset = (
+            self.get_queryset()
+            .values(self.group_key, **label)
+            .annotate(
+                loans=Count("id"),
+                total_days=Sum("days_overdue"),
+                total_fine=Sum("fine"),
+            )
+        )
+        page = self.paginate_queryset(queryset)
+        serializer = serializer_class(
+            page, many=True, context=self.get_serializer_context()
+        )
+        return self.get_paginated_response(serializer.data)
+
     @extend_schema(
         parameters=[
             OpenApiParameter(
                 "is_active",
                 type=OpenApiTypes.BOOL,
-                description="Filter by active borrowings (ex. ?is_active=true)",
+                description=(
+                    "Filter by active borrowings (ex. ?is_active=true)"
+                ),
             ),
             OpenApiParameter(
                 "user_id",
@@ -91,4 +483,23 @@ class BorrowingViewSet(
         ]
     )
     def list(self, request, *args, **kwargs):
-        return super().list(request, *args, **kwargs)
+        archived = self.get_archived_queryset()
+        if archived is None:
+            return super().list(request, *args, **kwargs)
+
+        page = self.paginator.paginate_querysets(
+            [self.get_queryset(), archived], request, view=self
+        )
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    async def alist(self, request, *args, **kwargs):
+        archived = self.get_archived_queryset()
+        if archived is None:
+            return await super().alist(request, *args, **kwargs)
+
+        page = await self.paginator.apaginate_querysets(
+            [self.get_queryset(), archived], request, view=self
+        )
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
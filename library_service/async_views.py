@@ -0,0 +1,162 @@
+from functools import update_wrapper
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.http import Http404
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions
+from rest_framework.response import Response
+
+ASYNC_ACTIONS = ("list", "retrieve")
+
+_EXHAUSTED = object()
+
+
+async def aiterate(iterable):
+    """
+    Iterate a sync iterable from async code, one item per hop to the sync
+    thread.
+
+    Django's ASGI handler reads a sync `StreamingHttpResponse` into a list
+    before sending any of it; streaming this instead keeps memory flat.
+    """
+    iterator = iter(iterable)
+    step = sync_to_async(next)
+    while (item := await step(iterator, _EXHAUSTED)) is not _EXHAUSTED:
+        yield item
+
+
+class AsyncReadMixin:
+    """
+    Serve a viewset's `list` and `retrieve` natively under ASGI.
+
+    With `ASYNC_VIEWS` on (set by `library_service.asgi`), the routed view
+    is a coroutine. GETs of `list`/`retrieve` run `alist`/`aretrieve` on
+    the async ORM with `aauthenticate` authenticators; every other action
+    runs the regular sync view in a thread. The async handlers reuse the
+    sync querysets, serializers and pagination, so both paths answer the
+    same.
+    """
+
+    @classmethod
+    def as_view(cls, actions=None, **initkwargs):
+        view = super().as_view(actions, **initkwargs)
+        if not settings.ASYNC_VIEWS:
+            return view
+        return cls.as_async_view(view, actions, **initkwargs)
+
+    @classmethod
+    def as_async_view(cls, sync_view, actions, **initkwargs):
+        actions = dict(actions)
+        if "get" in actions:
+            actions.setdefault("head", actions["get"])
+        async_actions = {
+            method: action
+            for method, action in actions.items()
+            if method in ("get", "head") and action in ASYNC_ACTIONS
+        }
+
+        async def view(request, *args, **kwargs):
+            method = request.method.lower()
+            if method not in async_actions:
+                return await sync_to_async(sync_view)(request, *args, **kwargs)
+
+            self = cls(**initkwargs)
+            # As in `ViewSetMixin.as_view`; `Allow` is derived from these.
+            for method_name, action in actions.items():
+                setattr(self, method_name, getattr(self, action))
+            self.action_map = actions
+            self.action = async_actions[method]
+            self.request = request
+            self.args = args
+            self.kwargs = kwargs
+            return await self.adispatch(request, *args, **kwargs)
+
+        update_wrapper(view, sync_view)
+        return csrf_exempt(view)
+
+    async def adispatch(self, request, *args, **kwargs):
+        """The async counterpart of `APIView.dispatch`."""
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await self.ainitial(request, *args, **kwargs)
+            handler = getattr(self, f"a{self.action}")
+            response = await handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(
+            request, response, *args, **kwargs
+        )
+        return self.response
+
+    async def ainitial(self, request, *args, **kwargs):
+        self.format_kwarg = self.get_format_suffix(**kwargs)
+        neg = self.perform_content_negotiation(request)
+        request.accepted_renderer, request.accepted_media_type = neg
+        version, scheme = self.determine_version(request, *args, **kwargs)
+        request.version, request.versioning_scheme = version, scheme
+
+        await self.aperform_authentication(request)
+        self.check_permissions(request)
+        self.check_throttles(request)
+
+    async def aperform_authentication(self, request):
+        """Mirror `Request._authenticate` with `aauthenticate` if offered."""
+        for authenticator in request.authenticators:
+            authenticate = getattr(authenticator, "aauthenticate", None)
+            if authenticate is None:
+                authenticate = sync_to_async(authenticator.authenticate)
+            try:
+                user_auth_tuple = await authenticate(request)
+            except exceptions.APIException:
+                request._not_authenticated()
+                raise
+            if user_auth_tuple is not None:
+                request._authenticator = authenticator
+                request.user, request.auth = user_auth_tuple
+                return
+        request._not_authenticated()
+
+    async def alist(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        if self.paginator is None:
+            instances = [item async for item in queryset.aiterator()]
+            return Response(self.get_serializer(instances, many=True).data)
+
+        page = await self.paginator.apaginate_queryset(
+            queryset, request, view=self
+        )
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    async def aretrieve(self, request, *args, **kwargs):
+        instance = await self.aget_object()
+        return Response(self.get_serializer(instance).data)
+
+    async def aget_object(self, queryset=None):
+        """
+        The async counterpart of `GenericAPIView.get_object`, looking in
+        `queryset` instead of `get_queryset()` when given.
+        """
+        if queryset is None:
+            queryset = self.get_queryset()
+        queryset = self.filter_queryset(queryset)
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        lookup = {self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        # Raised as by `rest_framework.generics.get_object_or_404`.
+        try:
+            instance = await queryset.aget(**lookup)
+        except queryset.model.DoesNotExist:
+            raise Http404(
+                f"No {queryset.model._meta.object_name} matches the given "
+                "query."
+            )
+        except (DjangoValidationError, TypeError, ValueError):
+            raise Http404
+        self.check_object_permissions(self.request, instance)
+        return instance
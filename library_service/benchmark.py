@@ -0,0 +1,147 @@
+"""Helpers shared by the API benchmark commands."""
+
+import http.client
+import json
+import statistics
+import time
+from urllib.parse import urlsplit
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+
+class LocalClient:
+    """Call the API in-process and count the SQL queries of each request."""
+
+    counts_queries = True
+
+    def __init__(self):
+        self.client = APIClient(HTTP_HOST="localhost")
+
+    def request(self, method, path, data=None, token=None):
+        headers = {"HTTP_AUTHORIZATION": f"Bearer {token}"} if token else {}
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = getattr(self.client, method.lower())(
+                path, data, format="json", **headers
+            )
+            elapsed = time.perf_counter() - start
+        status = response.status_code
+        return status, _json(response.content), elapsed, len(queries)
+
+    def close(self):
+        pass
+
+
+class LiveClient:
+    """Call a running server over one keep-alive HTTP connection."""
+
+    counts_queries = False
+
+    def __init__(self, base_url):
+        url = urlsplit(base_url)
+        self.prefix = url.path.rstrip("/")
+        connection_class = (
+            http.client.HTTPSConnection
+            if url.scheme == "https"
+            else http.client.HTTPConnection
+        )
+        self.connection = connection_class(url.netloc, timeout=30)
+
+    def request(self, method, path, data=None, token=None):
+        headers = {"Accept": "application/json"}
+        body = None
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        if data is not None:
+            body = json.dumps(data, default=str)
+            headers["Content-Type"] = "application/json"
+        start = time.perf_counter()
+        try:
+            response = self._send(method, path, body, headers)
+        except ConnectionError:
+            # The server dropped the idle keep-alive connection.
+            self.connection.close()
+            start = time.perf_counter()
+            response = self._send(method, path, body, headers)
+        content = response.read()
+        elapsed = time.perf_counter() - start
+        return response.status, _json(content), elapsed, None
+
+    def _send(self, method, path, body, headers):
+        self.connection.request(
+            method, self.prefix + path, body=body, headers=headers
+        )
+        return self.connection.getresponse()
+
+    def close(self):
+        self.connection.close()
+
+
+def _json(content):
+    try:
+        return json.loads(content)
+    except ValueError:
+        return None
+
+
+def summarize(latencies, duration, errors, queries):
+    """Latency percentiles in ms, requests per second and queries."""
+    latencies = sorted(latencies)
+    if len(latencies) > 1:
+        cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+        p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+    else:
+        p50 = p95 = p99 = latencies[0] if latencies else 0
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": round(p50 * 1000, 3),
+        "p95_ms": round(p95 * 1000, 3),
+        "p99_ms": round(p99 * 1000, 3),
+        "rps": round(len(latencies) / duration, 1) if duration else None,
+        "queries_per_request": (
+            round(sum(queries) / len(queries), 2) if queries else None
+        ),
+    }
+
+
+def compare(baseline, current, tolerance):
+    """
+    Return human-readable regressions of `current` against `baseline`.
+
+    Latency and throughput may drift by `tolerance` (a fraction) before
+    counting as a regression; query counts and errors may not grow at all.
+    """
+    regressions = []
+    for name, before in baseline["scenarios"].items():
+        after = current["scenarios"].get(name)
+        if after is None:
+            continue
+        if after["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: p95 {before['p95_ms']} -> {after['p95_ms']} ms"
+            )
+        if (
+            before["rps"]
+            and after["rps"] is not None
+            and after["rps"] < before["rps"] * (1 - tolerance)
+        ):
+            regressions.append(
+                f"{name}: {before['rps']} -> {after['rps']} req/s"
+            )
+        if (
+            before["queries_per_request"] is not None
+            and after["queries_per_request"] is not None
+            and after["queries_per_request"] > before["queries_per_request"]
+        ):
+            regressions.append(
+                f"{name}: {before['queries_per_request']} -> "
+                f"{after['queries_per_request']} queries per request"
+            )
+        if after["errors"] > before["errors"]:
+            regressions.append(
+                f"{name}: {before['errors']} -> {after['errors']} errors"
+            )
+    return regressions
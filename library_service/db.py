@@ -0,0 +1,133 @@
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import OperationalError, connection
+
+from library_service import metrics
+
+PIN_COOKIE = "primary_pin"
+PIN_HEADER = "Primary-Pin"
+
+_replica = ContextVar("read_replica", default=None)
+
+
+def is_lock_error(exc):
+    return "locked" in str(exc)
+
+
+def retry_on_lock(func):
+    """
+    Re-run `func` when SQLite reports the database locked.
+
+    With `BEGIN IMMEDIATE` the write lock is taken before anything is
+    written, so a transaction that failed to get it can simply run again.
+    Inside an outer transaction the error is raised instead.
+    """
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        for attempt in range(settings.DB_LOCK_RETRIES + 1):
+            try:
+                return func(*args, **kwargs)
+            except OperationalError as exc:
+                if (
+                    not is_lock_error(exc)
+                    or connection.in_atomic_block
+                    or attempt == settings.DB_LOCK_RETRIES
+                ):
+                    raise
+            metrics.DB_LOCK_RETRIES.inc()
+            # Jittered so that the retrying writers do not collide again.
+            time.sleep(random.uniform(0, 0.05 * 2**attempt))
+
+    return wrapper
+
+
+def choose_replica():
+    """Return a random read replica alias, or None without replicas."""
+    if not settings.DATABASE_REPLICAS:
+        return None
+    return random.choice(settings.DATABASE_REPLICAS)
+
+
+def current_replica():
+    """The replica this context reads from, or None for the primary."""
+    return _replica.get()
+
+
+@contextmanager
+def reading_from(alias):
+    """Route the reads in the block to the `alias` replica."""
+    token = _replica.set(alias)
+    try:
+        yield
+    finally:
+        _replica.reset(token)
+
+
+def pinned_to_primary(request):
+    """
+    Whether the client wrote recently and must read its own writes.
+
+    The pin is the expiry timestamp set by `PrimaryPinMiddleware`, sent
+    back as a cookie or, by clients without cookies, as a header.
+    """
+    pin = request.COOKIES.get(PIN_COOKIE) or request.headers.get(PIN_HEADER)
+    try:
+        return float(pin) > time.time()
+    except (TypeError, ValueError):
+        return False
+
+
+class PrimaryReplicaRouter:
+    """
+    Send reads inside `reading_from()` to that replica and everything else
+    to the primary.
+
+    Users are always read from the primary, so that new accounts and
+    password changes are seen at once by authentication.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = _replica.get()
+        if alias is None or model is get_user_model():
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold copies of the primary's data.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == "default"
+
+
+class ReplicaReadMixin:
+    """
+    Serve a viewset's `list` and `retrieve` from one read replica per
+    request, unless the client is pinned to the primary.
+    """
+
+    replica_actions = ("list", "retrieve")
+
+    def _replica_for(self, request):
+        action = self.action_map.get(request.method.lower())
+        if action not in self.replica_actions or pinned_to_primary(request):
+            return None
+        return choose_replica()
+
+    def dispatch(self, request, *args, **kwargs):
+        with reading_from(self._replica_for(request)):
+            return super().dispatch(request, *args, **kwargs)
+
+    async def adispatch(self, request, *args, **kwargs):
+        with reading_from(self._replica_for(request)):
+            return await super().adispatch(request, *args, **kwargs)
@@ -0,0 +1,120 @@
+"""
+Prometheus metrics.
+
+Request metrics are plain `prometheus_client` counters and histograms.
+When `PROMETHEUS_MULTIPROC_DIR` is set before the workers start, every
+process writes them to its own memory-mapped file and a scrape of any
+worker aggregates all of them.
+"""
+
+import os
+
+from django.apps import apps
+from django.conf import settings
+from django.http import HttpResponse
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.registry import Collector
+
+REQUESTS = Counter(
+    "library_http_requests",
+    "HTTP requests by resolved URL name, method and status code.",
+    ["route", "method", "status"],
+)
+LATENCY = Histogram(
+    "library_http_request_duration_seconds",
+    "HTTP request latency by resolved URL name.",
+    ["route", "method"],
+)
+QUERIES = Histogram(
+    "library_http_request_db_queries",
+    "SQL queries per HTTP request by resolved URL name.",
+    ["route", "method"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, float("inf")),
+)
+BOOK_CACHE_LOOKUPS = Counter(
+    "library_book_cache_lookups",
+    "Book response cache lookups; the hit ratio is hit / (hit + miss).",
+    ["result"],
+)
+
+HASHING_PENDING = Gauge(
+    "library_password_hashing_pending",
+    "Password hashes queued or running on the hashing pool.",
+    multiprocess_mode="livesum",
+)
+HASHING_WAIT = Histogram(
+    "library_password_hashing_wait_seconds",
+    "Time a password hash waited for a hashing pool thread.",
+)
+HASHING_REJECTED = Counter(
+    "library_password_hashing_rejected",
+    "Password hashes rejected because the hashing pool stayed full.",
+)
+
+DB_LOCK_RETRIES = Counter(
+    "library_db_lock_retries",
+    "Write requests re-run because the database was locked.",
+)
+
+JOBS = Counter(
+    "library_jobs",
+    "Background jobs run, by kind and outcome (done, retry, failed).",
+    ["kind", "outcome"],
+)
+
+
+class LibraryCollector(Collector):
+    """Catalog gauges read from the database at scrape time."""
+
+    metrics = {
+        "library_active_borrowings": "Borrowings not returned yet.",
+        "library_low_inventory_books": (
+            "Books with at most METRICS_LOW_INVENTORY copies left."
+        ),
+    }
+
+    def describe(self):
+        # Spares the registry a database round trip on registration.
+        return [GaugeMetricFamily(*item) for item in self.metrics.items()]
+
+    def collect(self):
+        # Looked up lazily: book.cache imports this module.
+        Book = apps.get_model("book", "Book")
+        Borrowing = apps.get_model("borrowing", "Borrowing")
+        values = (
+            Borrowing.objects.active().count(),
+            Book.objects.filter(
+                inventory__lte=settings.METRICS_LOW_INVENTORY
+            ).count(),
+        )
+        for (name, documentation), value in zip(self.metrics.items(), values):
+            yield GaugeMetricFamily(name, documentation, value=value)
+
+
+def multiprocess_mode():
+    return "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+
+if not multiprocess_mode():
+    REGISTRY.register(LibraryCollector())
+
+
+def metrics_view(request):
+    registry = REGISTRY
+    if multiprocess_mode():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(LibraryCollector())
+    return HttpResponse(
+        generate_latest(registry), content_type=CONTENT_TYPE_LATEST
+    )
@@ -0,0 +1,317 @@
+import json
+import logging
+import random
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from library_service import metrics
+from library_service.db import PIN_COOKIE, PIN_HEADER
+
+logger = logging.getLogger("library_service.performance")
+
+_current = ContextVar("request_timings", default=None)
+_observers = ContextVar("query_observers", default=())
+
+
+def observe_queries(execute, sql, params, many, context):
+    """
+    Report every query to the observers of the current context.
+
+    Installed once on every connection rather than per request: under
+    ASGI the async ORM queries from another thread, with that thread's
+    connections, but in the request's context.
+    """
+    observers = _observers.get()
+    if not observers:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - start
+        for observer in observers:
+            observer.record(sql, duration)
+
+
+@receiver(connection_created)
+def install_query_observer(sender, connection, **kwargs):
+    if observe_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, observe_queries)
+
+
+@contextmanager
+def observing(observer):
+    """Report the queries run in the block to `observer.record`."""
+    # Connections opened before this module was imported.
+    for connection in connections.all(initialized_only=True):
+        install_query_observer(None, connection)
+    token = _observers.set((*_observers.get(), observer))
+    try:
+        yield observer
+    finally:
+        _observers.reset(token)
+
+
+class RequestTimings:
+    """
+    Durations of one request, in seconds, keyed by phase.
+
+    Also observes every query run while it is active (see `observing`).
+    """
+
+    def __init__(self, capture_sql=False):
+        self.start = time.perf_counter()
+        self.durations = defaultdict(float)
+        self.queries = 0
+        self.sql = [] if capture_sql else None
+        self._measuring = set()
+
+    @contextmanager
+    def measure(self, name):
+        if name in self._measuring:
+            # Already counted by the enclosing block.
+            yield
+            return
+        self._measuring.add(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.durations[name] += time.perf_counter() - start
+            self._measuring.discard(name)
+
+    def record(self, sql, duration):
+        self.durations["db"] += duration
+        self.queries += 1
+        if self.sql is not None:
+            self.sql.append({"ms": round(duration * 1000, 3), "sql": sql})
+
+    def as_dict(self):
+        return {
+            f"{name}_ms": round(duration * 1000, 3)
+            for name, duration in self.durations.items()
+        } | {"queries": self.queries}
+
+    def server_timing(self):
+        entries = []
+        for name, duration in self.durations.items():
+            entry = f"{name};dur={duration * 1000:.3f}"
+            if name == "db":
+                entry += f';desc="{self.queries} queries"'
+            entries.append(entry)
+        return ", ".join(entries)
+
+
+def measure(name):
+    """
+    Add the time spent in the block to the current request's `name` phase.
+
+    Does nothing outside a sampled request.
+    """
+    timings = _current.get()
+    return nullcontext() if timings is None else timings.measure(name)
+
+
+class PerformanceMiddleware:
+    """
+    Time a sample of requests and report the phases as a `Server-Timing`
+    header and a JSON log line.
+
+    `view` covers the view including its queries, authentication and
+    serialization, which `serialize` also reports on its own; `render` is
+    the DRF renderer; `total` spans the whole middleware stack. Requests
+    slower than `PERFORMANCE_SLOW_REQUEST_MS` also log their SQL.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+            # The ASGI handler would run sync hooks in a thread.
+            self.process_view = self.aprocess_view
+            self.process_template_response = self.aprocess_template_response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if random.random() >= settings.PERFORMANCE_SAMPLE_RATE:
+            return self.get_response(request)
+
+        timings = self._start(request)
+        token = _current.set(timings)
+        try:
+            with observing(timings):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, timings)
+
+    async def __acall__(self, request):
+        if random.random() >= settings.PERFORMANCE_SAMPLE_RATE:
+            return await self.get_response(request)
+
+        timings = self._start(request)
+        token = _current.set(timings)
+        try:
+            with observing(timings):
+                response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, timings)
+
+    def _start(self, request):
+        timings = RequestTimings(
+            capture_sql=bool(settings.PERFORMANCE_SLOW_REQUEST_MS)
+        )
+        request._timings = timings
+        return timings
+
+    def _finish(self, request, response, timings):
+        end = time.perf_counter()
+        timings.durations["total"] = end - timings.start
+        # Only template responses report when their view returned.
+        if "view" not in timings.durations and hasattr(request, "_view_start"):
+            timings.durations["view"] = end - request._view_start
+
+        response["Server-Timing"] = timings.server_timing()
+        record = {
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            **timings.as_dict(),
+        }
+        logger.info(json.dumps(record))
+        threshold = settings.PERFORMANCE_SLOW_REQUEST_MS
+        if threshold and record["total_ms"] >= threshold:
+            logger.warning(json.dumps({**record, "sql": timings.sql}))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        self._view_started(request)
+
+    def process_template_response(self, request, response):
+        return self._time_render(request, response)
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        self._view_started(request)
+
+    async def aprocess_template_response(self, request, response):
+        return self._time_render(request, response)
+
+    def _view_started(self, request):
+        if hasattr(request, "_timings"):
+            request._view_start = time.perf_counter()
+
+    def _time_render(self, request, response):
+        timings = getattr(request, "_timings", None)
+        if timings is None or not hasattr(request, "_view_start"):
+            return response
+        render_start = time.perf_counter()
+        timings.durations["view"] = render_start - request._view_start
+
+        def record_render(response):
+            timings.durations["render"] += time.perf_counter() - render_start
+
+        response.add_post_render_callback(record_render)
+        return response
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def record(self, sql, duration):
+        self.count += 1
+
+
+class MetricsMiddleware:
+    """
+    Count every request and observe its latency and SQL queries, labelled
+    by the resolved URL name (`namespace:name`).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        start = time.perf_counter()
+        with observing(QueryCounter()) as queries:
+            response = self.get_response(request)
+        self._observe(request, response, queries, start)
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        with observing(QueryCounter()) as queries:
+            response = await self.get_response(request)
+        self._observe(request, response, queries, start)
+        return response
+
+    def _observe(self, request, response, queries, start):
+        duration = time.perf_counter() - start
+        match = request.resolver_match
+        route = match.view_name if match else "unmatched"
+        metrics.REQUESTS.labels(
+            route, request.method, response.status_code
+        ).inc()
+        metrics.LATENCY.labels(route, request.method).observe(duration)
+        metrics.QUERIES.labels(route, request.method).observe(queries.count)
+
+
+class PrimaryPinMiddleware:
+    """
+    After a successful write, pin the client to the primary database for
+    `DATABASE_PRIMARY_PIN_SECONDS`, so that replica lag never hides its
+    own writes.
+
+    The pin is an expiry timestamp, set as a cookie and echoed in the
+    `Primary-Pin` response header for clients that keep no cookies.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self._pin(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self._pin(request, await self.get_response(request))
+
+    def _pin(self, request, response):
+        if (
+            settings.DATABASE_REPLICAS
+            and request.method not in ("GET", "HEAD", "OPTIONS", "TRACE")
+            and response.status_code < 400
+        ):
+            seconds = settings.DATABASE_PRIMARY_PIN_SECONDS
+            pin = f"{time.time() + seconds:.3f}"
+            response.set_cookie(
+                PIN_COOKIE, pin, max_age=seconds, httponly=True, samesite="Lax"
+            )
+            response[PIN_HEADER] = pin
+        return response
@@ -0,0 +1,277 @@
+import json
+from base64 import b64decode, b64encode
+from binascii import Error as BinasciiError
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginate a queryset by seeking past the last seen row.
+
+    Unlike `CursorPagination`, the cursor stores the full position for every
+    ordering field, so ties on a non-unique leading field never fall back to
+    an OFFSET scan. `ordering` must end with a unique field (usually `id`).
+    """
+
+    ordering = ("id",)
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    def get_ordering(self, request, queryset, view):
+        return self.ordering
+
+    def get_page_size(self, request):
+        page_size = self.page_size
+        if self.page_size_query_param:
+            try:
+                requested = int(
+                    request.query_params[self.page_size_query_param]
+                )
+                if requested > 0:
+                    page_size = requested
+            except (KeyError, ValueError):
+                pass
+        if self.max_page_size:
+            page_size = min(page_size, self.max_page_size)
+        return page_size
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page = self._page_queryset(queryset, request, view)
+        if page is None:
+            return None
+        return self._paginate(list(page))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        page = self._page_queryset(queryset, request, view)
+        if page is None:
+            return None
+        return self._paginate([item async for item in page.aiterator()])
+
+    def paginate_querysets(self, querysets, request, view=None):
+        """Paginate the rows of several querysets as if they were one."""
+        pages = [self._page_queryset(qs, request, view) for qs in querysets]
+        if pages[0] is None:
+            return None
+        return self._paginate(self._merge([list(page) for page in pages]))
+
+    async def apaginate_querysets(self, querysets, request, view=None):
+        pages = [self._page_queryset(qs, request, view) for qs in querysets]
+        if pages[0] is None:
+            return None
+        return self._paginate(
+            self._merge(
+                [[item async for item in page.aiterator()] for page in pages]
+            )
+        )
+
+    def _merge(self, pages):
+        """Combine one fetched slice per queryset into the page's slice."""
+        ordering = self.ordering
+        if self.reverse:
+            ordering = self._reversed(ordering)
+        rows = [row for page in pages for row in page]
+        # Stable sorts, least significant field first.
+        for field in reversed(ordering):
+            name = field.lstrip("-")
+            rows.sort(
+                key=lambda row: self._value(row, name),
+                reverse=field.startswith("-"),
+            )
+        return rows[: self.page_size + 1]
+
+    def _page_queryset(self, queryset, request, view):
+        """Return the slice to fetch: one row more than the page size."""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.ordering = tuple(self.get_ordering(request, queryset, view))
+        self.base_url = request.build_absolute_uri()
+        self.position, self.reverse = self.decode_cursor(request)
+
+        ordering = self.ordering
+        if self.reverse:
+            ordering = self._reversed(ordering)
+        queryset = queryset.order_by(*ordering)
+        if self.position is not None:
+            position = self._clean_position(queryset, self.position)
+            queryset = queryset.filter(self._seek(ordering, position))
+        return queryset[: self.page_size + 1]
+
+    def _paginate(self, results):
+        position, reverse = self.position, self.reverse
+        has_more = len(results) > self.page_size
+        results = results[: self.page_size]
+        if reverse:
+            results.reverse()
+
+        self.has_next = has_more if not reverse else position is not None
+        self.has_previous = has_more if reverse else position is not None
+        self.first_position = self._position(results[0]) if results else None
+        self.last_position = self._position(results[-1]) if results else None
+        if not results and position is not None:
+            self.first_position = self.last_position = position
+        return results
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {
+                    "type": "string",
+                    "nullable": True,
+                    "format": "uri",
+                },
+                "results": schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        parameters = [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "The pagination cursor value.",
+                "schema": {"type": "string"},
+            }
+        ]
+        if self.page_size_query_param:
+            parameters.append(
+                {
+                    "name": self.page_size_query_param,
+                    "required": False,
+                    "in": "query",
+                    "description": "Number of results to return per page.",
+                    "schema": {"type": "integer"},
+                }
+            )
+        return parameters
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.last_position, reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self.encode_cursor(self.first_position, reverse=True)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None, False
+        try:
+            cursor = json.loads(b64decode(encoded.encode("ascii")))
+            position = cursor["p"]
+            reverse = bool(cursor.get("r"))
+        except (
+            BinasciiError,
+            KeyError,
+            TypeError,
+            UnicodeError,
+            ValueError,
+        ):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(
+            self.ordering
+        ):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def _clean_position(self, queryset, position):
+        """Convert the cursor's values with their ordering fields."""
+        cleaned = []
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip("-")
+            if name in queryset.query.annotations:
+                model_field = queryset.query.annotations[name].output_field
+            else:
+                model_field = queryset.model._meta.get_field(name)
+            try:
+                if not isinstance(value, (int, float, str)):
+                    raise TypeError(value)
+                cleaned.append(model_field.to_python(value))
+            except (TypeError, ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+        return cleaned
+
+    def encode_cursor(self, position, reverse):
+        cursor = {"p": position}
+        if reverse:
+            cursor["r"] = 1
+        encoded = b64encode(
+            json.dumps(cursor, default=str, separators=(",", ":")).encode()
+        ).decode("ascii")
+        return replace_query_param(
+            remove_query_param(self.base_url, self.cursor_query_param),
+            self.cursor_query_param,
+            encoded,
+        )
+
+    def _position(self, item):
+        position = []
+        for field in self.ordering:
+            value = self._value(item, field.lstrip("-"))
+            position.append(
+                value if isinstance(value, (int, float, str)) else str(value)
+            )
+        return position
+
+    @staticmethod
+    def _value(item, name):
+        # `.values()` querysets paginate dicts.
+        if isinstance(item, dict):
+            return item[name]
+        return getattr(item, name)
+
+    @staticmethod
+    def _reversed(ordering):
+        return tuple(
+            field[1:] if field.startswith("-") else f"-{field}"
+            for field in ordering
+        )
+
+    @staticmethod
+    def _seek(ordering, position):
+        """
+        Build `(a, b, c) > (x, y, z)` honouring each field's direction:
+        `a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z)`.
+        """
+        clauses = []
+        for index, field in enumerate(ordering):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            equal = {
+                previous.lstrip("-"): value
+                for previous, value in zip(ordering[:index], position)
+            }
+            clauses.append(
+                Q(**equal, **{f"{name}__{lookup}": position[index]})
+            )
+        return reduce(or_, clauses)
@@ -0,0 +1,12 @@
+from library_service.middleware import measure
+
+
+class TimedSerializerMixin:
+    """
+    Report turning instances into primitive data as the `serialize`
+    Server-Timing phase. Nested and per-item calls count once.
+    """
+
+    def to_representation(self, instance):
+        with measure("serialize"):
+            return super().to_representation(instance)
@@ -59,6 +59,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "library_service.middleware.MetricsMiddleware",
+    "library_service.middleware.PerformanceMiddleware",
+    "library_service.middleware.PrimaryPinMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -91,33 +94,190 @@ WSGI_APPLICATION = "library_service.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# SQLite tuned for several workers: WAL lets reads run alongside the one
+# writer, and write transactions take the write lock at BEGIN IMMEDIATE,
+# waiting up to SQLITE_BUSY_TIMEOUT ms for it instead of failing midway.
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": int(getenv("SQLITE_BUSY_TIMEOUT", "5000")),
+    "mmap_size": int(getenv("SQLITE_MMAP_SIZE", str(128 * 1024 * 1024))),
+    # Negative values are KiB rather than pages.
+    "cache_size": -int(getenv("SQLITE_CACHE_SIZE_KB", "16384")),
+}
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        "OPTIONS": {
+            "init_command": ";".join(
+                f"PRAGMA {name} = {value}"
+                for name, value in SQLITE_PRAGMAS.items()
+            ),
+            "transaction_mode": "IMMEDIATE",
+        },
     }
 }
 
-# Password validation
-# https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
+# Read replicas: comma-separated SQLite files kept as copies of the primary
+# (see `manage.py sync_replicas`). Book and borrowing list/retrieve read
+# from them; clients that wrote in the last DATABASE_PRIMARY_PIN_SECONDS
+# read from the primary instead.
+DATABASE_REPLICAS = []
+for index, name in enumerate(
+    filter(None, getenv("DATABASE_REPLICA_NAMES", "").split(",")), 1
+):
+    DATABASES[f"replica{index}"] = {
+        **DATABASES["default"],
+        "NAME": name.strip(),
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append(f"replica{index}")
 
-AUTH_PASSWORD_VALIDATORS = [
-    {
-        "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
+DATABASE_ROUTERS = ["library_service.db.PrimaryReplicaRouter"]
+DATABASE_PRIMARY_PIN_SECONDS = int(getenv("DATABASE_PRIMARY_PIN_SECONDS", "5"))
+
+# Times a write is retried when SQLite still reports the database locked.
+DB_LOCK_RETRIES = int(getenv("DB_LOCK_RETRIES", "3"))
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
     },
-    {
-        "NAME": "django.contrib.auth.password_validation.MinimumLengthValidator",
+    "books": {
+        "BACKEND": getenv(
+            "BOOK_CACHE_BACKEND",
+            "django.core.cache.backends.locmem.LocMemCache",
+        ),
+        "LOCATION": getenv("BOOK_CACHE_LOCATION", "books"),
+        "TIMEOUT": int(getenv("BOOK_CACHE_TIMEOUT", "300")),
+        "OPTIONS": {
+            "MAX_ENTRIES": int(getenv("BOOK_CACHE_MAX_ENTRIES", "1000")),
+        },
     },
-    {
-        "NAME": "django.contrib.auth.password_validation.CommonPasswordValidator",
+    # Users behind JWTs, so authentication skips the per-request lookup.
+    # Saving a user only clears this process's copy of a local-memory
+    # cache: with several workers use a shared backend, or other workers
+    # keep a deactivated user active for up to TIMEOUT seconds.
+    "users": {
+        "BACKEND": getenv(
+            "USER_CACHE_BACKEND",
+            "django.core.cache.backends.locmem.LocMemCache",
+        ),
+        "LOCATION": getenv("USER_CACHE_LOCATION", "users"),
+        "TIMEOUT": int(getenv("USER_CACHE_TIMEOUT", "60")),
+        "OPTIONS": {
+            "MAX_ENTRIES": int(getenv("USER_CACHE_MAX_ENTRIES", "10000")),
+        },
     },
-    {
-        "NAME": "django.contrib.auth.password_validation.NumericPasswordValidator",
+}
+
+AUTH_USER_CACHE_ALIAS = "users"
+
+# Cache rendered book list/detail data; invalidated on every catalog write.
+BOOK_RESPONSE_CACHE = getenv("BOOK_RESPONSE_CACHE", "False") == "True"
+BOOK_RESPONSE_CACHE_ALIAS = "books"
+
+# Route book and borrowing list/retrieve to their async implementations.
+# Turned on by library_service.asgi; WSGI servers keep the sync views.
+ASYNC_VIEWS = getenv("ASYNC_VIEWS", "False") == "True"
+
+# Request instrumentation
+# Share of requests timed and given a Server-Timing header (0.0 to 1.0).
+PERFORMANCE_SAMPLE_RATE = float(getenv("PERFORMANCE_SAMPLE_RATE", "0.01"))
+# Runs the tests unsampled; timing tests override the rate themselves.
+TEST_RUNNER = "library_service.test_runner.TestRunner"
+# Sampled requests slower than this also log their SQL; 0 disables it.
+PERFORMANCE_SLOW_REQUEST_MS = float(getenv("PERFORMANCE_SLOW_REQUEST_MS", "0"))
+
+# Most books a user may have out at once; 0 means no limit.
+MAX_ACTIVE_LOANS = int(getenv("MAX_ACTIVE_LOANS", "0"))
+
+# Overdue fines are the daily fee per day late, capped per borrowing.
+OVERDUE_FINE_CAP = getenv("OVERDUE_FINE_CAP", "100.00")
+
+# archive_borrowings moves loans returned more than this many days ago.
+BORROWING_ARCHIVE_DAYS = int(getenv("BORROWING_ARCHIVE_DAYS", "365"))
+
+# build_recommendations keeps this many related books per book, and the
+# loan matrix it refreshes from between runs.
+RECOMMENDATIONS_TOP_K = int(getenv("RECOMMENDATIONS_TOP_K", "10"))
+RECOMMENDATIONS_SNAPSHOT = getenv(
+    "RECOMMENDATIONS_SNAPSHOT", str(BASE_DIR / "recommendations.npz")
+)
+
+# Background jobs (borrowing.jobs): attempts before a job is marked
+# failed, the first retry delay (doubled on every attempt) and how long a
+# worker may hold a job before another worker takes it over.
+JOB_MAX_ATTEMPTS = int(getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_RETRY_BACKOFF_SECONDS = float(getenv("JOB_RETRY_BACKOFF_SECONDS", "60"))
+JOB_LEASE_SECONDS = int(getenv("JOB_LEASE_SECONDS", "300"))
+
+# Overdue reminders are printed unless a real backend is configured.
+EMAIL_BACKEND = getenv(
+    "EMAIL_BACKEND", "django.core.mail.backends.console.EmailBackend"
+)
+DEFAULT_FROM_EMAIL = getenv("DEFAULT_FROM_EMAIL", "library@localhost")
+
+# Books with at most this many copies count as low inventory in /metrics.
+METRICS_LOW_INVENTORY = int(getenv("METRICS_LOW_INVENTORY", "1"))
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "library_service.performance": {
+            "handlers": ["console"],
+            "level": getenv("PERFORMANCE_LOG_LEVEL", "INFO"),
+            "propagate": False,
+        },
     },
+}
+
+# Password validation
+# https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
+
+AUTH_PASSWORD_VALIDATORS = [
+    {"NAME": f"django.contrib.auth.password_validation.{name}"}
+    for name in (
+        "UserAttributeSimilarityValidator",
+        "MinimumLengthValidator",
+        "CommonPasswordValidator",
+        "NumericPasswordValidator",
+    )
 ]
 
 AUTH_USER_MODEL = "user.User"
 
+PASSWORD_HASHERS = [
+    "user.hashers.PooledPBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+    "django.contrib.auth.hashers.ScryptPasswordHasher",
+]
+
+# PBKDF2 cost; lower it in development and tests, keep Django's default
+# (or more) in production.
+PASSWORD_HASHING_ITERATIONS = int(
+    getenv("PASSWORD_HASHING_ITERATIONS", "870000")
+)
+# Threads hashing passwords; 0 uses half the CPUs.
+PASSWORD_HASHING_WORKERS = int(getenv("PASSWORD_HASHING_WORKERS", "0"))
+# Hashes allowed to queue or run at once, and how long a request waits
+# for a slot before getting a 503.
+PASSWORD_HASHING_MAX_PENDING = int(
+    getenv("PASSWORD_HASHING_MAX_PENDING", "32")
+)
+PASSWORD_HASHING_TIMEOUT = float(getenv("PASSWORD_HASHING_TIMEOUT", "5"))
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
 
@@ -141,9 +301,11 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "user.authentication.CachedJWTAuthentication",
     ),
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
+    "DEFAULT_PAGINATION_CLASS": "library_service.pagination.KeysetPagination",
+    "PAGE_SIZE": int(getenv("PAGE_SIZE", "20")),
 }
 
 SPECTACULAR_SETTINGS = {
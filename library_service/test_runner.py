@@ -0,0 +1,18 @@
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Run the tests without sampled request timings, whose log lines would
+    otherwise show up at random. Timing tests turn sampling on themselves.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._unsampled = override_settings(PERFORMANCE_SAMPLE_RATE=0.0)
+        self._unsampled.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._unsampled.disable()
+        super().teardown_test_environment(**kwargs)
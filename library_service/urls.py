@@ -3,6 +3,8 @@ from django.urls import path
 from django.urls.conf import include
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 
+from library_service.metrics import metrics_view
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/v1/books/", include("book.urls", namespace="books")),
@@ -10,6 +12,7 @@ urlpatterns = [
     path(
         "api/v1/borrowings/", include("borrowing.urls", namespace="borrowings")
     ),
+    path("metrics", metrics_view, name="metrics"),
     path("api/v1/schema/", SpectacularAPIView.as_view(), name="schema"),
     path(
         "api/v1/doc/swagger/",
@@ -0,0 +1,111 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+from library_service.middleware import measure
+
+
+def get_user_cache():
+    return caches[settings.AUTH_USER_CACHE_ALIAS]
+
+
+def user_cache_key(user_id):
+    return f"users:auth:{user_id}"
+
+
+# What permission checks read; the password hash is never cached.
+CACHED_USER_FIELDS = ("id", "is_active", "is_staff", "is_superuser")
+
+
+def cached_fields(user):
+    return {field: getattr(user, field) for field in CACHED_USER_FIELDS}
+
+
+def from_cached_fields(values):
+    """
+    Rebuild a user from `cached_fields`. Every other field is deferred,
+    so reading one loads it from the database rather than the cache.
+    """
+    User = get_user_model()
+    fields = [
+        field.attname
+        for field in User._meta.concrete_fields
+        if field.attname in values
+    ]
+    return User.from_db(
+        DEFAULT_DB_ALIAS, fields, [values[field] for field in fields]
+    )
+
+
+class TimedJWTAuthentication(JWTAuthentication):
+    """JWT authentication reported as the `auth` Server-Timing phase."""
+
+    def authenticate(self, request):
+        with measure("auth"):
+            return super().authenticate(request)
+
+    async def aauthenticate(self, request):
+        """
+        `authenticate` for async views: the token is checked inline and
+        only the user lookup leaves the event loop.
+        """
+        with measure("auth"):
+            header = self.get_header(request)
+            if header is None:
+                return None
+            raw_token = self.get_raw_token(header)
+            if raw_token is None:
+                return None
+            validated_token = self.get_validated_token(raw_token)
+            return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        return await sync_to_async(self.get_user)(validated_token)
+
+
+class CachedJWTAuthentication(TimedJWTAuthentication):
+    """
+    Rebuild `request.user` from a short-lived cache instead of querying
+    `user_user` on every request.
+
+    Only users that passed simplejwt's checks are cached, and entries are
+    dropped whenever the user is saved or deleted (see `user.signals`).
+    The cached user holds only `CACHED_USER_FIELDS`: views that change
+    the user must load it from the database first.
+
+    Invalidation reaches only the cache the saving process sees, so
+    deployments with several workers need a shared `users` cache.
+    """
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            return super().get_user(validated_token)
+
+        cache = get_user_cache()
+        key = user_cache_key(user_id)
+        values = cache.get(key)
+        if values is None or api_settings.CHECK_REVOKE_TOKEN:
+            # Revocation compares the token with the current password.
+            user = super().get_user(validated_token)
+            cache.set(key, cached_fields(user))
+            return user
+        return from_cached_fields(values)
+
+    async def aget_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            return await super().aget_user(validated_token)
+
+        cache = get_user_cache()
+        key = user_cache_key(user_id)
+        values = await cache.aget(key)
+        if values is None or api_settings.CHECK_REVOKE_TOKEN:
+            user = await sync_to_async(super().get_user)(validated_token)
+            await cache.aset(key, cached_fields(user))
+            return user
+        return from_cached_fields(values)
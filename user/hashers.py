@@ -0,0 +1,91 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from library_service import metrics
+from library_service.middleware import measure
+
+
+class HashingBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Too many logins in progress, please retry shortly."
+    default_code = "hashing_busy"
+
+
+class HashingPool:
+    """
+    Run password hashes on a few dedicated threads.
+
+    `hashlib.pbkdf2_hmac` releases the GIL, so hashes run in parallel
+    while at most `workers` cores are spent on them; other requests keep
+    the remaining ones. At most `max_pending` hashes may wait or run at
+    once; callers wait up to `timeout` seconds for a slot, then get
+    `HashingBusy`.
+    """
+
+    def __init__(self, workers, max_pending, timeout):
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="password-hashing"
+        )
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.timeout = timeout
+
+    def run(self, func, *args):
+        start = time.perf_counter()
+        if not self.slots.acquire(timeout=self.timeout):
+            metrics.HASHING_REJECTED.inc()
+            raise HashingBusy()
+        metrics.HASHING_PENDING.inc()
+        try:
+            future = self.executor.submit(self._timed, start, func, *args)
+            return future.result()
+        finally:
+            metrics.HASHING_PENDING.dec()
+            self.slots.release()
+
+    @staticmethod
+    def _timed(submitted, func, *args):
+        metrics.HASHING_WAIT.observe(time.perf_counter() - submitted)
+        return func(*args)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_hashing_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = HashingPool(
+                settings.PASSWORD_HASHING_WORKERS
+                or max((os.cpu_count() or 1) // 2, 1),
+                settings.PASSWORD_HASHING_MAX_PENDING,
+                settings.PASSWORD_HASHING_TIMEOUT,
+            )
+    return _pool
+
+
+class PooledPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    The default hasher with a per-environment cost, run on the hashing
+    pool and reported as the `hash` Server-Timing phase.
+
+    It keeps the `pbkdf2_sha256` algorithm, so existing hashes verify
+    unchanged and are upgraded to the configured iterations on login.
+    """
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASHING_ITERATIONS
+
+    def encode(self, password, salt, iterations=None):
+        encode = super().encode
+        with measure("hash"):
+            return get_hashing_pool().run(encode, password, salt, iterations)
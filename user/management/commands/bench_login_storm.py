@@ -0,0 +1,116 @@
+import threading
+import time
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from library_service.benchmark import LiveClient, summarize
+
+EMAIL = "bench-login-storm@example.com"
+PASSWORD = "bench-login-storm"
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the latency of a cheap endpoint on a running server, first "
+        "alone and then while threads hammer the token endpoint. The server "
+        "must share this project's database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--url",
+            required=True,
+            help="Base URL of a running server, e.g. http://127.0.0.1:8000",
+        )
+        parser.add_argument("--logins", type=int, default=8)
+        parser.add_argument(
+            "--duration",
+            type=float,
+            default=10,
+            help="Seconds to probe before and during the storm.",
+        )
+        parser.add_argument("--probe-path", default=reverse("books:book-list"))
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        User.objects.filter(email=EMAIL).delete()
+        user = User.objects.create_user(EMAIL, PASSWORD)
+        try:
+            quiet = self._probe(options)
+            storm, logins, elapsed = self._storm(options)
+        finally:
+            user.delete()
+
+        self.stdout.write(
+            f"{'probe':<10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+            f"{'req/s':>9}{'errors':>8}"
+        )
+        for name, result in (("quiet", quiet), ("storm", storm)):
+            self.stdout.write(
+                f"{name:<10}{result['p50_ms']:>9.2f}{result['p95_ms']:>9.2f}"
+                f"{result['p99_ms']:>9.2f}{result['rps']:>9.1f}"
+                f"{result['errors']:>8}"
+            )
+        total = sum(logins.values())
+        self.stdout.write(
+            f"logins: {total} in {elapsed:.1f}s ({total / elapsed:.1f}/s), "
+            f"statuses {dict(logins)}"
+        )
+
+    def _probe(self, options):
+        client = LiveClient(options["url"])
+        latencies = []
+        errors = 0
+        start = time.perf_counter()
+        try:
+            while time.perf_counter() - start < options["duration"]:
+                status, _, elapsed, _ = client.request(
+                    "GET", options["probe_path"]
+                )
+                latencies.append(elapsed)
+                errors += status != 200
+        finally:
+            client.close()
+        if not latencies:
+            raise CommandError("The probe endpoint never answered.")
+        return summarize(
+            latencies, time.perf_counter() - start, errors, queries=[]
+        )
+
+    def _storm(self, options):
+        stop = threading.Event()
+        statuses = Counter()
+        lock = threading.Lock()
+        payload = {"email": EMAIL, "password": PASSWORD}
+        path = reverse("users:token_obtain_pair")
+
+        def login():
+            client = LiveClient(options["url"])
+            local = Counter()
+            try:
+                while not stop.is_set():
+                    status, _, _, _ = client.request("POST", path, payload)
+                    local[status] += 1
+            finally:
+                client.close()
+                with lock:
+                    statuses.update(local)
+
+        threads = [
+            threading.Thread(target=login) for _ in range(options["logins"])
+        ]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        # Let the storm saturate the server before probing.
+        time.sleep(1)
+        try:
+            result = self._probe(options)
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+        return result, statuses, time.perf_counter() - start
@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from user.authentication import get_user_cache, user_cache_key
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """
+    Drop the cached user now and again after commit, so a request racing
+    the transaction cannot leave the old row cached.
+    """
+    key = user_cache_key(instance.pk)
+    get_user_cache().delete(key)
+    transaction.on_commit(lambda: get_user_cache().delete(key))
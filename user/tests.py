@@ -1,3 +1,187 @@
-from django.test import TestCase
+import json
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import check_password, make_password
+from django.test import AsyncClient, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from book.models import Book
+from user.authentication import get_user_cache, user_cache_key
+from user.hashers import HashingPool
+
+TOKEN_URL = reverse("users:token_obtain_pair")
+ME_URL = reverse("users:manage")
+BOOK_LIST_URL = reverse("books:book-list")
+
+
+def server_timing(response):
+    return dict(
+        entry.split(";", 1) for entry in response["Server-Timing"].split(", ")
+    )
+
+
+@override_settings(PERFORMANCE_SAMPLE_RATE=1.0)
+class ServerTimingTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        get_user_model().objects.create_user("reader@test.com", "test12345")
+
+    def test_reports_phases_and_logs_a_json_line(self):
+        Book.objects.create(
+            title="Dune",
+            author="Herbert",
+            cover="SOFT",
+            inventory=1,
+            daily_fee=1,
+        )
+        with self.assertLogs("library_service.performance") as logs:
+            response = self.client.get(BOOK_LIST_URL)
+
+        phases = server_timing(response)
+        self.assertLessEqual(
+            {"db", "view", "serialize", "render", "total"}, set(phases)
+        )
+        self.assertLess(
+            float(phases["serialize"].split("=")[1]),
+            float(phases["view"].split("=")[1]),
+        )
+        self.assertIn('desc="', phases["db"])
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record["path"], BOOK_LIST_URL)
+        self.assertEqual(record["status"], 200)
+        self.assertGreater(record["queries"], 0)
+
+    def test_reports_password_hashing_and_jwt_authentication(self):
+        with self.assertLogs("library_service.performance"):
+            response = self.client.post(
+                TOKEN_URL,
+                {"email": "reader@test.com", "password": "test12345"},
+            )
+            self.assertIn("hash", server_timing(response))
+
+            response = self.client.get(
+                ME_URL,
+                HTTP_AUTHORIZATION=f"Bearer {response.data['access']}",
+            )
+            self.assertIn("auth", server_timing(response))
+
+    @override_settings(PERFORMANCE_SLOW_REQUEST_MS=0.001)
+    def test_slow_requests_log_their_sql(self):
+        with self.assertLogs("library_service.performance") as logs:
+            self.client.get(BOOK_LIST_URL)
+
+        slow = [log for log in logs.records if log.levelname == "WARNING"]
+        self.assertEqual(len(slow), 1)
+        sql = json.loads(slow[0].getMessage())["sql"]
+        self.assertIn("SELECT", sql[0]["sql"])
+
+    async def test_counts_queries_run_by_the_async_handler(self):
+        with self.assertLogs("library_service.performance") as logs:
+            response = await AsyncClient().get(BOOK_LIST_URL)
+
+        self.assertIn("view", server_timing(response))
+        record = json.loads(logs.records[0].getMessage())
+        self.assertGreater(record["queries"], 0)
+
+    @override_settings(PERFORMANCE_SAMPLE_RATE=0.0)
+    def test_unsampled_requests_are_not_timed(self):
+        response = self.client.get(BOOK_LIST_URL)
+
+        self.assertNotIn("Server-Timing", response)
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        get_user_cache().clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "reader@test.com", "test12345"
+        )
+        response = self.client.post(
+            TOKEN_URL, {"email": "reader@test.com", "password": "test12345"}
+        )
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {response.data['access']}"
+        )
+
+    def test_repeated_requests_skip_the_user_query(self):
+        # Authentication, then /me loading the user it shows.
+        with self.assertNumQueries(2):
+            self.client.get(ME_URL)
+        with self.assertNumQueries(1):
+            response = self.client.get(ME_URL)
+
+        self.assertEqual(response.data["email"], "reader@test.com")
+
+    def test_password_hash_is_not_cached(self):
+        self.client.get(ME_URL)
+
+        self.assertEqual(
+            get_user_cache().get(user_cache_key(self.user.pk)),
+            {
+                "id": self.user.pk,
+                "is_active": True,
+                "is_staff": False,
+                "is_superuser": False,
+            },
+        )
+
+    def test_update_does_not_write_back_a_cached_password(self):
+        self.client.get(ME_URL)
+        # Changed by another process, whose signal cannot reach this cache.
+        get_user_model().objects.filter(pk=self.user.pk).update(
+            password=make_password("changed123")
+        )
+
+        response = self.client.patch(ME_URL, {"email": "ann@test.com"})
+
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.email, "ann@test.com")
+        self.assertTrue(self.user.check_password("changed123"))
+
+    def test_saving_the_user_invalidates_the_cache(self):
+        self.client.get(ME_URL)
+
+        self.user.is_staff = True
+        self.user.save()
+        # The user is authenticated from the database again.
+        with self.assertNumQueries(2):
+            response = self.client.get(ME_URL)
+
+        self.assertTrue(response.data["is_staff"])
+
+    def test_deactivated_and_deleted_users_are_rejected(self):
+        self.client.get(ME_URL)
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(ME_URL).status_code, 401)
+
+        self.user.delete()
+        self.assertEqual(self.client.get(ME_URL).status_code, 401)
+
+
+class PasswordHashingPoolTests(TestCase):
+    @override_settings(PASSWORD_HASHING_ITERATIONS=1000)
+    def test_iterations_come_from_settings(self):
+        encoded = make_password("test12345")
+
+        self.assertTrue(encoded.startswith("pbkdf2_sha256$1000$"))
+        self.assertTrue(check_password("test12345", encoded))
+
+    def test_full_pool_answers_service_unavailable(self):
+        pool = HashingPool(workers=1, max_pending=1, timeout=0.01)
+        pool.slots.acquire()
+        self.addCleanup(pool.slots.release)
+        get_user_model().objects.create_user("reader@test.com", "test12345")
+
+        with mock.patch("user.hashers.get_hashing_pool", return_value=pool):
+            response = APIClient().post(
+                TOKEN_URL,
+                {"email": "reader@test.com", "password": "test12345"},
+            )
+
+        self.assertEqual(response.status_code, 503)
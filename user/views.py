@@ -1,18 +1,54 @@
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connections
 from rest_framework import generics
 from rest_framework.permissions import IsAuthenticated
-from rest_framework_simplejwt.authentication import JWTAuthentication
 
+from user.authentication import CachedJWTAuthentication
 from user.serializers import UserSerializer
 
 
+def offloaded(view):
+    """
+    Serve a sync view that mostly waits on the password hashing pool as an
+    async view.
+
+    Under ASGI, Django gives every sync request a thread of its own; this
+    runs the view on the event loop's shared executor instead, so a login
+    burst cannot pile up threads. Elsewhere (WSGI, the test client) the
+    view runs on the calling thread as usual.
+    """
+
+    def run(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            # Django only closes the request thread's connections.
+            connections.close_all()
+
+    @wraps(view)
+    async def async_view(request, *args, **kwargs):
+        if isinstance(request, ASGIRequest):
+            return await sync_to_async(run, thread_sensitive=False)(
+                request, *args, **kwargs
+            )
+        return await sync_to_async(view)(request, *args, **kwargs)
+
+    return async_view
+
+
 class CreateUserView(generics.CreateAPIView):
     serializer_class = UserSerializer
 
 
 class ManageUserView(generics.RetrieveUpdateAPIView):
     serializer_class = UserSerializer
-    authentication_classes = (JWTAuthentication,)
+    authentication_classes = (CachedJWTAuthentication,)
     permission_classes = (IsAuthenticated,)
 
     def get_object(self):
-        return self.request.user
+        # `request.user` may come from the cache and is never saved back.
+        return get_user_model().objects.get(pk=self.request.user.pk)